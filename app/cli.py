@@ -0,0 +1,187 @@
+import sys
+import json
+import time
+import asyncio
+import argparse
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Set, TextIO
+
+from .libs.batch import BATCH_CONCURRENCY, run_batch
+from .libs.http import close_http_client
+from .libs.rate_limit import TokenBucket
+from .logger import logger
+from .services.v1 import image_variation as image_variation_v1
+from .services.v2 import image_variation as image_variation_v2
+
+SERVICES = {
+    "v1": image_variation_v1,
+    "v2": image_variation_v2,
+}
+
+
+def read_content_ids(lines: Iterable[str]) -> List[str]:
+    """
+    One content id per line, blank lines and lines starting with # are skipped
+    """
+    content_ids = []
+    for line in lines:
+        line = line.strip()
+        if line and not line.startswith("#"):
+            content_ids.append(line)
+    return content_ids
+
+
+class Checkpoint:
+    """
+    Append-only JSON lines file with one record per processed content id.
+    Content ids that succeeded are skipped when a run is resumed, failed
+    ones are tried again.
+    """
+
+    def __init__(self, path: str):
+        self.path = Path(path)
+        self.completed: Set[str] = set()
+        if self.path.exists():
+            with open(self.path) as checkpoint_file:
+                for line in checkpoint_file:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # A crash can leave a partly written last line
+                        continue
+                    if record.get("status") == "succeeded":
+                        self.completed.add(record["content_id"])
+
+    def record(self, record: Dict):
+        with open(self.path, "a") as checkpoint_file:
+            checkpoint_file.write(json.dumps(record) + "\n")
+        if record["status"] == "succeeded":
+            self.completed.add(record["content_id"])
+
+
+def percentile(values: List[float], q: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * q))]
+
+
+def format_summary(summary: Dict) -> str:
+    lines = [
+        f"Processed {summary['processed']} content ids in {summary['elapsed']:.1f}s "
+        f"({summary['succeeded']} succeeded, {summary['failed']} failed, {summary['skipped']} skipped from checkpoint)",
+        f"Throughput: {summary['throughput']:.2f} content ids/min",
+    ]
+    if summary["processed"]:
+        lines.append(
+            f"Latency: p50={summary['latency_p50']:.2f}s p95={summary['latency_p95']:.2f}s max={summary['latency_max']:.2f}s"
+        )
+    return "\n".join(lines)
+
+
+async def pregenerate(
+    content_ids: List[str],
+    version: str = "v2",
+    checkpoint: Optional[Checkpoint] = None,
+    concurrency: int = BATCH_CONCURRENCY,
+    requests_per_minute: float = 0,
+    refresh: bool = False,
+) -> Dict:
+    """Generates variations for every content id and returns a run summary.
+
+    Args:
+        content_ids (List[str]): The content ids to process.
+        version (str): Which service pipeline to use, "v1" or "v2".
+        checkpoint (Checkpoint, optional): Records progress and skips content ids
+            that already succeeded in an earlier run.
+        concurrency (int): Maximum number of pipelines running at the same time.
+        requests_per_minute (float): Maximum pipeline starts per minute, 0 for no limit.
+        refresh (bool): Bypass the result cache.
+
+    Returns:
+        Dict: Counts, elapsed time, throughput and latency percentiles.
+    """
+
+    service = SERVICES[version]
+    pending = [content_id for content_id in dict.fromkeys(content_ids) if checkpoint is None or content_id not in checkpoint.completed]
+    skipped = len(dict.fromkeys(content_ids)) - len(pending)
+    limiter = TokenBucket(rate=requests_per_minute / 60) if requests_per_minute > 0 else None
+
+    async def generate(content_id: str) -> Dict:
+        if limiter is not None:
+            await limiter.acquire()
+        logo_detection, image_urls, renditions = await service.generate_image_variations(content_id, use_cache=not refresh)
+        return {"images": image_urls, "logo": logo_detection, "renditions": renditions}
+
+    succeeded = 0
+    durations = []
+    start = time.perf_counter()
+    async for result in run_batch(pending, generate, concurrency):
+        durations.append(result.duration)
+        record = {"content_id": result.item, "duration": round(result.duration, 3)}
+        if result.ok:
+            succeeded += 1
+            record.update(status="succeeded", **result.result)
+        else:
+            logger.error(f"Error while generating the image variations :: {result.item}", exc_info=result.error)
+            record.update(status="failed", error=repr(result.error))
+        if checkpoint is not None:
+            checkpoint.record(record)
+    elapsed = time.perf_counter() - start
+
+    summary = {
+        "processed": len(durations),
+        "succeeded": succeeded,
+        "failed": len(durations) - succeeded,
+        "skipped": skipped,
+        "elapsed": elapsed,
+        "throughput": len(durations) / elapsed * 60 if elapsed else 0.0,
+    }
+    if durations:
+        summary["latency_p50"] = percentile(durations, 0.5)
+        summary["latency_p95"] = percentile(durations, 0.95)
+        summary["latency_max"] = max(durations)
+    return summary
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        prog="python -m app.cli",
+        description="Pre-generate thumbnail variations for a list of content ids",
+    )
+    parser.add_argument("input", help="File with one content id per line, or - to read from stdin")
+    parser.add_argument("--version", choices=sorted(SERVICES), default="v2", help="Service pipeline to use (default: v2)")
+    parser.add_argument("--checkpoint", help="Progress file used to resume an interrupted run (default: <input>.checkpoint.jsonl)")
+    parser.add_argument("--concurrency", type=int, default=BATCH_CONCURRENCY, help=f"Pipelines running at the same time (default: {BATCH_CONCURRENCY})")
+    parser.add_argument("--requests-per-minute", type=float, default=0, help="Maximum pipeline starts per minute to stay within Vertex AI quotas (default: no limit)")
+    parser.add_argument("--refresh", action="store_true", help="Bypass the result cache and generate new variations")
+    return parser.parse_args(argv)
+
+
+async def run(args: argparse.Namespace, stdin: TextIO = sys.stdin) -> Dict:
+    if args.input == "-":
+        content_ids = read_content_ids(stdin)
+        checkpoint_path = args.checkpoint or "stdin.checkpoint.jsonl"
+    else:
+        with open(args.input) as input_file:
+            content_ids = read_content_ids(input_file)
+        checkpoint_path = args.checkpoint or f"{args.input}.checkpoint.jsonl"
+    try:
+        return await pregenerate(
+            content_ids,
+            version=args.version,
+            checkpoint=Checkpoint(checkpoint_path),
+            concurrency=args.concurrency,
+            requests_per_minute=args.requests_per_minute,
+            refresh=args.refresh,
+        )
+    finally:
+        await close_http_client()
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    summary = asyncio.run(run(parse_args(argv)))
+    print(format_summary(summary))
+    return 1 if summary["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -8,4 +8,5 @@ PERSON_GENERATION="allow_adult"
 SAFETY_FILTER_LEVEL="block_some"
 DEFAULT_ASPECT_RATIO = "4:3"
 GUIDANCE_SCALE = 90
-SEED = 915
\ No newline at end of file
+SEED = 915
+LOGO_DETECTION_INSTRUCTION = "You are a image data analyst with expertise in commercial logos. Please do not hallucinate. You can just output nothing if there are no positive findings."
\ No newline at end of file
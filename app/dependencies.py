@@ -0,0 +1,71 @@
+import os
+import threading
+from typing import Optional
+
+from .libs.base_storage import Storage
+from .logger import logger
+
+# Clients are created once per process on first use and shared by the v1 and v2 pipelines
+_lock = threading.Lock()
+_storage: Optional[Storage] = None
+_vertex_initialized = False
+
+
+def get_storage() -> Storage:
+    """
+    Shared storage client, created on first use
+    """
+    global _storage
+    if _storage is None:
+        with _lock:
+            if _storage is None:
+                backend = os.getenv("STORAGE_BACKEND", "gcs")
+                logger.info(f"Initializing storage :: {backend}")
+                _storage = create_storage(backend)
+    return _storage
+
+
+def create_storage(backend: str) -> Storage:
+    """Creates a storage client for the given backend name.
+
+    Args:
+        backend (str): One of "gcs", "local" or "memory".
+
+    Returns:
+        Storage: The storage client.
+    """
+
+    backend = backend.lower()
+    if backend == "gcs":
+        from .libs.storage import GCPStorage
+        return GCPStorage()
+    if backend == "local":
+        from .libs.local_storage import LocalStorage
+        return LocalStorage()
+    if backend == "memory":
+        from .libs.fake_backends import MemoryStorage
+        return MemoryStorage()
+    raise ValueError(f"Unsupported storage backend: {backend}")
+
+
+def set_storage(storage: Optional[Storage]):
+    """
+    Replace the shared storage client, e.g. with a LocalStorage in tests
+    """
+    global _storage
+    _storage = storage
+
+
+def init_vertex():
+    """
+    Initialize the Vertex AI SDK once, before the first model handle is created
+    """
+    global _vertex_initialized
+    if not _vertex_initialized:
+        with _lock:
+            if not _vertex_initialized:
+                logger.info("Initializing Vertex AI")
+                import vertexai
+                os.environ["GOOGLE_APPLICATION_CREDENTIALS"] = os.environ["GCP_GEMINI_CREDENTIALS"]
+                vertexai.init(project=os.environ["GCP_GEMINI_PROJECT_ID"])
+                _vertex_initialized = True
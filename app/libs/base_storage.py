@@ -1,5 +1,30 @@
+import os
+import time
+import asyncio
+import threading
 from abc import ABC, abstractmethod
-from typing import Union, Optional
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import AsyncIterator, Iterable, Optional, Tuple, Union
+
+# (file_path, file_content, mime_type)
+FileUpload = Tuple[str, Union[str, bytes], Optional[str]]
+
+# Threads shared by every batch upload on a storage, each call still caps its own concurrency
+STORAGE_UPLOAD_POOL_SIZE = int(os.getenv("STORAGE_UPLOAD_POOL_SIZE", "32"))
+_upload_pool_lock = threading.Lock()
+
+
+@dataclass
+class WriteResult:
+    file_path: str
+    duration: float
+    error: Optional[Exception] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
 
 class Storage(ABC):
     @abstractmethod
@@ -17,4 +42,50 @@ class Storage(ABC):
     def public_url(self, file_path: str) -> str:
         """
         Make Public URL
-        """
\ No newline at end of file
+        """
+
+    async def iter_write_files_async(self, files: Iterable[FileUpload], max_workers: int = 8) -> AsyncIterator[Tuple[int, WriteResult]]:
+        """
+        Write many files concurrently and yield (position, result) pairs as
+        each upload finishes, so callers can act on the fastest uploads first
+        """
+        files = list(files)
+        if not files:
+            return
+        loop = asyncio.get_running_loop()
+        pool = self.upload_pool()
+        slots = asyncio.Semaphore(max_workers)
+
+        async def write(index: int, file: FileUpload) -> Tuple[int, WriteResult]:
+            async with slots:
+                return index, await loop.run_in_executor(pool, self._write_file_result, *file)
+
+        writes = [asyncio.ensure_future(write(index, file)) for index, file in enumerate(files)]
+        try:
+            for next_result in asyncio.as_completed(writes):
+                yield await next_result
+        finally:
+            # Uploads that have not started yet are dropped if the caller stops early
+            for pending in writes:
+                pending.cancel()
+
+    def upload_pool(self) -> ThreadPoolExecutor:
+        """
+        Worker pool shared by every batch upload on this storage, created on first use
+        """
+        pool = getattr(self, "_upload_pool", None)
+        if pool is None:
+            with _upload_pool_lock:
+                pool = getattr(self, "_upload_pool", None)
+                if pool is None:
+                    pool = ThreadPoolExecutor(max_workers=STORAGE_UPLOAD_POOL_SIZE, thread_name_prefix="upload")
+                    self._upload_pool = pool
+        return pool
+
+    def _write_file_result(self, file_path: str, file_content: Union[str, bytes], mime_type: Optional[str]) -> WriteResult:
+        start = time.perf_counter()
+        try:
+            self.write_file(file_path, file_content, mime_type)
+        except Exception as e:
+            return WriteResult(file_path, time.perf_counter() - start, e)
+        return WriteResult(file_path, time.perf_counter() - start)
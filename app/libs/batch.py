@@ -0,0 +1,62 @@
+import os
+import time
+import asyncio
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Iterable, Optional
+
+from .timing import StageTimer, bind_timer
+
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "4"))
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", "1000"))
+
+
+@dataclass
+class BatchResult:
+    item: str
+    result: Any = None
+    error: Optional[BaseException] = None
+    stages: Dict[str, float] = field(default_factory=dict)
+    duration: float = 0.0
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+async def run_batch(items: Iterable[str], func: Callable[[str], Awaitable[Any]], concurrency: int = BATCH_CONCURRENCY) -> AsyncIterator[BatchResult]:
+    """Runs func for every item with at most concurrency calls in flight.
+
+    Duplicate items are run once. Results are yielded in completion order,
+    and a failing item is reported in its result instead of stopping the
+    batch. Items still running are cancelled if the caller stops iterating.
+
+    Args:
+        items (Iterable[str]): The items to process, e.g. course ids.
+        func (Callable): Coroutine function called with each item.
+        concurrency (int): Maximum number of items processed at the same time.
+
+    Returns:
+        AsyncIterator[BatchResult]: One result per unique item.
+    """
+
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def run_item(item: str) -> BatchResult:
+        async with semaphore:
+            # Every item gets its own timer so stage timings are reported per item
+            timer = StageTimer()
+            start = time.perf_counter()
+            with bind_timer(timer):
+                try:
+                    result = await func(item)
+                except Exception as e:
+                    return BatchResult(item=item, error=e, stages=timer.stages, duration=time.perf_counter() - start)
+            return BatchResult(item=item, result=result, stages=timer.stages, duration=time.perf_counter() - start)
+
+    tasks = [asyncio.create_task(run_item(item)) for item in dict.fromkeys(items)]
+    try:
+        for next_result in asyncio.as_completed(tasks):
+            yield await next_result
+    finally:
+        for task in tasks:
+            task.cancel()
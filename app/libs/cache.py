@@ -0,0 +1,222 @@
+import os
+import json
+import time
+import asyncio
+import hashlib
+import threading
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Optional, Tuple
+
+from ..logger import logger
+
+
+class Cache(ABC):
+    @abstractmethod
+    def get(self, key: str) -> Optional[Any]:
+        """
+        Return the cached value or None if missing or expired
+        """
+
+    @abstractmethod
+    def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        """
+        Store a JSON serialisable value, expiring after ttl seconds
+        """
+
+    @abstractmethod
+    def delete(self, key: str):
+        """
+        Remove a value from the cache
+        """
+
+    async def aget(self, key: str) -> Optional[Any]:
+        return await asyncio.to_thread(self.get, key)
+
+    async def aset(self, key: str, value: Any, ttl: Optional[float] = None):
+        await asyncio.to_thread(self.set, key, value, ttl)
+
+
+class MemoryCache(Cache):
+    """
+    In-process cache with TTL expiry and LRU eviction
+    """
+
+    def __init__(self, max_entries: int = 1024, default_ttl: Optional[float] = None):
+        self.max_entries = max_entries
+        self.default_ttl = default_ttl
+        self._entries: "OrderedDict[str, Tuple[Optional[float], Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        ttl = self.default_ttl if ttl is None else ttl
+        expires_at = time.monotonic() + ttl if ttl else None
+        with self._lock:
+            self._entries[key] = (expires_at, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key: str):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    # Dictionary operations never block, so skip the thread hop
+    async def aget(self, key: str) -> Optional[Any]:
+        return self.get(key)
+
+    async def aset(self, key: str, value: Any, ttl: Optional[float] = None):
+        self.set(key, value, ttl)
+
+
+class DiskCache(Cache):
+    """
+    Cache stored as one JSON file per key in a local directory, with TTL
+    expiry and least recently used eviction once max_entries is exceeded
+    """
+
+    def __init__(self, directory: str, max_entries: int = 1024, default_ttl: Optional[float] = None):
+        self.directory = Path(directory)
+        self.max_entries = max_entries
+        self.default_ttl = default_ttl
+        self._lock = threading.Lock()
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+    def _path(self, key: str) -> Path:
+        return self.directory / f"{hashlib.sha256(key.encode()).hexdigest()}.json"
+
+    def get(self, key: str) -> Optional[Any]:
+        path = self._path(key)
+        try:
+            with open(path) as cache_file:
+                entry = json.load(cache_file)
+        except (FileNotFoundError, ValueError):
+            return None
+        if entry["expires_at"] is not None and entry["expires_at"] <= time.time():
+            self.delete(key)
+            return None
+        # The modification time doubles as the last access time for eviction
+        os.utime(path)
+        return entry["value"]
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        ttl = self.default_ttl if ttl is None else ttl
+        entry = {"expires_at": time.time() + ttl if ttl else None, "value": value}
+        path = self._path(key)
+        tmp_path = path.with_suffix(f".{threading.get_ident()}.tmp")
+        with self._lock:
+            with open(tmp_path, "w") as cache_file:
+                json.dump(entry, cache_file)
+            os.replace(tmp_path, path)
+            self._evict()
+
+    def delete(self, key: str):
+        self._path(key).unlink(missing_ok=True)
+
+    def _evict(self):
+        entries = list(self.directory.glob("*.json"))
+        if len(entries) <= self.max_entries:
+            return
+        entries.sort(key=lambda entry: entry.stat().st_mtime)
+        for entry in entries[:len(entries) - self.max_entries]:
+            entry.unlink(missing_ok=True)
+
+
+class RedisCache(Cache):
+    """
+    Cache backed by any Redis compatible server, expiry is handled by the server
+    """
+
+    def __init__(self, url: Optional[str] = None, client: Any = None, prefix: str = "", default_ttl: Optional[float] = None):
+        if client is None:
+            try:
+                import redis
+            except ImportError as e:
+                raise ImportError("RedisCache requires the 'redis' package to be installed") from e
+            client = redis.Redis.from_url(url)
+        self.client = client
+        self.prefix = prefix
+        self.default_ttl = default_ttl
+
+    def get(self, key: str) -> Optional[Any]:
+        value = self.client.get(self.prefix + key)
+        return None if value is None else json.loads(value)
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        ttl = self.default_ttl if ttl is None else ttl
+        self.client.set(self.prefix + key, json.dumps(value), px=int(ttl * 1000) if ttl else None)
+
+    def delete(self, key: str):
+        self.client.delete(self.prefix + key)
+
+
+def create_cache(backend: str, max_entries: int = 1024, default_ttl: Optional[float] = None, directory: Optional[str] = None, redis_url: Optional[str] = None, prefix: str = "") -> Optional[Cache]:
+    """Creates a cache for the given backend name.
+
+    Args:
+        backend (str): One of "memory", "disk", "redis" or "none".
+
+    Returns:
+        Cache: The cache, or None when caching is disabled.
+    """
+
+    backend = backend.lower()
+    if backend == "none":
+        return None
+    if backend == "memory":
+        return MemoryCache(max_entries=max_entries, default_ttl=default_ttl)
+    if backend == "disk":
+        return DiskCache(directory, max_entries=max_entries, default_ttl=default_ttl)
+    if backend == "redis":
+        return RedisCache(url=redis_url, prefix=prefix, default_ttl=default_ttl)
+    raise ValueError(f"Unsupported cache backend: {backend}")
+
+
+def cache_key(*parts: Any) -> str:
+    """
+    Stable SHA-256 key for a sequence of JSON serialisable parts
+    """
+    return hashlib.sha256(json.dumps(parts, sort_keys=True).encode()).hexdigest()
+
+
+_result_cache: Optional[Cache] = None
+_result_cache_initialized = False
+_result_cache_lock = threading.Lock()
+
+
+def get_result_cache() -> Optional[Cache]:
+    """
+    Shared cache of generated variations, configured from RESULT_CACHE_* variables
+    """
+    global _result_cache, _result_cache_initialized
+    if not _result_cache_initialized:
+        with _result_cache_lock:
+            if not _result_cache_initialized:
+                backend = os.getenv("RESULT_CACHE_BACKEND", "memory")
+                logger.info(f"Initializing result cache :: {backend}")
+                _result_cache = create_cache(
+                    backend,
+                    max_entries=int(os.getenv("RESULT_CACHE_MAX_ENTRIES", "1024")),
+                    default_ttl=float(os.getenv("RESULT_CACHE_TTL", "86400")),
+                    directory=os.getenv("RESULT_CACHE_DIR", ".cache/variations"),
+                    redis_url=os.getenv("RESULT_CACHE_REDIS_URL"),
+                    prefix="variations:",
+                )
+                _result_cache_initialized = True
+    return _result_cache
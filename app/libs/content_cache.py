@@ -0,0 +1,107 @@
+import os
+import time
+from dataclasses import dataclass
+from typing import Dict, Mapping, Optional
+
+from .cache import MemoryCache
+
+
+@dataclass
+class CachedContent:
+    data: dict
+    fetched_at: float
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+
+
+def poster_image_only(content_details: dict) -> dict:
+    """
+    Reduce a content read response to the only field the pipeline uses
+    """
+    poster_img = content_details["result"]["content"]["posterImage"]
+    return {"result": {"content": {"posterImage": poster_img}}}
+
+
+class ContentDetailsCache:
+    """
+    TTL memo of KB content read responses keyed by content id. Expired
+    entries are kept so they can be revalidated with a conditional request
+    (ETag / If-Modified-Since) instead of being downloaded again.
+    """
+
+    def __init__(self, ttl: float, max_entries: int = 1024, poster_only: bool = True):
+        self.ttl = ttl
+        self.poster_only = poster_only
+        # No TTL on the underlying store, freshness is checked here
+        self._entries = MemoryCache(max_entries=max_entries)
+        self.hits = 0
+        self.misses = 0
+        self.revalidations = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl > 0
+
+    def get_fresh(self, content_id: str) -> Optional[dict]:
+        """
+        Return the cached content details if they are still within the TTL
+        """
+        if not self.enabled:
+            return None
+        entry = self._entries.get(content_id)
+        if entry is not None and time.monotonic() - entry.fetched_at < self.ttl:
+            self.hits += 1
+            return entry.data
+        self.misses += 1
+        return None
+
+    def revalidation_headers(self, content_id: str) -> Dict[str, str]:
+        headers = {}
+        entry = self._entries.get(content_id) if self.enabled else None
+        if entry is not None:
+            if entry.etag:
+                headers["If-None-Match"] = entry.etag
+            if entry.last_modified:
+                headers["If-Modified-Since"] = entry.last_modified
+        return headers
+
+    def revalidated(self, content_id: str) -> Optional[dict]:
+        """
+        Mark a stale entry as fresh again after a 304 Not Modified response
+        """
+        entry = self._entries.get(content_id)
+        if entry is None:
+            return None
+        entry.fetched_at = time.monotonic()
+        self.revalidations += 1
+        return entry.data
+
+    def store(self, content_id: str, content_details: dict, headers: Mapping[str, str]) -> dict:
+        if not self.enabled:
+            return content_details
+        data = poster_image_only(content_details) if self.poster_only else content_details
+        self._entries.set(content_id, CachedContent(
+            data=data,
+            fetched_at=time.monotonic(),
+            etag=headers.get("ETag"),
+            last_modified=headers.get("Last-Modified"),
+        ))
+        return data
+
+    def clear(self):
+        self._entries = MemoryCache(max_entries=self._entries.max_entries)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "revalidations": self.revalidations,
+            "entries": len(self._entries),
+        }
+
+
+content_details_cache = ContentDetailsCache(
+    ttl=float(os.getenv("CONTENT_CACHE_TTL", "300")),
+    max_entries=int(os.getenv("CONTENT_CACHE_MAX_ENTRIES", "4096")),
+    poster_only=os.getenv("CONTENT_CACHE_POSTER_ONLY", "true").lower() == "true",
+)
@@ -0,0 +1,236 @@
+"""Deterministic in-process stand-ins for Vertex AI and storage.
+
+Selected with VERTEX_BACKEND=fake and STORAGE_BACKEND=memory, so the whole
+service runs for profiling, benchmarks and soak tests without credentials or
+network. Gemini answers with canned logo JSON or a canned prompt and Imagen
+with synthetic images derived from the prompt, each after a fixed latency.
+
+VERTEX_BACKEND=stub keeps the Vertex AI SDK but sends its calls over REST to
+VERTEX_API_ENDPOINT without credentials, e.g. to the load test stubs.
+"""
+
+import io
+import os
+import json
+import time
+import zlib
+import random
+import asyncio
+import functools
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Union
+
+from ..logger import logger
+from .base_storage import Storage
+
+if TYPE_CHECKING:
+    from vertexai.generative_models import GenerativeModel
+    from vertexai.preview.vision_models import ImageGenerationModel
+
+# Seconds each fake call takes, roughly what the real service takes when set for soak tests
+FAKE_GEMINI_LATENCY = float(os.getenv("FAKE_GEMINI_LATENCY", "0"))
+FAKE_IMAGEN_LATENCY = float(os.getenv("FAKE_IMAGEN_LATENCY", "0"))
+FAKE_STORAGE_LATENCY = float(os.getenv("FAKE_STORAGE_LATENCY", "0"))
+# Soak tests can keep only the sizes of written files, so memory does not grow with every variation
+FAKE_STORAGE_KEEP_CONTENT = os.getenv("FAKE_STORAGE_KEEP_CONTENT", "true").lower() == "true"
+# Whether logo detection reports a logo, which adds the logo warning to every result
+FAKE_LOGO_DETECTED = os.getenv("FAKE_LOGO_DETECTED", "false").lower() == "true"
+# Edge of the square generated images, in pixels
+FAKE_IMAGE_SIZE = int(os.getenv("FAKE_IMAGE_SIZE", "1024"))
+
+FAKE_LOGO = {"logo_name": "Fake logo", "position": {"x": 10.0, "y": 10.0, "width": 64.0, "height": 64.0}, "confidence_score": 0.9}
+FAKE_PROMPT = "A flat illustration of a classroom with bright colours and soft lighting, no text"
+
+_stub_lock = threading.Lock()
+_stub_vertex_initialized = False
+# Blocking Gemini REST calls get their own pool, the default executor only has min(32, cpus + 4) threads
+_rest_executor: Optional[ThreadPoolExecutor] = None
+
+
+@lru_cache(maxsize=64)
+def synthetic_png(seed: int, size: int = FAKE_IMAGE_SIZE) -> bytes:
+    """
+    A gradient image that only depends on the seed, so reruns produce the same bytes
+    """
+    from PIL import Image
+
+    rng = random.Random(seed)
+    start = [rng.randrange(256) for _ in range(3)]
+    end = [rng.randrange(256) for _ in range(3)]
+    gradient = Image.linear_gradient("L").resize((size, size))
+    image = Image.merge("RGB", [gradient.point(lambda value, a=a, b=b: a + (b - a) * value // 255) for a, b in zip(start, end)])
+    output = io.BytesIO()
+    image.save(output, format="PNG")
+    return output.getvalue()
+
+
+def wants_json(generation_config: Any) -> bool:
+    """
+    Whether a generation config, a dict or a GenerationConfig, asks for a JSON response
+    """
+    if generation_config is None:
+        return False
+    if not isinstance(generation_config, dict):
+        generation_config = generation_config.to_dict()
+    return (generation_config.get("response_mime_type") or generation_config.get("responseMimeType")) == "application/json"
+
+
+class FakeGenerationResponse:
+    def __init__(self, text: str):
+        self.text = text
+        self.usage_metadata = None
+
+
+class FakeGenerativeModel:
+    """
+    Gemini stand-in, answers logo detection with the canned logo JSON and
+    prompt generation with the canned prompt
+    """
+
+    def __init__(self, model_name: str, system_instruction: Optional[str] = None, latency: Optional[float] = None):
+        self.model_name = model_name
+        self.system_instruction = system_instruction
+        self.latency = FAKE_GEMINI_LATENCY if latency is None else latency
+        self.calls = 0
+
+    def _response(self, generation_config: Any) -> FakeGenerationResponse:
+        self.calls += 1
+        if wants_json(generation_config):
+            return FakeGenerationResponse(json.dumps([FAKE_LOGO] if FAKE_LOGO_DETECTED else []))
+        return FakeGenerationResponse(FAKE_PROMPT)
+
+    def generate_content(self, contents: Any = None, generation_config: Any = None, **kwargs) -> FakeGenerationResponse:
+        time.sleep(self.latency)
+        return self._response(generation_config)
+
+    async def generate_content_async(self, contents: Any = None, generation_config: Any = None, **kwargs) -> FakeGenerationResponse:
+        await asyncio.sleep(self.latency)
+        return self._response(generation_config)
+
+
+class FakeGeneratedImage:
+    def __init__(self, image_bytes: bytes, mime_type: str = "image/png"):
+        self._image_bytes = image_bytes
+        self._mime_type = mime_type
+
+
+class FakeImageGenerationModel:
+    """
+    Imagen stand-in, the images only depend on the prompt and their position
+    """
+
+    def __init__(self, model_name: str, latency: Optional[float] = None, image_size: Optional[int] = None):
+        self.model_name = model_name
+        self.latency = FAKE_IMAGEN_LATENCY if latency is None else latency
+        self.image_size = image_size or FAKE_IMAGE_SIZE
+        self.calls = 0
+
+    def generate_images(self, prompt: str, number_of_images: Union[int, str] = 1, **kwargs) -> List[FakeGeneratedImage]:
+        time.sleep(self.latency)
+        self.calls += 1
+        seed = zlib.crc32(prompt.encode())
+        return [FakeGeneratedImage(synthetic_png(seed + index, self.image_size)) for index in range(int(number_of_images))]
+
+
+def init_stub_vertex():
+    """
+    Initialize the Vertex AI SDK once for VERTEX_API_ENDPOINT, reached over REST without credentials
+    """
+    global _stub_vertex_initialized
+    if not _stub_vertex_initialized:
+        with _stub_lock:
+            if not _stub_vertex_initialized:
+                api_endpoint = os.environ["VERTEX_API_ENDPOINT"]
+                logger.info(f"Initializing Vertex AI stub :: {api_endpoint}")
+                import vertexai
+                from google.auth.credentials import AnonymousCredentials
+                vertexai.init(
+                    project=os.environ["GCP_GEMINI_PROJECT_ID"],
+                    api_endpoint=api_endpoint,
+                    api_transport="rest",
+                    credentials=AnonymousCredentials(),
+                )
+                _stub_vertex_initialized = True
+
+
+def get_rest_executor() -> ThreadPoolExecutor:
+    """
+    Shared pool for blocking Gemini REST calls, as large as PIPELINE_MAX_WORKERS
+    """
+    global _rest_executor
+    if _rest_executor is None:
+        with _stub_lock:
+            if _rest_executor is None:
+                _rest_executor = ThreadPoolExecutor(max_workers=int(os.getenv("PIPELINE_MAX_WORKERS", "32")), thread_name_prefix="gemini-rest")
+    return _rest_executor
+
+
+class StubGenerativeModel:
+    """
+    Gemini model handle for the REST transport. The SDK only has async REST
+    clients with async credentials and otherwise falls back to gRPC, so async
+    calls run the blocking REST call on the shared REST pool instead, so at
+    most PIPELINE_MAX_WORKERS Gemini calls are in flight per process.
+    """
+
+    def __init__(self, model: "GenerativeModel"):
+        self._model = model
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._model, name)
+
+    async def generate_content_async(self, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        call = functools.partial(contextvars.copy_context().run, self._model.generate_content, *args, **kwargs)
+        return await loop.run_in_executor(get_rest_executor(), call)
+
+
+def create_stub_generative_model(model_name: str, system_instruction: Optional[str] = None) -> StubGenerativeModel:
+    """
+    Gemini model handle calling VERTEX_API_ENDPOINT
+    """
+    init_stub_vertex()
+    from vertexai.generative_models import GenerativeModel
+    if system_instruction is None:
+        model = GenerativeModel(model_name)
+    else:
+        model = GenerativeModel(model_name, system_instruction=[system_instruction])
+    return StubGenerativeModel(model)
+
+
+def create_stub_image_model(model_name: str) -> "ImageGenerationModel":
+    """
+    Imagen model handle calling VERTEX_API_ENDPOINT, generation already runs on the pipeline pool
+    """
+    init_stub_vertex()
+    from vertexai.preview.vision_models import ImageGenerationModel
+    return ImageGenerationModel.from_pretrained(model_name)
+
+
+class MemoryStorage(Storage):
+    """
+    Keeps written files in memory, for profiling and soak tests that should not touch disk or GCS
+    """
+
+    def __init__(self, latency: Optional[float] = None, keep_content: bool = FAKE_STORAGE_KEEP_CONTENT):
+        self.latency = FAKE_STORAGE_LATENCY if latency is None else latency
+        self.keep_content = keep_content
+        self.files: Dict[str, Union[str, bytes]] = {}
+        self.bytes_written = 0
+        self._lock = threading.Lock()
+
+    def write_file(self, file_path: str, file_content: Union[str, bytes], mime_type: Optional[str] = None):
+        time.sleep(self.latency)
+        with self._lock:
+            self.bytes_written += len(file_content)
+            if self.keep_content:
+                self.files[file_path] = file_content
+
+    def read_file(self, file_path: str) -> Union[str, bytes]:
+        return self.files[file_path]
+
+    def public_url(self, file_path: str) -> str:
+        return f"memory://{file_path}"
@@ -0,0 +1,168 @@
+import os
+import asyncio
+from typing import Callable, Optional
+
+import httpx
+
+from ..logger import logger
+
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "100"))
+HTTP_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("HTTP_MAX_KEEPALIVE_CONNECTIONS", "20"))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "30"))
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "5"))
+HTTP_READ_TIMEOUT = float(os.getenv("HTTP_READ_TIMEOUT", "30"))
+HTTP_RETRIES = int(os.getenv("HTTP_RETRIES", "2"))
+HTTP_RETRY_BACKOFF = float(os.getenv("HTTP_RETRY_BACKOFF", "0.5"))
+
+# Only idempotent requests are retried
+RETRY_METHODS = {"GET", "HEAD", "OPTIONS"}
+RETRY_STATUS_CODES = {429, 502, 503, 504}
+RETRY_EXCEPTIONS = (httpx.TimeoutException, httpx.NetworkError, httpx.RemoteProtocolError)
+
+
+class ResponseTooLarge(ValueError):
+    """
+    A response body is larger than the caller accepts
+    """
+
+    def __init__(self, url: str, max_bytes: int):
+        super().__init__(f"Response from {url} is larger than {max_bytes} bytes")
+        self.max_bytes = max_bytes
+
+
+class RetryTransport(httpx.AsyncBaseTransport):
+    """
+    Retries idempotent requests on connection errors and transient
+    status codes, with exponential backoff between attempts
+    """
+
+    def __init__(self, transport: httpx.AsyncBaseTransport, retries: int, backoff: float):
+        self.transport = transport
+        self.retries = retries
+        self.backoff = backoff
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        if request.method not in RETRY_METHODS:
+            return await self.transport.handle_async_request(request)
+        for attempt in range(self.retries + 1):
+            try:
+                response = await self.transport.handle_async_request(request)
+            except RETRY_EXCEPTIONS as e:
+                if attempt == self.retries:
+                    raise
+                logger.warning(f"Retrying {request.method} {request.url} after error :: {e!r}")
+            else:
+                if response.status_code not in RETRY_STATUS_CODES or attempt == self.retries:
+                    return response
+                await response.aclose()
+                logger.warning(f"Retrying {request.method} {request.url} after status :: {response.status_code}")
+            await asyncio.sleep(self.backoff * 2 ** attempt)
+
+    async def aclose(self):
+        await self.transport.aclose()
+
+
+def create_http_client(transport: Optional[httpx.AsyncBaseTransport] = None) -> httpx.AsyncClient:
+    """Creates a pooled keep-alive client with timeouts and retries.
+
+    Args:
+        transport (httpx.AsyncBaseTransport, optional): Transport to send requests
+            through, e.g. an httpx.MockTransport in tests. Defaults to a pooled
+            network transport.
+
+    Returns:
+        httpx.AsyncClient: The HTTP client.
+    """
+
+    if transport is None:
+        transport = httpx.AsyncHTTPTransport(
+            limits=httpx.Limits(
+                max_connections=HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=HTTP_MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+            )
+        )
+    return httpx.AsyncClient(
+        transport=RetryTransport(transport, retries=HTTP_RETRIES, backoff=HTTP_RETRY_BACKOFF),
+        timeout=httpx.Timeout(HTTP_READ_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT),
+    )
+
+
+_client: Optional[httpx.AsyncClient] = None
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """
+    Shared async HTTP client used for all outbound calls, created on first use
+    """
+    global _client
+    if _client is None or _client.is_closed:
+        logger.info("Initializing async HTTP client")
+        _client = create_http_client()
+    return _client
+
+
+def set_http_client(client: Optional[httpx.AsyncClient]):
+    """
+    Replace the shared client, e.g. with one pointed at a local stub server
+    """
+    global _client
+    _client = client
+
+
+async def close_http_client():
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+async def read_bounded(
+    response: httpx.Response,
+    max_bytes: int,
+    chunk_size: Optional[int] = None,
+    check_head: Optional[Callable[[bytes], None]] = None,
+    head_size: int = 16,
+) -> bytes:
+    """Reads a streamed response body, stopping as soon as it is too large.
+
+    Chunks are kept as the transport delivers them and joined once at the
+    end, a body that arrives in one chunk is returned without a copy. A
+    Content-Length above max_bytes is rejected before anything is read.
+
+    Args:
+        response (httpx.Response): A response opened with client.stream().
+        max_bytes (int): Largest body accepted.
+        chunk_size (int, optional): Re-chunks the body to this size, which costs
+            a copy per chunk. Defaults to the chunks as received.
+        check_head (Callable, optional): Called with the first head_size bytes,
+            or the whole body if shorter, as soon as they arrive. Raising from it
+            stops the download.
+        head_size (int): Number of bytes passed to check_head.
+
+    Returns:
+        bytes: The response body.
+
+    Raises:
+        ResponseTooLarge: If the body is larger than max_bytes.
+    """
+
+    content_length = response.headers.get("Content-Length", "")
+    # A declared length is the encoded size, so it is only trusted when the body is not compressed
+    if content_length.isdigit() and "Content-Encoding" not in response.headers and int(content_length) > max_bytes:
+        raise ResponseTooLarge(str(response.url), max_bytes)
+    chunks = []
+    size = 0
+    checked = check_head is None
+    async for chunk in response.aiter_bytes(chunk_size=chunk_size):
+        size += len(chunk)
+        if size > max_bytes:
+            raise ResponseTooLarge(str(response.url), max_bytes)
+        chunks.append(chunk)
+        if not checked and size >= head_size:
+            check_head(b"".join(chunks)[:head_size])
+            checked = True
+    body = b"".join(chunks)
+    if not checked:
+        check_head(body)
+    return body
@@ -0,0 +1,239 @@
+import io
+import os
+import asyncio
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from functools import partial
+from typing import Any, Callable, List, Optional
+
+IMAGE_PREPROCESS = os.getenv("IMAGE_PREPROCESS", "true").lower() == "true"
+IMAGE_MAX_EDGE = int(os.getenv("IMAGE_MAX_EDGE", "1024"))
+IMAGE_FORMAT = os.getenv("IMAGE_FORMAT", "JPEG").upper()
+IMAGE_QUALITY = int(os.getenv("IMAGE_QUALITY", "85"))
+# 0 runs preprocessing on a thread instead of a separate process
+IMAGE_PREPROCESS_WORKERS = int(os.getenv("IMAGE_PREPROCESS_WORKERS", "2"))
+# Comma separated width:format pairs rendered from every generated image, empty disables renditions
+IMAGE_RENDITIONS = os.getenv("IMAGE_RENDITIONS", "320:WEBP,640:WEBP")
+IMAGE_RENDITION_QUALITY = int(os.getenv("IMAGE_RENDITION_QUALITY", "80"))
+
+FORMAT_TO_MIME_TYPE = {
+    "JPEG": "image/jpeg",
+    "WEBP": "image/webp",
+}
+
+# Encoders that can be used for renditions, with their MIME type and file extension
+RENDITION_FORMATS = {
+    "JPEG": ("image/jpeg", "jpg"),
+    "PNG": ("image/png", "png"),
+    "WEBP": ("image/webp", "webp"),
+    "AVIF": ("image/avif", "avif"),
+}
+
+
+@dataclass
+class PreparedImage:
+    data: bytes
+    mime_type: str
+    width: int
+    height: int
+    original_size: int
+
+
+def prepare_image(data: bytes, max_edge: int = IMAGE_MAX_EDGE, image_format: str = IMAGE_FORMAT, quality: int = IMAGE_QUALITY) -> PreparedImage:
+    """Decodes an image once, bounds its long edge and re-encodes it compactly.
+
+    Args:
+        data (bytes): The encoded source image.
+        max_edge (int): Maximum width or height in pixels.
+        image_format (str): "JPEG" or "WEBP".
+        quality (int): Encoder quality from 1 to 100.
+
+    Returns:
+        PreparedImage: The re-encoded image, or the source image when
+            re-encoding would not make it smaller.
+    """
+
+    # Pillow is only needed in the worker processes
+    from PIL import Image, ImageOps
+
+    if image_format not in FORMAT_TO_MIME_TYPE:
+        raise ValueError(f"Unsupported image format: {image_format}")
+    with Image.open(io.BytesIO(data)) as image:
+        source_format = image.format
+        # The decoder and thumbnail below shrink the image, only the source size tells whether it already fits
+        source_fits = max(image.size) <= max_edge
+        # Let the JPEG decoder scale down while decoding instead of decoding at full size
+        image.draft("RGB", (max_edge, max_edge))
+        image = ImageOps.exif_transpose(image)
+        if image.mode in ("RGBA", "LA", "P"):
+            image = image.convert("RGBA")
+            if image_format == "JPEG":
+                background = Image.new("RGB", image.size, (255, 255, 255))
+                background.paste(image, mask=image.getchannel("A"))
+                image = background
+        elif image.mode != "RGB":
+            image = image.convert("RGB")
+        image.thumbnail((max_edge, max_edge), Image.Resampling.LANCZOS)
+        output = io.BytesIO()
+        image.save(output, format=image_format, quality=quality, optimize=True)
+        width, height = image.size
+    prepared = output.getvalue()
+    if len(prepared) >= len(data) and source_format == image_format and source_fits:
+        return PreparedImage(data, FORMAT_TO_MIME_TYPE[image_format], width, height, len(data))
+    return PreparedImage(prepared, FORMAT_TO_MIME_TYPE[image_format], width, height, len(data))
+
+
+def image_mime_type(data: bytes) -> Optional[str]:
+    """
+    MIME type of an encoded image from its header, None when Pillow cannot identify it
+    """
+    from PIL import Image, UnidentifiedImageError
+
+    try:
+        with Image.open(io.BytesIO(data)) as image:
+            return Image.MIME.get(image.format)
+    except UnidentifiedImageError:
+        return None
+
+
+@dataclass(frozen=True)
+class RenditionSpec:
+    width: int
+    format: str
+
+
+@dataclass
+class Rendition:
+    data: bytes
+    mime_type: str
+    extension: str
+    width: int
+    height: int
+    format: str
+
+
+def parse_renditions(value: str) -> List[RenditionSpec]:
+    """Parses a rendition list such as "320:WEBP,640:WEBP,640:AVIF".
+
+    Args:
+        value (str): Comma separated width:format pairs, an empty string for none.
+
+    Returns:
+        List[RenditionSpec]: The renditions in the given order, without duplicates.
+
+    Raises:
+        ValueError: If a width is not a positive integer or a format is unknown.
+    """
+
+    specs = []
+    for item in value.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        width, _, image_format = item.partition(":")
+        image_format = (image_format or "WEBP").strip().upper()
+        if not width.strip().isdigit() or int(width) <= 0:
+            raise ValueError(f"Invalid rendition width: {item}")
+        if image_format not in RENDITION_FORMATS:
+            raise ValueError(f"Unsupported rendition format: {item}")
+        spec = RenditionSpec(int(width), image_format)
+        if spec not in specs:
+            specs.append(spec)
+    return specs
+
+
+def render_renditions(data: bytes, specs: List[RenditionSpec], quality: int = IMAGE_RENDITION_QUALITY) -> List[Rendition]:
+    """Decodes an image once and encodes it at every requested width and format.
+
+    Images are never upscaled, a width above the source width is rendered at
+    the source size. Formats without an encoder in this Pillow build, such as
+    AVIF on older releases, are skipped.
+
+    Args:
+        data (bytes): The encoded source image.
+        specs (List[RenditionSpec]): The widths and formats to render.
+        quality (int): Encoder quality from 1 to 100.
+
+    Returns:
+        List[Rendition]: The encoded renditions, in the order of specs.
+    """
+
+    from PIL import Image, ImageOps
+
+    Image.init()
+    renditions = []
+    rendered = set()
+    with Image.open(io.BytesIO(data)) as source:
+        source = ImageOps.exif_transpose(source)
+        if source.mode not in ("RGB", "RGBA"):
+            source = source.convert("RGBA" if "A" in source.getbands() or source.mode == "P" else "RGB")
+        for spec in specs:
+            if spec.format not in Image.SAVE:
+                continue
+            width = min(spec.width, source.width)
+            height = max(1, round(source.height * width / source.width))
+            if (width, spec.format) in rendered:
+                continue
+            rendered.add((width, spec.format))
+            image = source if (width, height) == source.size else source.resize((width, height), Image.Resampling.LANCZOS)
+            if spec.format == "JPEG" and image.mode == "RGBA":
+                background = Image.new("RGB", image.size, (255, 255, 255))
+                background.paste(image, mask=image.getchannel("A"))
+                image = background
+            output = io.BytesIO()
+            image.save(output, format=spec.format, quality=quality, optimize=True)
+            mime_type, extension = RENDITION_FORMATS[spec.format]
+            renditions.append(Rendition(output.getvalue(), mime_type, extension, width, height, spec.format))
+    return renditions
+
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def get_process_pool() -> ProcessPoolExecutor:
+    """
+    Shared process pool for CPU bound image work, created on first use
+    """
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                # Forking a process that runs threads can deadlock, so workers are spawned
+                _pool = ProcessPoolExecutor(max_workers=IMAGE_PREPROCESS_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+    return _pool
+
+
+def shutdown_process_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
+
+
+async def run_image_task(func: Callable[..., Any], *args) -> Any:
+    """
+    Run CPU bound image work off the event loop, in the process pool unless it is disabled.
+    func must be a module level function so it can be sent to the worker processes.
+    """
+    task = partial(func, *args)
+    if IMAGE_PREPROCESS_WORKERS <= 0:
+        return await asyncio.to_thread(task)
+    return await asyncio.get_running_loop().run_in_executor(get_process_pool(), task)
+
+
+async def prepare_image_async(data: bytes, max_edge: int = IMAGE_MAX_EDGE, image_format: str = IMAGE_FORMAT, quality: int = IMAGE_QUALITY) -> PreparedImage:
+    """
+    Run prepare_image off the event loop, in the process pool unless it is disabled
+    """
+    return await run_image_task(prepare_image, data, max_edge, image_format, quality)
+
+
+async def render_renditions_async(data: bytes, specs: List[RenditionSpec], quality: int = IMAGE_RENDITION_QUALITY) -> List[Rendition]:
+    """
+    Run render_renditions off the event loop, in the process pool unless it is disabled
+    """
+    return await run_image_task(render_renditions, data, specs, quality)
@@ -0,0 +1,251 @@
+import os
+import time
+import uuid
+import asyncio
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional
+
+from ..logger import logger
+from . import streaming
+from .timing import StageTimer, bind_timer
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+
+# Idle SSE streams send a comment this often so proxies keep the connection open
+JOB_EVENTS_HEARTBEAT = float(os.getenv("JOB_EVENTS_HEARTBEAT", "15"))
+
+
+class JobQueueFull(Exception):
+    """
+    Raised when a job is submitted while the queue is at capacity
+    """
+
+
+@dataclass
+class JobEvent:
+    event: str
+    data: Dict[str, Any]
+
+
+@dataclass
+class Job:
+    id: str
+    kind: str
+    subject: str
+    func: Callable[..., Awaitable[Any]] = field(repr=False)
+    args: tuple = field(default=(), repr=False)
+    kwargs: Dict[str, Any] = field(default_factory=dict, repr=False)
+    status: str = QUEUED
+    created_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    result: Any = None
+    error: Optional[str] = None
+    stages: Dict[str, float] = field(default_factory=dict)
+    events: List[JobEvent] = field(default_factory=list, repr=False)
+    _updated: asyncio.Event = field(default_factory=asyncio.Event, repr=False)
+
+    @property
+    def done(self) -> bool:
+        return self.status in (SUCCEEDED, FAILED)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "subject": self.subject,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "stages": dict(self.stages),
+            "result": self.result,
+            "error": self.error,
+        }
+
+
+class JobTimer(StageTimer):
+    """
+    Stage timer that reports every finished stage as a job progress event
+    """
+
+    def __init__(self, manager: "JobManager", job: Job):
+        super().__init__()
+        self.manager = manager
+        self.job = job
+        self.stages = job.stages
+
+    def record(self, name: str, duration: float):
+        super().record(name, duration)
+        self.manager.publish(self.job, "stage", {"stage": name, "duration": round(duration, 3)})
+
+
+class JobManager:
+    """
+    Runs submitted coroutines on a bounded pool of asyncio workers. Jobs wait
+    in a bounded queue, so no more than max_workers pipelines (and their
+    Vertex AI calls) run at once. Finished jobs are kept for the retention
+    period so clients can poll for results.
+    """
+
+    def __init__(self, max_workers: int = 4, max_queue: int = 100, retention: float = 3600, max_jobs: int = 10000):
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.retention = retention
+        self.max_jobs = max_jobs
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers: List[asyncio.Task] = []
+
+    @property
+    def running(self) -> bool:
+        return bool(self._workers)
+
+    async def start(self):
+        if self.running:
+            return
+        logger.info(f"Starting job workers :: {self.max_workers}")
+        self._queue = asyncio.Queue(maxsize=self.max_queue)
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(self.max_workers)]
+
+    async def stop(self):
+        workers, self._workers = self._workers, []
+        for worker in workers:
+            worker.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+        # The queue belongs to the stopped event loop, so anything left in it is abandoned
+        for job in self._jobs.values():
+            if not job.done:
+                self._finish(job, FAILED, error="Job was cancelled because the service is shutting down")
+        self._queue = None
+
+    def submit(self, kind: str, subject: str, func: Callable[..., Awaitable[Any]], *args, **kwargs) -> Job:
+        """Queues func(*args, **kwargs) to run on the worker pool.
+
+        Args:
+            kind (str): The job type, e.g. the API version that submitted it.
+            subject (str): What the job is about, e.g. the course id.
+            func (Callable): The coroutine function to run.
+
+        Returns:
+            Job: The queued job.
+
+        Raises:
+            JobQueueFull: If the queue is at capacity or the workers are not running.
+        """
+
+        if not self.running:
+            raise JobQueueFull("Job workers are not running")
+        self._prune()
+        job = Job(id=uuid.uuid4().hex, kind=kind, subject=subject, func=func, args=args, kwargs=kwargs)
+        try:
+            self._queue.put_nowait(job)
+        except asyncio.QueueFull:
+            raise JobQueueFull(f"Job queue is full ({self.max_queue} jobs waiting)")
+        self._jobs[job.id] = job
+        self.publish(job, QUEUED, {"position": self._queue.qsize()})
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        return self._jobs.get(job_id)
+
+    def stats(self) -> Dict[str, int]:
+        stats = {"queued": 0, "running": 0, "succeeded": 0, "failed": 0}
+        for job in self._jobs.values():
+            stats[job.status] += 1
+        return stats
+
+    def publish(self, job: Job, event: str, data: Dict[str, Any]):
+        job.events.append(JobEvent(event=event, data={"job_id": job.id, "status": job.status, **data}))
+        # Wake up every subscriber waiting on the current event, then arm a new one
+        updated, job._updated = job._updated, asyncio.Event()
+        updated.set()
+
+    async def events(self, job: Job, heartbeat: Optional[float] = None) -> AsyncIterator[Optional[JobEvent]]:
+        """
+        Yield the job's events from the start until it finishes, or None
+        every heartbeat seconds while nothing happens
+        """
+        index = 0
+        while True:
+            while index < len(job.events):
+                index += 1
+                yield job.events[index - 1]
+            if job.done:
+                return
+            try:
+                await asyncio.wait_for(job._updated.wait(), timeout=heartbeat)
+            except asyncio.TimeoutError:
+                yield None
+
+    async def _worker(self):
+        while True:
+            job = await self._queue.get()
+            try:
+                await self._run(job)
+            finally:
+                self._queue.task_done()
+
+    async def _run(self, job: Job):
+        job.status = RUNNING
+        job.started_at = time.time()
+        self.publish(job, RUNNING, {})
+        try:
+            with bind_timer(JobTimer(self, job)):
+                result = await job.func(*job.args, **job.kwargs)
+        except asyncio.CancelledError:
+            self._finish(job, FAILED, error="Job was cancelled because the service is shutting down")
+            raise
+        except Exception:
+            logger.exception(f"Job failed :: {job.id} :: {job.kind} :: {job.subject}")
+            self._finish(job, FAILED, error="Something went wrong, please try again later...")
+        else:
+            self._finish(job, SUCCEEDED, result=result)
+
+    def _finish(self, job: Job, status: str, result: Any = None, error: Optional[str] = None):
+        job.status = status
+        job.result = result
+        job.error = error
+        job.finished_at = time.time()
+        data = {"result": result} if status == SUCCEEDED else {"error": error}
+        self.publish(job, status, data)
+
+    def _prune(self):
+        """
+        Drop finished jobs past the retention period, and the oldest finished
+        jobs once more than max_jobs are tracked
+        """
+        now = time.time()
+        # Jobs are kept in submission order, so the oldest are dropped first
+        for job_id, job in list(self._jobs.items()):
+            if job.done and (now - job.finished_at > self.retention or len(self._jobs) >= self.max_jobs):
+                del self._jobs[job_id]
+
+
+def format_sse(event: Optional[JobEvent]) -> str:
+    """
+    Format an event for a text/event-stream response, None becomes a keep-alive comment
+    """
+    if event is None:
+        return ": keep-alive\n\n"
+    return streaming.format_sse(event.event, event.data)
+
+
+_job_manager: Optional[JobManager] = None
+
+
+def get_job_manager() -> JobManager:
+    """
+    Shared job manager, configured from JOB_* variables
+    """
+    global _job_manager
+    if _job_manager is None:
+        _job_manager = JobManager(
+            max_workers=int(os.getenv("JOB_WORKERS", "4")),
+            max_queue=int(os.getenv("JOB_QUEUE_SIZE", "100")),
+            retention=float(os.getenv("JOB_RETENTION", "3600")),
+        )
+    return _job_manager
@@ -0,0 +1,44 @@
+import os
+import urllib.parse
+from pathlib import Path
+from typing import Union, Optional
+
+from ..logger import logger
+from .base_storage import Storage
+
+
+class LocalStorage(Storage):
+    """
+    Stores files on the local filesystem, for tests and offline runs
+    """
+
+    def __init__(self, base_dir: Optional[str] = None, base_url: Optional[str] = None):
+        self.base_dir = Path(base_dir or os.getenv("LOCAL_STORAGE_DIR", ".storage"))
+        self.base_url = base_url or os.getenv("LOCAL_STORAGE_URL", self.base_dir.resolve().as_uri())
+        self.base_dir.mkdir(parents=True, exist_ok=True)
+
+    def _path(self, file_path: str) -> Path:
+        path = (self.base_dir / file_path).resolve()
+        if not path.is_relative_to(self.base_dir.resolve()):
+            raise ValueError(f"File path escapes the storage directory: {file_path}")
+        return path
+
+    def write_file(
+        self,
+        file_path: str,
+        file_content: Union[str, bytes],
+        mime_type: Optional[str] = None,
+    ):
+        path = self._path(file_path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        if isinstance(file_content, str):
+            path.write_text(file_content)
+        else:
+            path.write_bytes(file_content)
+        logger.info(f"File written to local storage: {file_path}")
+
+    def read_file(self, file_path: str) -> bytes:
+        return self._path(file_path).read_bytes()
+
+    def public_url(self, file_path: str) -> str:
+        return urllib.parse.urljoin(self.base_url.rstrip("/") + "/", file_path)
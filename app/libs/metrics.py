@@ -0,0 +1,290 @@
+import bisect
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+# Upper bounds in seconds, sized for calls that take milliseconds up to a minute
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(label_names: Sequence[str], label_values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(label_names, label_values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    """
+    Base for metrics with one series per combination of label values.
+    Updates take a single uncontended lock and allocate only when a new
+    series is first seen, so they are safe to call on the request path.
+    """
+
+    type_name = "untyped"
+
+    def __init__(self, name: str, description: str, label_names: Sequence[str] = (), registry: Optional["Registry"] = None):
+        self.name = name
+        self.description = description
+        self.label_names = tuple(label_names)
+        self._series: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+        if registry is not None:
+            registry.register(self)
+
+    def value(self, *label_values: str) -> float:
+        return self._series.get(label_values, 0)
+
+    def samples(self) -> List[Tuple[str, str, float]]:
+        with self._lock:
+            series = list(self._series.items())
+        return [(self.name, _format_labels(self.label_names, labels), value) for labels, value in series]
+
+
+class Counter(Metric):
+    """
+    Monotonically increasing count, e.g. requests served or bytes uploaded
+    """
+
+    type_name = "counter"
+
+    def inc(self, *label_values: str, amount: float = 1):
+        with self._lock:
+            self._series[label_values] = self._series.get(label_values, 0) + amount
+
+
+class Gauge(Metric):
+    """
+    Value that can go up and down, e.g. requests in progress
+    """
+
+    type_name = "gauge"
+
+    def inc(self, *label_values: str, amount: float = 1):
+        with self._lock:
+            self._series[label_values] = self._series.get(label_values, 0) + amount
+
+    def dec(self, *label_values: str, amount: float = 1):
+        self.inc(*label_values, amount=-amount)
+
+    def set(self, value: float, *label_values: str):
+        with self._lock:
+            self._series[label_values] = value
+
+    @contextmanager
+    def track_inprogress(self, *label_values: str) -> Iterator[None]:
+        self.inc(*label_values)
+        try:
+            yield
+        finally:
+            self.dec(*label_values)
+
+
+class Histogram(Metric):
+    """
+    Fixed-bucket histogram with one series per combination of label values
+    """
+
+    type_name = "histogram"
+
+    def __init__(self, name: str, description: str, label_names: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS, registry: Optional["Registry"] = None):
+        super().__init__(name, description, label_names, registry)
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[Tuple[str, ...], List] = {}
+
+    def observe(self, value: float, *label_values: str):
+        # Each series is [bucket counts..., +Inf count, sum]
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    def snapshot(self) -> Dict[Tuple[str, ...], Dict]:
+        """
+        Cumulative bucket counts, total count and sum for every series
+        """
+        with self._lock:
+            series = {labels: list(values) for labels, values in self._series.items()}
+        result = {}
+        for labels, values in series.items():
+            counts = values[:-1]
+            cumulative = []
+            total = 0
+            for count in counts:
+                total += count
+                cumulative.append(total)
+            result[labels] = {
+                "buckets": dict(zip(self.buckets + (float("inf"),), cumulative)),
+                "count": total,
+                "sum": values[-1],
+            }
+        return result
+
+    def quantile(self, q: float, *label_values: str) -> Optional[float]:
+        """
+        Estimate the q-quantile of a series as the upper bound of the bucket
+        it falls in, or None when nothing has been observed
+        """
+        series = self.snapshot().get(label_values)
+        if not series or not series["count"]:
+            return None
+        rank = q * series["count"]
+        for upper_bound, cumulative in series["buckets"].items():
+            if cumulative >= rank:
+                return upper_bound if upper_bound != float("inf") else self.buckets[-1]
+        return self.buckets[-1]
+
+    def samples(self) -> List[Tuple[str, str, float]]:
+        samples = []
+        for labels, series in self.snapshot().items():
+            for upper_bound, count in series["buckets"].items():
+                bound_label = f'le="{_format_value(upper_bound)}"'
+                samples.append((f"{self.name}_bucket", _format_labels(self.label_names, labels, bound_label), count))
+            samples.append((f"{self.name}_count", _format_labels(self.label_names, labels), series["count"]))
+            samples.append((f"{self.name}_sum", _format_labels(self.label_names, labels), series["sum"]))
+        return samples
+
+
+class Registry:
+    """
+    Collection of metrics rendered together in the text exposition format
+    """
+
+    def __init__(self):
+        self._metrics: Dict[str, Metric] = {}
+
+    def register(self, metric: Metric):
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric already registered: {metric.name}")
+        self._metrics[metric.name] = metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.description}")
+            lines.append(f"# TYPE {metric.name} {metric.type_name}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{labels} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+@contextmanager
+def count_outcome(counter: Counter, *label_values: str) -> Iterator[None]:
+    """
+    Count the block under an extra "success" or "error" outcome label
+    """
+    try:
+        yield
+    except BaseException:
+        counter.inc(*label_values, "error")
+        raise
+    counter.inc(*label_values, "success")
+
+
+registry = Registry()
+
+requests_total = Counter(
+    "image_variation_requests_total",
+    "Image variation requests by API version and outcome",
+    label_names=("version", "outcome"),
+    registry=registry,
+)
+requests_in_progress = Gauge(
+    "image_variation_requests_in_progress",
+    "Image variation requests currently being handled",
+    label_names=("version",),
+    registry=registry,
+)
+stage_latency = Histogram(
+    "image_variation_stage_duration_seconds",
+    "Duration of each image variation pipeline stage",
+    label_names=("stage",),
+    registry=registry,
+)
+vertex_requests_total = Counter(
+    "vertex_requests_total",
+    "Vertex AI calls by API version, operation and outcome",
+    label_names=("version", "operation", "outcome"),
+    registry=registry,
+)
+storage_uploads_total = Counter(
+    "storage_uploads_total",
+    "Storage uploads by backend and outcome",
+    label_names=("backend", "outcome"),
+    registry=registry,
+)
+storage_upload_bytes_total = Counter(
+    "storage_upload_bytes_total",
+    "Bytes uploaded to storage by backend",
+    label_names=("backend",),
+    registry=registry,
+)
+content_cache_lookups_total = Counter(
+    "content_cache_lookups_total",
+    "KB content details lookups by result, hits are served from memory and revalidated entries by a 304 response",
+    label_names=("result",),
+    registry=registry,
+)
+single_flight_calls_total = Counter(
+    "single_flight_calls_total",
+    "Coalesced calls by role, leader calls run the work and coalesced calls share it",
+    label_names=("role",),
+    registry=registry,
+)
+quota_queue_depth = Gauge(
+    "vertex_quota_queue_depth",
+    "Vertex AI calls waiting for their model's quota, by model and priority",
+    label_names=("model", "priority"),
+    registry=registry,
+)
+quota_wait_seconds = Histogram(
+    "vertex_quota_wait_seconds",
+    "Time Vertex AI calls waited for their model's quota, by model and priority",
+    label_names=("model", "priority"),
+    registry=registry,
+)
+quota_rejections_total = Counter(
+    "vertex_quota_rejections_total",
+    "Vertex AI calls rejected because their model's quota would not be available in time",
+    label_names=("model", "priority"),
+    registry=registry,
+)
+circuit_breaker_state = Gauge(
+    "circuit_breaker_state",
+    "Circuit state per model, 0 closed, 1 half open and 2 open",
+    label_names=("model",),
+    registry=registry,
+)
+circuit_breaker_rejections_total = Counter(
+    "circuit_breaker_rejections_total",
+    "Model calls failed fast because the model's circuit was open",
+    label_names=("model",),
+    registry=registry,
+)
+hedged_requests_total = Counter(
+    "hedged_requests_total",
+    "Second attempts sent for slow model calls, how many of them answered first, and how many were skipped for lack of quota",
+    label_names=("operation", "outcome"),
+    registry=registry,
+)
+model_call_latency = Histogram(
+    "vertex_call_duration_seconds",
+    "Duration of successful Vertex AI calls by operation, from the moment their quota was granted",
+    label_names=("operation",),
+    registry=registry,
+)
@@ -0,0 +1,145 @@
+import os
+import threading
+from typing import TYPE_CHECKING, Dict, Iterable, Optional, Tuple
+
+from ..dependencies import init_vertex
+from ..logger import logger
+
+# Vertex AI modules are slow to import, so they are only loaded when the first handle is created
+if TYPE_CHECKING:
+    from vertexai.generative_models import GenerativeModel
+    from vertexai.preview.vision_models import ImageGenerationModel
+
+# Model handles are created once per process and shared across requests
+_lock = threading.Lock()
+_generative_models: Dict[Tuple[str, Optional[str]], "GenerativeModel"] = {}
+_image_models: Dict[str, "ImageGenerationModel"] = {}
+
+VERTEX_BACKENDS = ("vertex", "fake", "stub")
+
+
+def vertex_backend() -> str:
+    """
+    Backend behind the model handles, from VERTEX_BACKEND
+    """
+    backend = os.getenv("VERTEX_BACKEND", "vertex").lower()
+    if backend not in VERTEX_BACKENDS:
+        raise ValueError(f"Unsupported Vertex AI backend: {backend}")
+    return backend
+
+
+def create_generative_model(backend: str, model_name: str, system_instruction: Optional[str] = None) -> "GenerativeModel":
+    """Creates a Gemini model handle for the given backend name.
+
+    Args:
+        backend (str): "vertex" for Vertex AI, "fake" for the in-process stand-in or "stub" for VERTEX_API_ENDPOINT.
+        model_name (str): The Gemini model name.
+        system_instruction (str, optional): The system instruction bound to the model.
+
+    Returns:
+        GenerativeModel: The model handle.
+    """
+
+    if backend == "fake":
+        from .fake_backends import FakeGenerativeModel
+        return FakeGenerativeModel(model_name, system_instruction)
+    if backend == "stub":
+        from .fake_backends import create_stub_generative_model
+        return create_stub_generative_model(model_name, system_instruction)
+    init_vertex()
+    from vertexai.generative_models import GenerativeModel
+    if system_instruction is None:
+        model = GenerativeModel(model_name)
+    else:
+        model = GenerativeModel(model_name, system_instruction=[system_instruction])
+    return model
+
+
+def create_image_model(backend: str, model_name: str) -> "ImageGenerationModel":
+    """Creates an Imagen model handle for the given backend name.
+
+    Args:
+        backend (str): "vertex" for Vertex AI, "fake" for the in-process stand-in or "stub" for VERTEX_API_ENDPOINT.
+        model_name (str): The Imagen model name.
+
+    Returns:
+        ImageGenerationModel: The model handle.
+    """
+
+    if backend == "fake":
+        from .fake_backends import FakeImageGenerationModel
+        return FakeImageGenerationModel(model_name)
+    if backend == "stub":
+        from .fake_backends import create_stub_image_model
+        return create_stub_image_model(model_name)
+    init_vertex()
+    from vertexai.preview.vision_models import ImageGenerationModel
+    return ImageGenerationModel.from_pretrained(model_name)
+
+
+def get_generative_model(model_name: str, system_instruction: Optional[str] = None) -> "GenerativeModel":
+    """Returns the shared Gemini model handle for a model name and system instruction.
+
+    Args:
+        model_name (str): The Gemini model name.
+        system_instruction (str, optional): The system instruction bound to the model.
+
+    Returns:
+        GenerativeModel: The cached model handle.
+    """
+
+    key = (model_name, system_instruction)
+    model = _generative_models.get(key)
+    if model is None:
+        with _lock:
+            model = _generative_models.get(key)
+            if model is None:
+                backend = vertex_backend()
+                logger.info(f"Creating generative model handle :: {model_name} ({backend})")
+                model = create_generative_model(backend, model_name, system_instruction)
+                _generative_models[key] = model
+    return model
+
+
+def get_image_model(model_name: str) -> "ImageGenerationModel":
+    """Returns the shared Imagen model handle for a model name.
+
+    Args:
+        model_name (str): The Imagen model name.
+
+    Returns:
+        ImageGenerationModel: The cached model handle.
+    """
+
+    model = _image_models.get(model_name)
+    if model is None:
+        with _lock:
+            model = _image_models.get(model_name)
+            if model is None:
+                backend = vertex_backend()
+                logger.info(f"Loading image generation model handle :: {model_name} ({backend})")
+                model = create_image_model(backend, model_name)
+                _image_models[model_name] = model
+    return model
+
+
+def warm_up(
+    generative_models: Iterable[Tuple[str, Optional[str]]] = (),
+    image_models: Iterable[str] = (),
+):
+    """
+    Creates the given model handles ahead of the first request
+    """
+    for model_name, system_instruction in generative_models:
+        get_generative_model(model_name, system_instruction)
+    for model_name in image_models:
+        get_image_model(model_name)
+
+
+def clear():
+    """
+    Drops all cached model handles
+    """
+    with _lock:
+        _generative_models.clear()
+        _image_models.clear()
@@ -0,0 +1,212 @@
+import io
+import os
+import json
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from ..logger import logger
+
+# Hashes are 64 bits, an 8x8 grid of the lowest frequencies or of neighbouring pixel gradients
+HASH_SIZE = 8
+# pHash looks at the low frequencies of a larger thumbnail so fine detail does not change the hash
+PHASH_SCALE = 4
+# The file is rewritten once it holds this many records per entry, merges and evictions leave stale records behind
+COMPACT_RATIO = 2
+
+ImageHashes = Tuple[int, int]
+
+
+def _dct_matrix(size: int) -> np.ndarray:
+    # Orthonormal DCT-II basis, so the 2D transform is two matrix products
+    n = np.arange(size)
+    matrix = np.cos(np.pi * (2 * n[None, :] + 1) * n[:, None] / (2 * size)) * np.sqrt(2 / size)
+    matrix[0] /= np.sqrt(2)
+    return matrix
+
+
+_DCT = _dct_matrix(HASH_SIZE * PHASH_SCALE)
+
+
+def _pack_bits(bits: np.ndarray) -> int:
+    return int.from_bytes(np.packbits(bits.ravel()).tobytes(), "big")
+
+
+def phash(pixels: np.ndarray) -> int:
+    """
+    Perceptual hash of a square grayscale image HASH_SIZE * PHASH_SCALE pixels wide:
+    one bit per low frequency DCT coefficient, set when it is above the median
+    """
+    coefficients = (_DCT @ pixels @ _DCT.T)[:HASH_SIZE, :HASH_SIZE]
+    # The DC term only reflects overall brightness
+    median = np.median(coefficients.ravel()[1:])
+    return _pack_bits(coefficients > median)
+
+
+def dhash(pixels: np.ndarray) -> int:
+    """
+    Difference hash of a grayscale image HASH_SIZE + 1 pixels wide and HASH_SIZE
+    high: one bit per pixel, set when it is brighter than its left neighbour
+    """
+    return _pack_bits(pixels[:, 1:] > pixels[:, :-1])
+
+
+def image_hashes(data: bytes) -> ImageHashes:
+    """Decodes an image and computes its perceptual and difference hashes.
+
+    Args:
+        data (bytes): The encoded image.
+
+    Returns:
+        tuple[int, int]: The 64 bit pHash and dHash.
+    """
+
+    from PIL import Image
+
+    with Image.open(io.BytesIO(data)) as image:
+        image.draft("L", (HASH_SIZE * PHASH_SCALE, HASH_SIZE * PHASH_SCALE))
+        grayscale = image.convert("L")
+    size = HASH_SIZE * PHASH_SCALE
+    phash_pixels = np.asarray(grayscale.resize((size, size), Image.Resampling.LANCZOS), dtype=np.float64)
+    dhash_pixels = np.asarray(grayscale.resize((HASH_SIZE + 1, HASH_SIZE), Image.Resampling.LANCZOS), dtype=np.int16)
+    return phash(phash_pixels), dhash(dhash_pixels)
+
+
+def hamming_distances(hashes: np.ndarray, query: ImageHashes) -> np.ndarray:
+    """
+    Bit differences between every row of an (n, 2) uint64 hash array and the query, as an (n, 2) array
+    """
+    differences = np.bitwise_xor(hashes, np.array(query, dtype=np.uint64))
+    return np.unpackbits(differences.view(np.uint8).reshape(len(hashes), 2, 8), axis=2).sum(axis=2)
+
+
+class PerceptualIndex:
+    """
+    Maps images to values computed from them, matching visually identical
+    images even when they were re-encoded, resized or lightly edited. An
+    image matches an entry when both its pHash and its dHash are within
+    max_distance bits of the entry's.
+
+    Entries are grouped by namespace, so values computed with different
+    models or prompts never match. With a path, entries are appended to a
+    JSON lines file and loaded again on start. The file is compacted once
+    it holds COMPACT_RATIO times more records than there are entries.
+    """
+
+    def __init__(self, path: Optional[str] = None, max_distance: int = 4, max_entries: int = 10000):
+        self.path = Path(path) if path else None
+        self.max_distance = max_distance
+        self.max_entries = max_entries
+        self._hashes: Dict[str, np.ndarray] = {}
+        self._values: Dict[str, List[Dict[str, Any]]] = {}
+        # Records in the file, including the ones replaced by a merge or an eviction
+        self._records = 0
+        self._lock = threading.Lock()
+        if self.path is not None:
+            self._load()
+
+    def lookup(self, namespace: str, hashes: ImageHashes) -> Optional[Dict[str, Any]]:
+        """
+        Return the values stored for the closest matching image, or None
+        """
+        with self._lock:
+            index = self._closest(namespace, hashes)
+            return dict(self._values[namespace][index]) if index is not None else None
+
+    def add(self, namespace: str, hashes: ImageHashes, values: Dict[str, Any]):
+        """
+        Store values for an image, merging them into the entry of a matching image
+        """
+        with self._lock:
+            self._add(namespace, hashes, values)
+            if self.path is not None:
+                record = {"namespace": namespace, "phash": hashes[0], "dhash": hashes[1], "values": values}
+                with open(self.path, "a") as index_file:
+                    index_file.write(json.dumps(record) + "\n")
+                self._records += 1
+                if self._records > COMPACT_RATIO * len(self):
+                    self._compact()
+
+    def __len__(self) -> int:
+        return sum(len(values) for values in self._values.values())
+
+    def _closest(self, namespace: str, hashes: ImageHashes) -> Optional[int]:
+        stored = self._hashes.get(namespace)
+        if stored is None or not len(stored):
+            return None
+        distances = hamming_distances(stored, hashes)
+        matches = np.flatnonzero((distances <= self.max_distance).all(axis=1))
+        if not len(matches):
+            return None
+        return int(matches[np.argmin(distances[matches].sum(axis=1))])
+
+    def _add(self, namespace: str, hashes: ImageHashes, values: Dict[str, Any]):
+        index = self._closest(namespace, hashes)
+        if index is not None:
+            self._values[namespace][index].update(values)
+            return
+        row = np.array([hashes], dtype=np.uint64)
+        stored = self._hashes.get(namespace)
+        self._hashes[namespace] = row if stored is None else np.concatenate([stored, row])
+        self._values.setdefault(namespace, []).append(dict(values))
+        if len(self._values[namespace]) > self.max_entries:
+            # Entries are kept in insertion order, so the oldest are dropped first
+            self._hashes[namespace] = self._hashes[namespace][1:]
+            self._values[namespace].pop(0)
+
+    def _load(self):
+        if not self.path.exists():
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            return
+        records = 0
+        with open(self.path) as index_file:
+            for line in index_file:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # A crash can leave a partly written last line
+                    continue
+                records += 1
+                self._add(record["namespace"], (record["phash"], record["dhash"]), record["values"])
+        self._records = records
+        if records > len(self):
+            self._compact()
+        logger.info(f"Loaded perceptual index :: {self.path} :: {len(self)} entries")
+
+    def _compact(self):
+        # Rewrite the file with one record per entry, replacing merged and evicted records
+        tmp_path = self.path.with_suffix(f".{threading.get_ident()}.tmp")
+        with open(tmp_path, "w") as index_file:
+            for namespace, stored in self._hashes.items():
+                for (phash_, dhash_), values in zip(stored.tolist(), self._values[namespace]):
+                    record = {"namespace": namespace, "phash": phash_, "dhash": dhash_, "values": values}
+                    index_file.write(json.dumps(record) + "\n")
+        os.replace(tmp_path, self.path)
+        self._records = len(self)
+
+
+_perceptual_index: Optional[PerceptualIndex] = None
+_perceptual_index_initialized = False
+_perceptual_index_lock = threading.Lock()
+
+
+def get_perceptual_index() -> Optional[PerceptualIndex]:
+    """
+    Shared perceptual index of logo verdicts and prompts, configured from PERCEPTUAL_INDEX_* variables
+    """
+    global _perceptual_index, _perceptual_index_initialized
+    if not _perceptual_index_initialized:
+        with _perceptual_index_lock:
+            if not _perceptual_index_initialized:
+                if os.getenv("PERCEPTUAL_INDEX", "true").lower() == "true":
+                    path = os.getenv("PERCEPTUAL_INDEX_PATH", ".cache/perceptual_index.jsonl")
+                    logger.info(f"Initializing perceptual index :: {path or 'memory'}")
+                    _perceptual_index = PerceptualIndex(
+                        path=path,
+                        max_distance=int(os.getenv("PERCEPTUAL_INDEX_MAX_DISTANCE", "4")),
+                        max_entries=int(os.getenv("PERCEPTUAL_INDEX_MAX_ENTRIES", "10000")),
+                    )
+                _perceptual_index_initialized = True
+    return _perceptual_index
@@ -0,0 +1,259 @@
+import os
+import time
+import heapq
+import asyncio
+import itertools
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Dict, Iterator, List, Optional
+
+from ..logger import logger
+from .metrics import quota_queue_depth, quota_rejections_total, quota_wait_seconds
+
+
+class TokenBucket:
+    """
+    Async token bucket: tokens refill at rate per second up to capacity,
+    and acquire() waits until enough tokens are available. Waiters are
+    served in arrival order.
+    """
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        if rate <= 0:
+            raise ValueError("Token bucket rate must be positive")
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else 1.0
+        self._tokens = self.capacity
+        self._updated_at = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate)
+        self._updated_at = now
+
+    async def acquire(self, tokens: float = 1):
+        async with self._lock:
+            while True:
+                self._refill()
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                await asyncio.sleep((tokens - self._tokens) / self.rate)
+
+
+# Calls made while serving a client are scheduled ahead of bulk work
+INTERACTIVE = 0
+BATCH = 1
+PRIORITY_NAMES = {INTERACTIVE: "interactive", BATCH: "batch"}
+
+# Seconds a call may wait for a model's quota before it is rejected
+VERTEX_QUOTA_MAX_WAIT = float(os.getenv("VERTEX_QUOTA_MAX_WAIT", "30"))
+# Calls a model's bucket lets through at once after being idle
+VERTEX_QUOTA_BURST = float(os.getenv("VERTEX_QUOTA_BURST", "1"))
+# Vertex AI quotas are per minute, so that is how long to back off after hitting one
+QUOTA_RETRY_AFTER = 60
+
+_priority: ContextVar[int] = ContextVar("request_priority", default=INTERACTIVE)
+
+
+def current_priority() -> int:
+    return _priority.get()
+
+
+@contextmanager
+def request_priority(priority: int) -> Iterator[None]:
+    """
+    Schedule the quota of every model call made in the block at the given priority
+    """
+    token = _priority.set(priority)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+class QuotaExceeded(Exception):
+    """
+    Raised when a model's quota cannot serve a call, either because Vertex AI
+    rejected it (status 429) or because it would have waited too long in the
+    scheduler queue (status 503)
+    """
+
+    detail = "Too many requests, please try again later..."
+
+    def __init__(self, message: str, retry_after: float, status_code: int = 429):
+        super().__init__(message)
+        self.retry_after = retry_after
+        self.status_code = status_code
+
+
+def is_quota_error(error: BaseException) -> bool:
+    """
+    Whether an error is Vertex AI rejecting a call for exceeding a quota
+    """
+    # google.api_core raises ResourceExhausted or TooManyRequests, both with code 429
+    return getattr(error, "code", None) == 429
+
+
+@dataclass(order=True)
+class _Waiter:
+    priority: int
+    sequence: int
+    tokens: float = field(compare=False)
+    future: asyncio.Future = field(compare=False)
+
+
+class QuotaScheduler:
+    """
+    Token bucket shared by every call to one model. Calls that find the
+    bucket empty wait in a priority queue, interactive calls ahead of batch
+    calls and otherwise in arrival order, and are released as tokens refill.
+    A call that would wait longer than max_wait is rejected at once so the
+    client can back off instead of holding a connection open.
+    """
+
+    def __init__(self, name: str, rate: float, capacity: float = 1.0, max_wait: float = 30.0):
+        if rate <= 0:
+            raise ValueError("Quota scheduler rate must be positive")
+        self.name = name
+        self.rate = rate
+        self.capacity = capacity
+        self.max_wait = max_wait
+        self._tokens = capacity
+        self._updated_at = time.monotonic()
+        self._waiters: List[_Waiter] = []
+        self._sequence = itertools.count()
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def depth(self, priority: Optional[int] = None) -> int:
+        """
+        Number of calls waiting, at one priority or in total
+        """
+        return sum(1 for waiter in self._waiters if not waiter.future.done() and priority in (None, waiter.priority))
+
+    def estimated_wait(self, priority: int = INTERACTIVE, tokens: float = 1) -> float:
+        """
+        Seconds a call at this priority would wait behind the calls already queued ahead of it
+        """
+        self._refill()
+        ahead = sum(waiter.tokens for waiter in self._waiters if not waiter.future.done() and waiter.priority <= priority)
+        return max(0.0, (ahead + tokens - self._tokens) / self.rate)
+
+    async def acquire(self, priority: int = INTERACTIVE, tokens: float = 1):
+        """Waits for the tokens of one call.
+
+        Raises:
+            QuotaExceeded: With status 503 if the call would wait longer than max_wait.
+        """
+
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # Waiters left by an event loop that has gone away can never be served
+            self._waiters.clear()
+            self._timer = None
+            self._loop = loop
+        label = PRIORITY_NAMES[priority]
+        self._refill()
+        if not self._waiters and self._tokens >= tokens:
+            self._tokens -= tokens
+            quota_wait_seconds.observe(0.0, self.name, label)
+            return
+        wait = self.estimated_wait(priority, tokens)
+        if wait > self.max_wait:
+            quota_rejections_total.inc(self.name, label)
+            raise QuotaExceeded(f"{self.name} quota queue is full, the call would wait {wait:.1f}s", retry_after=wait, status_code=503)
+        waiter = _Waiter(priority, next(self._sequence), tokens, loop.create_future())
+        heapq.heappush(self._waiters, waiter)
+        start = time.monotonic()
+        self._dispatch()
+        try:
+            # Higher priority calls can keep jumping ahead, so the estimate is not a guarantee
+            await asyncio.wait_for(waiter.future, timeout=self.max_wait)
+        except asyncio.TimeoutError:
+            quota_rejections_total.inc(self.name, label)
+            raise QuotaExceeded(f"{self.name} quota was not available within {self.max_wait:.0f}s", retry_after=self.estimated_wait(priority, tokens), status_code=503)
+        finally:
+            # A waiter that timed out or was cancelled is skipped and the next one considered
+            self._dispatch()
+        quota_wait_seconds.observe(time.monotonic() - start, self.name, label)
+
+    def try_acquire(self, tokens: float = 1) -> bool:
+        """
+        Take the tokens of one call only if they are available now and no call
+        is waiting for them, without queueing
+        """
+        self._refill()
+        if self.depth() == 0 and self._tokens >= tokens:
+            self._tokens -= tokens
+            return True
+        return False
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate)
+        self._updated_at = now
+
+    def _dispatch(self):
+        self._refill()
+        while self._waiters:
+            waiter = self._waiters[0]
+            if waiter.future.done():
+                heapq.heappop(self._waiters)
+            elif self._tokens >= waiter.tokens:
+                heapq.heappop(self._waiters)
+                self._tokens -= waiter.tokens
+                waiter.future.set_result(None)
+            else:
+                break
+        for priority, label in PRIORITY_NAMES.items():
+            quota_queue_depth.set(self.depth(priority), self.name, label)
+        if self._waiters and self._timer is None:
+            delay = (self._waiters[0].tokens - self._tokens) / self.rate
+            self._timer = self._loop.call_later(delay, self._on_timer)
+
+    def _on_timer(self):
+        self._timer = None
+        self._dispatch()
+
+
+_schedulers: Dict[str, QuotaScheduler] = {}
+_schedulers_lock = threading.Lock()
+
+
+def get_model_scheduler(model_name: str, requests_per_minute: float) -> Optional[QuotaScheduler]:
+    """
+    Shared scheduler for a model, or None when its quota is not limited.
+    Both API versions calling the same model share its scheduler.
+    """
+    if requests_per_minute <= 0:
+        return None
+    scheduler = _schedulers.get(model_name)
+    if scheduler is None:
+        with _schedulers_lock:
+            scheduler = _schedulers.get(model_name)
+            if scheduler is None:
+                logger.info(f"Initializing quota scheduler :: {model_name} :: {requests_per_minute} requests/min")
+                scheduler = _schedulers[model_name] = QuotaScheduler(
+                    model_name,
+                    rate=requests_per_minute / 60,
+                    capacity=VERTEX_QUOTA_BURST,
+                    max_wait=VERTEX_QUOTA_MAX_WAIT,
+                )
+    return scheduler
+
+
+@contextmanager
+def quota_errors(model_name: str) -> Iterator[None]:
+    """
+    Turn a quota rejection from Vertex AI in the block into QuotaExceeded
+    """
+    try:
+        yield
+    except Exception as e:
+        if is_quota_error(e):
+            raise QuotaExceeded(f"Vertex AI quota exceeded for {model_name}", retry_after=QUOTA_RETRY_AFTER) from e
+        raise
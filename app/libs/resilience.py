@@ -0,0 +1,266 @@
+import os
+import time
+import asyncio
+import threading
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from ..logger import logger
+from .metrics import circuit_breaker_rejections_total, circuit_breaker_state, hedged_requests_total, model_call_latency
+from .rate_limit import QuotaExceeded, current_priority, get_model_scheduler, quota_errors
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+# Consecutive failures that open a model's circuit, and seconds before a trial call is let through
+CIRCUIT_BREAKER_FAILURES = int(os.getenv("CIRCUIT_BREAKER_FAILURES", "5"))
+CIRCUIT_BREAKER_RESET_TIMEOUT = float(os.getenv("CIRCUIT_BREAKER_RESET_TIMEOUT", "30"))
+
+# Send a second Gemini call when the first is slower than the HEDGE_QUANTILE latency of the stage's model calls
+HEDGE_REQUESTS = os.getenv("HEDGE_REQUESTS", "false").lower() == "true"
+HEDGE_QUANTILE = float(os.getenv("HEDGE_QUANTILE", "0.95"))
+# Below this many observations the latency quantile is too noisy to hedge on
+HEDGE_MIN_SAMPLES = int(os.getenv("HEDGE_MIN_SAMPLES", "20"))
+
+
+class CircuitOpen(Exception):
+    """
+    Raised instead of calling a model whose circuit is open
+    """
+
+    status_code = 503
+    detail = "The image models are temporarily unavailable, please try again later..."
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def is_failure(error: BaseException) -> bool:
+    """
+    Whether an error says the model is unhealthy, as opposed to a bad
+    request, an exhausted quota or a caller that went away
+    """
+    if isinstance(error, (asyncio.CancelledError, QuotaExceeded, CircuitOpen)):
+        return False
+    code = getattr(error, "code", None)
+    # google.api_core errors carry the HTTP status, 4xx are the caller's problem
+    return not (isinstance(code, int) and 400 <= code < 500)
+
+
+class CircuitBreaker:
+    """
+    Fails calls fast while a model is unhealthy. After failure_threshold
+    consecutive failures the circuit opens and calls raise CircuitOpen
+    without reaching the model. Once reset_timeout has passed one trial
+    call is let through: its success closes the circuit and its failure
+    opens it again.
+    """
+
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+        circuit_breaker_state.set(STATE_VALUES[CLOSED], name)
+
+    def before_call(self):
+        """
+        Raise CircuitOpen unless the call may go ahead
+        """
+        with self._lock:
+            if self.state == OPEN:
+                remaining = self._opened_at + self.reset_timeout - time.monotonic()
+                if remaining > 0:
+                    circuit_breaker_rejections_total.inc(self.name)
+                    raise CircuitOpen(f"Circuit for {self.name} is open", retry_after=remaining)
+                self._set_state(HALF_OPEN)
+            if self.state == HALF_OPEN:
+                if self._trial_in_flight:
+                    circuit_breaker_rejections_total.inc(self.name)
+                    raise CircuitOpen(f"Circuit for {self.name} is half open, waiting for the trial call", retry_after=self.reset_timeout)
+                self._trial_in_flight = True
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._trial_in_flight = False
+            if self.state != CLOSED:
+                logger.info(f"Closing circuit :: {self.name}")
+                self._set_state(CLOSED)
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._trial_in_flight = False
+            if self.state == HALF_OPEN or self._failures >= self.failure_threshold:
+                if self.state != OPEN:
+                    logger.warning(f"Opening circuit after {self._failures} consecutive failures :: {self.name}")
+                self._opened_at = time.monotonic()
+                self._set_state(OPEN)
+
+    def record_ignored(self):
+        """
+        The call ended without saying anything about the model's health
+        """
+        with self._lock:
+            self._trial_in_flight = False
+
+    async def call(self, func: Callable[[], Awaitable[Any]]) -> Any:
+        self.before_call()
+        try:
+            result = await func()
+        except BaseException as e:
+            if is_failure(e):
+                self.record_failure()
+            else:
+                self.record_ignored()
+            raise
+        self.record_success()
+        return result
+
+    def _set_state(self, state: str):
+        self.state = state
+        circuit_breaker_state.set(STATE_VALUES[state], self.name)
+
+
+async def hedge(func: Callable[[], Awaitable[Any]], delay: float, name: str = "", admit: Optional[Callable[[], bool]] = None) -> Any:
+    """Calls func and, if it has not finished after delay seconds, calls it again.
+
+    The first call to succeed wins and the other is cancelled. A call that
+    fails before the delay is not hedged, its error is raised at once.
+
+    Args:
+        func (Callable): Starts one attempt of the call.
+        delay (float): Seconds to wait before sending the second attempt.
+        name (str): Label of the call in the hedged requests metric.
+        admit (Callable, optional): Asked once the delay has passed, the second
+            attempt is only sent if it returns True, e.g. when quota is left.
+
+    Returns:
+        Any: The result of the first attempt to succeed.
+
+    Raises:
+        Exception: The primary attempt's error if both attempts fail.
+    """
+
+    primary = asyncio.ensure_future(func())
+    tasks = [primary]
+    try:
+        done, _ = await asyncio.wait(tasks, timeout=delay)
+        if done:
+            return primary.result()
+        if admit is not None and not admit():
+            hedged_requests_total.inc(name, "skipped")
+            return await primary
+        hedged_requests_total.inc(name, "sent")
+        tasks.append(asyncio.ensure_future(func()))
+        pending = set(tasks)
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    if task is not primary:
+                        hedged_requests_total.inc(name, "won")
+                    return task.result()
+        return primary.result()
+    finally:
+        for task in tasks:
+            if not task.done():
+                task.cancel()
+            elif not task.cancelled():
+                # The loser's error has been handled, do not log it as never retrieved
+                task.exception()
+
+
+def hedge_delay(stage: str) -> Optional[float]:
+    """
+    The latency quantile of the stage's model calls to hedge after, or None
+    when hedging is disabled or the stage has too few observations. Time
+    spent waiting for quota is not part of it.
+    """
+    if not HEDGE_REQUESTS:
+        return None
+    series = model_call_latency.snapshot().get((stage,))
+    if series is None or series["count"] < HEDGE_MIN_SAMPLES:
+        return None
+    return model_call_latency.quantile(HEDGE_QUANTILE, stage)
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+
+def get_circuit_breaker(model_name: str) -> Optional[CircuitBreaker]:
+    """
+    Shared circuit breaker for a model, configured from CIRCUIT_BREAKER_* variables,
+    or None when CIRCUIT_BREAKER_FAILURES is 0
+    """
+    if CIRCUIT_BREAKER_FAILURES <= 0:
+        return None
+    breaker = _breakers.get(model_name)
+    if breaker is None:
+        with _breakers_lock:
+            breaker = _breakers.get(model_name)
+            if breaker is None:
+                breaker = _breakers[model_name] = CircuitBreaker(
+                    model_name,
+                    failure_threshold=CIRCUIT_BREAKER_FAILURES,
+                    reset_timeout=CIRCUIT_BREAKER_RESET_TIMEOUT,
+                )
+    return breaker
+
+
+async def guarded_call(
+    model_name: str,
+    func: Callable[[], Awaitable[Any]],
+    hedge_stage: Optional[str] = None,
+    requests_per_minute: float = 0,
+) -> Any:
+    """Calls a model within its quota and through its circuit breaker, hedging slow calls when enabled.
+
+    The call first waits for the model's quota at the current priority. The
+    hedge delay only starts once a token is granted, and a second attempt is
+    only sent if it can take another token at once, so hedging never adds
+    load while the quota queue is backed up.
+
+    Args:
+        model_name (str): The model the call goes to, each has its own circuit and quota.
+        func (Callable): Starts one attempt of the call.
+        hedge_stage (str, optional): Pipeline stage whose model call latency decides
+            when to send a second attempt. Calls without one are never hedged.
+        requests_per_minute (float): The model's quota, 0 leaves it unthrottled.
+
+    Returns:
+        Any: The result of the call.
+
+    Raises:
+        CircuitOpen: If the model's circuit is open.
+        QuotaExceeded: If the quota is not available in time, or Vertex AI rejected the call.
+    """
+
+    breaker = get_circuit_breaker(model_name)
+    scheduler = get_model_scheduler(model_name, requests_per_minute)
+    if scheduler is not None:
+        await scheduler.acquire(current_priority())
+
+    async def call() -> Any:
+        with quota_errors(model_name):
+            return await func()
+
+    async def attempt() -> Any:
+        start = time.perf_counter()
+        result = await (call() if breaker is None else breaker.call(call))
+        if hedge_stage is not None:
+            model_call_latency.observe(time.perf_counter() - start, hedge_stage)
+        return result
+
+    delay = hedge_delay(hedge_stage) if hedge_stage is not None else None
+    if delay is None:
+        return await attempt()
+    return await hedge(attempt, delay, name=hedge_stage, admit=scheduler.try_acquire if scheduler is not None else None)
@@ -0,0 +1,184 @@
+import os
+import time
+import uuid
+import asyncio
+import threading
+from abc import ABC, abstractmethod
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from ..logger import logger
+from .metrics import single_flight_calls_total
+
+# Compare-and-delete so a replica only ever releases the lock it holds
+RELEASE_SCRIPT = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("del", KEYS[1])
+end
+return 0
+"""
+
+
+class LockBackend(ABC):
+    """
+    Lock shared by every process that coalesces work on the same keys
+    """
+
+    @abstractmethod
+    async def acquire(self, key: str, token: str, ttl: float) -> bool:
+        """
+        Take the lock for key unless someone else holds it, expiring after ttl seconds
+        """
+
+    @abstractmethod
+    async def release(self, key: str, token: str):
+        """
+        Release the lock for key if it is still held with token
+        """
+
+
+class MemoryLockBackend(LockBackend):
+    """
+    Locks local to this process, for a single replica or for tests
+    """
+
+    def __init__(self):
+        self._locks: Dict[str, Tuple[str, float]] = {}
+        self._lock = threading.Lock()
+
+    async def acquire(self, key: str, token: str, ttl: float) -> bool:
+        now = time.monotonic()
+        with self._lock:
+            holder = self._locks.get(key)
+            if holder is not None and holder[1] > now:
+                return False
+            self._locks[key] = (token, now + ttl)
+            return True
+
+    async def release(self, key: str, token: str):
+        with self._lock:
+            holder = self._locks.get(key)
+            if holder is not None and holder[0] == token:
+                del self._locks[key]
+
+
+class RedisLockBackend(LockBackend):
+    """
+    Locks on any Redis compatible server, shared across replicas
+    """
+
+    def __init__(self, url: Optional[str] = None, client: Any = None, prefix: str = "singleflight:"):
+        if client is None:
+            try:
+                import redis
+            except ImportError as e:
+                raise ImportError("RedisLockBackend requires the 'redis' package to be installed") from e
+            client = redis.Redis.from_url(url)
+        self.client = client
+        self.prefix = prefix
+
+    async def acquire(self, key: str, token: str, ttl: float) -> bool:
+        acquired = await asyncio.to_thread(self.client.set, self.prefix + key, token, nx=True, px=int(ttl * 1000))
+        return bool(acquired)
+
+    async def release(self, key: str, token: str):
+        await asyncio.to_thread(self.client.eval, RELEASE_SCRIPT, 1, self.prefix + key, token)
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls with the same key into one execution whose
+    result, or exception, is shared by every caller.
+
+    Within a process, callers await the call already in flight. With a lock
+    backend, the first process to take the key's lock runs the call and the
+    others wait for the lock to be released before running theirs, which is
+    then served from the shared result cache.
+    """
+
+    def __init__(self, backend: Optional[LockBackend] = None, lock_ttl: float = 120, poll_interval: float = 0.5):
+        self.backend = backend
+        self.lock_ttl = lock_ttl
+        self.poll_interval = poll_interval
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+    async def do(self, key: str, func: Callable[[], Awaitable[Any]]) -> Any:
+        future = self._inflight.get(key)
+        if future is None:
+            single_flight_calls_total.inc("leader")
+            future = asyncio.ensure_future(self._run(key, func))
+            self._inflight[key] = future
+            future.add_done_callback(lambda done: self._forget(key, done))
+        else:
+            single_flight_calls_total.inc("coalesced")
+            logger.info(f"Joining in-flight call :: {key}")
+        # A caller that goes away must not cancel the call for everyone else
+        return await asyncio.shield(future)
+
+    def _forget(self, key: str, future: asyncio.Future):
+        if self._inflight.get(key) is future:
+            del self._inflight[key]
+        if not future.cancelled():
+            # Mark the exception as retrieved when every caller has gone away
+            future.exception()
+
+    async def _run(self, key: str, func: Callable[[], Awaitable[Any]]) -> Any:
+        if self.backend is None:
+            return await func()
+        token = uuid.uuid4().hex
+        deadline = time.monotonic() + self.lock_ttl
+        acquired = await self.backend.acquire(key, token, self.lock_ttl)
+        while not acquired and time.monotonic() < deadline:
+            await asyncio.sleep(self.poll_interval)
+            acquired = await self.backend.acquire(key, token, self.lock_ttl)
+        if not acquired:
+            logger.warning(f"Timed out waiting for the single-flight lock, running anyway :: {key}")
+        try:
+            return await func()
+        finally:
+            if acquired:
+                await self.backend.release(key, token)
+
+
+def create_single_flight(backend: str, redis_url: Optional[str] = None, lock_ttl: float = 120, poll_interval: float = 0.5) -> Optional[SingleFlight]:
+    """Creates a single-flight group for the given lock backend name.
+
+    Args:
+        backend (str): One of "memory", "redis" or "none".
+
+    Returns:
+        SingleFlight: The single-flight group, or None when coalescing is disabled.
+    """
+
+    backend = backend.lower()
+    if backend == "none":
+        return None
+    if backend == "memory":
+        return SingleFlight(MemoryLockBackend(), lock_ttl=lock_ttl, poll_interval=poll_interval)
+    if backend == "redis":
+        return SingleFlight(RedisLockBackend(url=redis_url), lock_ttl=lock_ttl, poll_interval=poll_interval)
+    raise ValueError(f"Unsupported single-flight backend: {backend}")
+
+
+_single_flight: Optional[SingleFlight] = None
+_single_flight_initialized = False
+_single_flight_lock = threading.Lock()
+
+
+def get_single_flight() -> Optional[SingleFlight]:
+    """
+    Shared single-flight group, configured from SINGLE_FLIGHT_* variables
+    """
+    global _single_flight, _single_flight_initialized
+    if not _single_flight_initialized:
+        with _single_flight_lock:
+            if not _single_flight_initialized:
+                backend = os.getenv("SINGLE_FLIGHT_BACKEND", "memory")
+                logger.info(f"Initializing single-flight group :: {backend}")
+                _single_flight = create_single_flight(
+                    backend,
+                    redis_url=os.getenv("SINGLE_FLIGHT_REDIS_URL"),
+                    lock_ttl=float(os.getenv("SINGLE_FLIGHT_LOCK_TTL", "120")),
+                    poll_interval=float(os.getenv("SINGLE_FLIGHT_POLL_INTERVAL", "0.5")),
+                )
+                _single_flight_initialized = True
+    return _single_flight
@@ -1,14 +1,23 @@
 import os
+import time
+import threading
+from collections import OrderedDict, deque
 from dotenv import load_dotenv
-from typing import Union, Optional
+from typing import Dict, Union, Optional
 
 from ..logger import logger
 from .base_storage import Storage
+from .metrics import count_outcome, storage_upload_bytes_total, storage_uploads_total
 from google.cloud import storage
 from google.oauth2 import service_account
 
 load_dotenv()
 
+# Latencies kept for the upload statistics
+UPLOAD_LATENCY_WINDOW = 1000
+# Paths remembered as already public, the least recently used are forgotten first
+PUBLIC_PATHS_CACHE_SIZE = 10000
+
 class GCPStorage(Storage):
     __client__ = None
     # tmp_folder = "/tmp/kb_files"
@@ -17,16 +26,38 @@ class GCPStorage(Storage):
         logger.info("Initializing GCP Storage") 
         bucket_name = os.getenv("GCP_BUCKET_NAME")
         storage_credentials_json = os.getenv("GCP_STORAGE_CREDENTIALS")
+        # The client library sends every request to the emulator, anonymously, when this is set
+        emulator_host = os.getenv("STORAGE_EMULATOR_HOST")
 
-        if not bucket_name or not storage_credentials_json:
+        if not bucket_name or not (storage_credentials_json or emulator_host):
             raise ValueError(
                 "GCPStorage client not initialized. Missing google bucket_name or crendentials")
         
-        credentials = service_account.Credentials.from_service_account_file(storage_credentials_json)
         self.__bucket_name__ = bucket_name
-        self.__client__ = storage.Client(credentials=credentials)
+        if storage_credentials_json:
+            credentials = service_account.Credentials.from_service_account_file(storage_credentials_json)
+            self.__client__ = storage.Client(credentials=credentials)
+        else:
+            self.__client__ = storage.Client()
+        # The bucket handle is reused for the life of the process
+        self.__bucket__ = self.__client__.bucket(bucket_name)
         # os.makedirs(self.tmp_folder, exist_ok=True)
 
+        # Upload tuning, chunk size must be a multiple of 256 KB and switches to resumable uploads
+        chunk_size = os.getenv("GCS_UPLOAD_CHUNK_SIZE")
+        self.chunk_size = int(chunk_size) if chunk_size else None
+        # "md5", "crc32c" or unset for the client library default
+        self.checksum = os.getenv("GCS_UPLOAD_CHECKSUM") or None
+        # Skip make_public when the bucket already serves objects publicly
+        self.assume_public = (os.getenv("GCS_ASSUME_PUBLIC") or "false").lower() == "true"
+        self.__public_paths__: "OrderedDict[str, None]" = OrderedDict()
+        self._public_paths_lock = threading.Lock()
+
+        self._stats_lock = threading.Lock()
+        self.bytes_uploaded = 0
+        self.upload_count = 0
+        self.upload_latencies = deque(maxlen=UPLOAD_LATENCY_WINDOW)
+
 
     def write_file(
         self,
@@ -37,8 +68,7 @@ class GCPStorage(Storage):
         if not self.__client__:
             raise Exception("GCPSyncStorage client not initialized")
 
-        bucket = self.__client__.bucket(self.__bucket_name__)
-        blob = bucket.blob(file_path)
+        blob = self.__bucket__.blob(file_path, chunk_size=self.chunk_size)
 
         if mime_type is None:
             mime_type = (
@@ -46,15 +76,57 @@ class GCPStorage(Storage):
                 if file_path.lower().endswith(".jpg") or file_path.lower().endswith(".jpeg")
                 else "image/png"
             )
-        blob.upload_from_string(file_content, content_type=mime_type)
-        logger.info(f"File uploaded to GCP bucket: {file_path}")
+        upload_options = {"content_type": mime_type}
+        if self.checksum:
+            upload_options["checksum"] = self.checksum
+        start = time.perf_counter()
+        with count_outcome(storage_uploads_total, "gcs"):
+            blob.upload_from_string(file_content, **upload_options)
+        latency = time.perf_counter() - start
+        # Overwriting an object resets its ACL, so it has to be made public again
+        with self._public_paths_lock:
+            self.__public_paths__.pop(file_path, None)
+        size = len(file_content.encode()) if isinstance(file_content, str) else len(file_content)
+        storage_upload_bytes_total.inc("gcs", amount=size)
+        with self._stats_lock:
+            self.bytes_uploaded += size
+            self.upload_count += 1
+            self.upload_latencies.append(latency)
+        logger.info(f"File uploaded to GCP bucket: {file_path} ({size} bytes in {latency:.3f}s)")
 
     def public_url(self, file_path: str) -> str:
         if not self.__client__:
             raise Exception("GCP Storage client not initialized")
 
-        bucket = self.__client__.bucket(self.__bucket_name__)
-        blob = bucket.blob(file_path)
-        blob.make_public()
+        blob = self.__bucket__.blob(file_path)
+        if not self.assume_public and not self._is_known_public(file_path):
+            blob.make_public()
+            with self._public_paths_lock:
+                self.__public_paths__[file_path] = None
+                if len(self.__public_paths__) > PUBLIC_PATHS_CACHE_SIZE:
+                    self.__public_paths__.popitem(last=False)
         logger.debug(f"GCP Public URL :: {blob.public_url}")
-        return blob.public_url
\ No newline at end of file
+        return blob.public_url
+
+    def _is_known_public(self, file_path: str) -> bool:
+        with self._public_paths_lock:
+            if file_path not in self.__public_paths__:
+                return False
+            self.__public_paths__.move_to_end(file_path)
+            return True
+
+    def upload_stats(self) -> Dict[str, float]:
+        """
+        Upload counters and latency summary over the most recent uploads
+        """
+        with self._stats_lock:
+            latencies = sorted(self.upload_latencies)
+            stats = {
+                "bytes_uploaded": self.bytes_uploaded,
+                "upload_count": self.upload_count,
+            }
+        if latencies:
+            stats["latency_avg"] = sum(latencies) / len(latencies)
+            stats["latency_p95"] = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+            stats["latency_max"] = latencies[-1]
+        return stats
@@ -0,0 +1,23 @@
+import json
+from typing import Any, Dict
+
+NDJSON = "ndjson"
+SSE = "sse"
+
+MEDIA_TYPES = {
+    NDJSON: "application/x-ndjson",
+    SSE: "text/event-stream",
+}
+
+
+def format_sse(event: str, data: Dict[str, Any]) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+def format_event(event: Dict[str, Any], stream_format: str) -> str:
+    """
+    Format a pipeline event, a dict with an "event" key, as an NDJSON line or an SSE message
+    """
+    if stream_format == SSE:
+        return format_sse(event["event"], {key: value for key, value in event.items() if key != "event"})
+    return json.dumps(event, default=str) + "\n"
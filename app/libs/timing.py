@@ -0,0 +1,77 @@
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Dict, Iterator, Optional
+
+from .metrics import stage_latency
+
+
+class StageTimer:
+    """
+    Collects wall-clock durations (in seconds) of named pipeline stages
+    """
+
+    def __init__(self):
+        self.stages: Dict[str, float] = {}
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    def record(self, name: str, duration: float):
+        self.stages[name] = duration
+        stage_latency.observe(duration, name)
+
+    def run(self, name: str, func: Callable[..., Any], *args, **kwargs) -> Any:
+        """
+        Call func(*args, **kwargs) and record its duration under name
+        """
+        with self.stage(name):
+            return func(*args, **kwargs)
+
+    async def run_async(self, name: str, awaitable: Awaitable[Any]) -> Any:
+        """
+        Await awaitable and record its duration under name
+        """
+        with self.stage(name):
+            return await awaitable
+
+    def summary(self) -> str:
+        return ", ".join(f"{name}={duration:.3f}s" for name, duration in self.stages.items())
+
+    def server_timing(self, total: Optional[float] = None) -> str:
+        """
+        Format the stages as a Server-Timing header value, durations in milliseconds
+        """
+        metrics = [f"{name};dur={duration * 1000:.1f}" for name, duration in self.stages.items()]
+        if total is not None:
+            metrics.append(f"total;dur={total * 1000:.1f}")
+        return ", ".join(metrics)
+
+
+# Timer of the request being handled, set by the timing middleware
+_current_timer: ContextVar[Optional[StageTimer]] = ContextVar("current_timer", default=None)
+
+
+def current_timer() -> StageTimer:
+    """
+    Timer bound to the current request, or a standalone timer outside of one
+    """
+    timer = _current_timer.get()
+    return timer if timer is not None else StageTimer()
+
+
+@contextmanager
+def bind_timer(timer: StageTimer) -> Iterator[StageTimer]:
+    """
+    Make timer the current timer for the duration of the block
+    """
+    token = _current_timer.set(timer)
+    try:
+        yield timer
+    finally:
+        _current_timer.reset(token)
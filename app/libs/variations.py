@@ -0,0 +1,168 @@
+"""Storing generated variations and replaying cached results.
+
+Both API versions generate their variations differently but store them,
+render their renditions and stream the resulting events the same way.
+"""
+
+import time
+import asyncio
+from typing import TYPE_CHECKING, Any, AsyncIterator, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from ..logger import logger
+from ..utils import get_extension_from_mimetype
+from .base_storage import Storage
+from .cache import Cache
+from .imaging import Rendition, RenditionSpec, render_renditions_async
+from .timing import StageTimer
+
+if TYPE_CHECKING:
+    from vertexai.preview.vision_models import ImageGenerationResponse
+
+# Maps a file name to its storage path and its public URL
+Locator = Callable[[str], Tuple[str, str]]
+
+
+def replay_cached_variations(cached: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+    """
+    Events of a cached result, in the same order as a fresh run
+    """
+    yield {"event": "logo", "logo": cached["logo"]}
+    renditions = cached.get("renditions", {})
+    for index, url in enumerate(cached["images"]):
+        yield {"event": "image", "index": index, "url": url}
+    for index, url in enumerate(cached["images"]):
+        for rendition in renditions.get(url, []):
+            yield {"event": "rendition", "index": index, **rendition}
+    yield {"event": "done", "logo": cached["logo"], "images": cached["images"], "renditions": renditions}
+
+
+async def render_variation_renditions(images: "ImageGenerationResponse", specs: Sequence[RenditionSpec]) -> List[List[Rendition]]:
+    """Renders the configured sizes and formats of every generated image in the worker pool.
+
+    Args:
+        images (ImageGenerationResponse): The generated images.
+        specs (list[RenditionSpec]): The renditions to render for each image.
+
+    Returns:
+        list[list[Rendition]]: The renditions of each image, empty for images that could not be decoded.
+    """
+
+    if not specs:
+        return [[] for _ in images]
+    results = await asyncio.gather(*(render_renditions_async(image._image_bytes, specs) for image in images), return_exceptions=True)
+    renditions = []
+    for index, result in enumerate(results):
+        if isinstance(result, Exception):
+            logger.warning(f"Could not render the renditions of image variation {index} :: {result!r}")
+            result = []
+        renditions.append(result)
+    return renditions
+
+
+async def store_variations(
+    images: "ImageGenerationResponse",
+    file_stem: str,
+    locate: Locator,
+    storage: Storage,
+    timer: StageTimer,
+    logo: Dict[str, Any],
+    prompt: str,
+    rendition_specs: Sequence[RenditionSpec],
+    max_workers: int,
+    result_cache: Optional[Cache] = None,
+    cache_key: Optional[str] = None,
+) -> AsyncIterator[Dict[str, Any]]:
+    """Uploads the variations and their renditions, yielding an event as each one is stored.
+
+    Yields "image" events as each upload completes, "rendition" events as
+    each rendition of an uploaded image is stored and finally the "done"
+    event. The result is cached when every variation was stored.
+
+    Args:
+        images (ImageGenerationResponse): The generated images.
+        file_stem (str): Start of every file name, followed by the variation index.
+        locate (Callable): Maps a file name to its storage path and public URL.
+        storage (Storage): Where the files are written.
+        timer (StageTimer): Records the duration of each stage.
+        logo (dict): The logo detection verdict.
+        prompt (str): The prompt the images were generated from.
+        rendition_specs (list[RenditionSpec]): The renditions stored next to each image.
+        max_workers (int): Maximum number of files uploaded at the same time.
+        result_cache (Cache, optional): Where the result is stored.
+        cache_key (str, optional): The key of the result in the cache.
+
+    Raises:
+        Exception: The first upload error if no variation could be stored.
+    """
+
+    uploads = []
+    public_urls = []
+    for index, image in enumerate(images):
+        extension = get_extension_from_mimetype(image._mime_type)
+        filepath, url = locate(f"{file_stem}_{index}.{extension}")
+        logger.info(f"Filename :: {filepath}")
+        uploads.append((filepath, image._image_bytes, image._mime_type))
+        public_urls.append(url)
+    # Renditions are encoded in the worker pool while the originals upload, the coroutine
+    # is only created once the task runs so cancelling it early leaves nothing unawaited
+    async def render():
+        return await timer.run_async("rendition_rendering", render_variation_renditions(images, rendition_specs))
+
+    rendering = asyncio.create_task(render())
+    uploaded = [None] * len(uploads)
+    errors = []
+    upload_start = time.perf_counter()
+    try:
+        async for index, result in storage.iter_write_files_async(uploads, max_workers=max_workers):
+            timer.record(f"upload_{index}", result.duration)
+            if result.ok:
+                uploaded[index] = public_urls[index]
+                yield {"event": "image", "index": index, "url": public_urls[index]}
+            else:
+                logger.error(f"Failed to upload image variation :: {result.file_path} :: {result.error!r}")
+                errors.append(result.error)
+    except BaseException:
+        # The consumer stopped listening or the storage backend failed
+        rendering.cancel()
+        raise
+    timer.record("upload", time.perf_counter() - upload_start)
+    image_urls = [url for url in uploaded if url is not None]
+    if uploads and not image_urls:
+        rendering.cancel()
+        raise errors[0]
+    rendition_uploads = []
+    rendition_details = []
+    for index, image_renditions in enumerate(await rendering):
+        # Renditions of an image that failed to upload would have nothing to belong to
+        if uploaded[index] is None:
+            continue
+        for rendition in image_renditions:
+            filepath, url = locate(f"{file_stem}_{index}_{rendition.width}w.{rendition.extension}")
+            rendition_uploads.append((filepath, rendition.data, rendition.mime_type))
+            rendition_details.append((index, {
+                "url": url,
+                "width": rendition.width,
+                "height": rendition.height,
+                "mime_type": rendition.mime_type,
+            }))
+    renditions = {url: [] for url in image_urls}
+    stored = [None] * len(rendition_uploads)
+    if rendition_uploads:
+        upload_start = time.perf_counter()
+        async for position, result in storage.iter_write_files_async(rendition_uploads, max_workers=max_workers):
+            if result.ok:
+                stored[position] = rendition_details[position]
+                index, rendition = rendition_details[position]
+                yield {"event": "rendition", "index": index, **rendition}
+            else:
+                # A missing rendition does not fail the request, clients fall back to the original
+                logger.error(f"Failed to upload image rendition :: {result.file_path} :: {result.error!r}")
+        timer.record("rendition_upload", time.perf_counter() - upload_start)
+    for detail in stored:
+        if detail is not None:
+            index, rendition = detail
+            renditions[uploaded[index]].append(rendition)
+    if result_cache is not None and cache_key is not None and not errors:
+        await result_cache.aset(cache_key, {"logo": logo, "prompt": prompt, "images": image_urls, "renditions": renditions})
+    logger.info(f"Pipeline stage timings :: {timer.summary()}")
+    yield {"event": "done", "logo": logo, "images": image_urls, "renditions": renditions}
@@ -1,3 +1,4 @@
+import json
 import logging
 import logging.config
 import os
@@ -14,6 +15,14 @@ logging.config.fileConfig(os.path.join(os.path.dirname(__file__), "logging.conf"
 logger = logging.getLogger("kb_api")
 logger.setLevel(os.environ["LOG_LEVEL"])
 
+
+def log_event(event: str, level: int = logging.INFO, **fields):
+    """
+    Log a single-line JSON record so it can be parsed by log aggregators
+    """
+    if logger.isEnabledFor(level):
+        logger.log(level, json.dumps({"event": event, **fields}, default=str))
+
 # Example usage
 # logger.debug("This is a debug message.")
 # logger.info("This is an info message.")
@@ -1,14 +1,50 @@
+import os
+import time
+import asyncio
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
 from dotenv import load_dotenv
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import Response
 
+from .dependencies import get_storage
+from .libs import metrics
+from .libs.http import close_http_client
+from .libs.imaging import shutdown_process_pool
+from .libs.jobs import get_job_manager
+from .libs.timing import StageTimer, bind_timer
+from .logger import logger, log_event
 from .routers import router_v1, router_v2
+from .services.v1 import image_variation as image_variation_v1
+from .services.v2 import image_variation as image_variation_v2
 
 load_dotenv()
 
+WARM_UP_MODELS = os.getenv("WARM_UP_MODELS", "true").lower() == "true"
+
+def warm_up_models():
+    try:
+        get_storage()
+        image_variation_v1.warm_up_models()
+        image_variation_v2.warm_up_models()
+    except Exception:
+        logger.exception("Error while warming up the storage client and model handles")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if WARM_UP_MODELS:
+        await asyncio.to_thread(warm_up_models)
+    await get_job_manager().start()
+    yield
+    await get_job_manager().stop()
+    await close_http_client()
+    shutdown_process_pool()
+
 app = FastAPI(
     root_path= "/imagegen",
-    title= "KB Image Generation APIs"
+    title= "KB Image Generation APIs",
+    lifespan=lifespan
 )
 app.add_middleware(
     CORSMiddleware,
@@ -17,9 +53,51 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+
+def log_request_timing(request: Request, status: int, timer: StageTimer, total: float):
+    if timer.stages:
+        log_event(
+            "request_timing",
+            method=request.method,
+            path=request.url.path,
+            status=status,
+            total_ms=round(total * 1000, 1),
+            stages_ms={name: round(duration * 1000, 1) for name, duration in timer.stages.items()},
+        )
+
+async def timed_body(body_iterator: AsyncIterator[bytes], request: Request, status: int, timer: StageTimer, start: float) -> AsyncIterator[bytes]:
+    # Logs the stages once the body has been sent, or the client went away
+    try:
+        async for chunk in body_iterator:
+            yield chunk
+    finally:
+        log_request_timing(request, status, timer, time.perf_counter() - start)
+
+@app.middleware("http")
+async def server_timing(request: Request, call_next):
+    # Pipeline stages record into the request timer, which is reported back
+    # in the Server-Timing header and as a structured log line
+    timer = StageTimer()
+    start = time.perf_counter()
+    with bind_timer(timer):
+        response = await call_next(request)
+    if "content-length" not in response.headers:
+        # A streamed body runs the pipeline while it is sent, after the headers,
+        # so its stages are only logged once the body ends
+        response.body_iterator = timed_body(response.body_iterator, request, response.status_code, timer, start)
+        return response
+    total = time.perf_counter() - start
+    response.headers["Server-Timing"] = timer.server_timing(total)
+    log_request_timing(request, response.status_code, timer, total)
+    return response
+
 app.include_router(router_v1)
 app.include_router(router_v2)
 
 @app.get("/")
 def read_root():
-    return {"This is": "Image Generation Application"}
\ No newline at end of file
+    return {"This is": "Image Generation Application"}
+
+@app.get("/metrics", include_in_schema=False)
+def read_metrics():
+    return Response(content=metrics.registry.render(), media_type=metrics.CONTENT_TYPE)
\ No newline at end of file
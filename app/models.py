@@ -1,4 +1,4 @@
-from typing import List
+from typing import Dict, List, Optional
 from pydantic import BaseModel
 
 class ImageResponse(BaseModel):
@@ -9,6 +9,28 @@ class ImageResponse(BaseModel):
 class LogoDetection(BaseModel):
     found: bool
     warning: str | None
+class ImageRendition(BaseModel):
+    url: str
+    width: int
+    height: int
+    mime_type: str
+
 class ImageVariationResponse(BaseModel):
     images: List[str]
-    logo: LogoDetection
\ No newline at end of file
+    logo: LogoDetection
+    renditions: Dict[str, List[ImageRendition]] = {}
+
+class BatchVariationRequest(BaseModel):
+    course_ids: List[str]
+    refresh: bool = False
+
+class JobResponse(BaseModel):
+    job_id: str
+    status: str
+    subject: str
+    created_at: float
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    stages: Dict[str, float] = {}
+    result: Optional[ImageVariationResponse] = None
+    error: Optional[str] = None
\ No newline at end of file
@@ -1,23 +1,84 @@
-import time
-from fastapi import APIRouter, HTTPException
+import json
+import math
+from typing import Literal, Optional
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from ...libs import streaming
+from ...libs.batch import BATCH_MAX_ITEMS, run_batch
+from ...libs.metrics import count_outcome, requests_in_progress, requests_total
+from ...libs.rate_limit import BATCH, QuotaExceeded, request_priority
+from ...libs.resilience import CircuitOpen
 from ...logger import logger
-from ...models import ImageVariationResponse
-from ...services.v1.image_variation import generate_image_variations
+from ...models import BatchVariationRequest, ImageVariationResponse
+from ...services.v1.image_variation import generate_image_variations, stream_image_variations
 
 router = APIRouter(
     tags=["Course"]
 )
 
 @router.get("/variations/course/{course_id}", response_model=ImageVariationResponse,summary= "Generate thumbnail variations from an existing course thumbnail")
-def generate_course_image_variations(course_id: str):
-    try:
-        start_time = time.time()
+async def generate_course_image_variations(
+    course_id: str,
+    refresh: bool = Query(False, description="Bypass the result cache and generate new variations"),
+    stream: Optional[Literal["ndjson", "sse"]] = Query(None, description="Stream the logo verdict and each image URL as soon as it is ready, as NDJSON or server-sent events"),
+):
+    if stream is not None:
         logger.info(f"Course ID : {course_id}")
-        logo_detection, image_urls = generate_image_variations(course_id)
-        print("Time took to process the request and return response is {} sec".format(time.time() - start_time))
-        return ImageVariationResponse(images=image_urls, logo=logo_detection)
-    except Exception as e:
-        logger.exception("Error while generating the image variations")
-        raise HTTPException(status_code=500, detail=str("Something went wrong, please try again later..."))
+        return StreamingResponse(stream_course_image_variations(course_id, not refresh, stream), media_type=streaming.MEDIA_TYPES[stream])
+    with requests_in_progress.track_inprogress("v1"), count_outcome(requests_total, "v1"):
+        try:
+            logger.info(f"Course ID : {course_id}")
+            logo_detection, image_urls, renditions = await generate_image_variations(course_id, use_cache=not refresh)
+            return ImageVariationResponse(images=image_urls, logo=logo_detection, renditions=renditions)
+        except (QuotaExceeded, CircuitOpen) as e:
+            logger.warning(f"Vertex AI unavailable :: {course_id} :: {e}")
+            raise HTTPException(status_code=e.status_code, detail=e.detail, headers={"Retry-After": str(math.ceil(e.retry_after))})
+        except Exception as e:
+            logger.exception("Error while generating the image variations")
+            raise HTTPException(status_code=500, detail=str("Something went wrong, please try again later..."))
 
-    
\ No newline at end of file
+async def stream_course_image_variations(course_id: str, use_cache: bool, stream_format: str):
+    with requests_in_progress.track_inprogress("v1"):
+        try:
+            async for event in stream_image_variations(course_id, use_cache=use_cache):
+                yield streaming.format_event(event, stream_format)
+        except (QuotaExceeded, CircuitOpen) as e:
+            requests_total.inc("v1", "error")
+            logger.warning(f"Vertex AI unavailable :: {course_id} :: {e}")
+            yield streaming.format_event({"event": "error", "error": e.detail, "retry_after": math.ceil(e.retry_after)}, stream_format)
+        except Exception:
+            requests_total.inc("v1", "error")
+            logger.exception("Error while generating the image variations")
+            yield streaming.format_event({"event": "error", "error": "Something went wrong, please try again later..."}, stream_format)
+        else:
+            requests_total.inc("v1", "success")
+
+@router.post("/variations/courses", summary= "Generate thumbnail variations for many courses, streamed back as NDJSON as each one completes")
+async def generate_courses_image_variations(batch: BatchVariationRequest):
+    if not batch.course_ids:
+        raise HTTPException(status_code=400, detail="At least one course id is required")
+    if len(batch.course_ids) > BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=400, detail=f"At most {BATCH_MAX_ITEMS} course ids can be sent in one batch")
+    logger.info(f"Batch of course IDs : {len(batch.course_ids)}")
+
+    async def generate(course_id: str) -> dict:
+        # Courses requested one at a time get the Vertex AI quota first
+        with request_priority(BATCH):
+            logo_detection, image_urls, renditions = await generate_image_variations(course_id, use_cache=not batch.refresh)
+        return ImageVariationResponse(images=image_urls, logo=logo_detection, renditions=renditions).model_dump()
+
+    async def results():
+        async for result in run_batch(batch.course_ids, generate):
+            if result.ok:
+                line = {"course_id": result.item, "status": "succeeded", **result.result}
+            elif isinstance(result.error, (QuotaExceeded, CircuitOpen)):
+                logger.warning(f"Vertex AI unavailable :: {result.item} :: {result.error}")
+                line = {"course_id": result.item, "status": "failed", "error": result.error.detail, "retry_after": math.ceil(result.error.retry_after)}
+            else:
+                logger.error(f"Error while generating the image variations :: {result.item}", exc_info=result.error)
+                line = {"course_id": result.item, "status": "failed", "error": "Something went wrong, please try again later..."}
+            line["duration"] = round(result.duration, 3)
+            line["stages"] = {name: round(duration, 3) for name, duration in result.stages.items()}
+            yield json.dumps(line) + "\n"
+
+    return StreamingResponse(results(), media_type="application/x-ndjson")
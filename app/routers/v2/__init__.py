@@ -1,7 +1,9 @@
 from fastapi import APIRouter
 from .course import router as course_router
+from .jobs import router as jobs_router
 
 router = APIRouter(
     prefix="/v2/image"
 )
-router.include_router(course_router)
\ No newline at end of file
+router.include_router(course_router)
+router.include_router(jobs_router)
\ No newline at end of file
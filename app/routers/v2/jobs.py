@@ -0,0 +1,44 @@
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from ...libs.jobs import JOB_EVENTS_HEARTBEAT, Job, JobQueueFull, format_sse, get_job_manager
+from ...logger import logger
+from ...models import ImageVariationResponse, JobResponse
+from ...services.v2.image_variation import generate_image_variations
+
+router = APIRouter(
+    tags=["Jobs"]
+)
+
+async def run_variations_job(course_id: str, use_cache: bool) -> dict:
+    logo_detection, image_urls, renditions = await generate_image_variations(course_id, use_cache=use_cache)
+    return ImageVariationResponse(images=image_urls, logo=logo_detection, renditions=renditions).model_dump()
+
+def get_job(job_id: str) -> Job:
+    job = get_job_manager().get(job_id)
+    if job is None or job.kind != "v2":
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@router.post("/jobs/course/{course_id}", response_model=JobResponse, status_code=202, summary= "Queue thumbnail variation generation for an existing course thumbnail")
+async def create_course_image_variations_job(course_id: str, refresh: bool = Query(False, description="Bypass the result cache and generate new variations")):
+    logger.info(f"Queueing job for course ID : {course_id}")
+    try:
+        job = get_job_manager().submit("v2", course_id, run_variations_job, course_id, use_cache=not refresh)
+    except JobQueueFull as e:
+        logger.warning(f"Rejected job for course ID : {course_id} :: {e}")
+        raise HTTPException(status_code=503, detail="Too many pending requests, please try again later...")
+    return JobResponse(**job.to_dict())
+
+@router.get("/jobs/{job_id}", response_model=JobResponse, summary= "Get the status and result of a thumbnail variation job")
+async def get_image_variations_job(job_id: str):
+    return JobResponse(**get_job(job_id).to_dict())
+
+@router.get("/jobs/{job_id}/events", summary= "Stream the progress of a thumbnail variation job as server-sent events")
+async def stream_image_variations_job(job_id: str):
+    job = get_job(job_id)
+
+    async def event_stream():
+        async for event in get_job_manager().events(job, heartbeat=JOB_EVENTS_HEARTBEAT):
+            yield format_sse(event)
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
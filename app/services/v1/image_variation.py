@@ -1,34 +1,45 @@
 import os
-import math
 import json
+import hashlib
+import asyncio
 from pathlib import Path
+from functools import partial
 import urllib.parse
-import requests
-import vertexai
-import matplotlib.pyplot as plt
-from typing import Any, Dict, List, Tuple
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, Any, AsyncIterator, Dict, List, Optional, Tuple
 from dotenv import load_dotenv
 from ...logger import logger
-from ...utils import get_extension_from_mimetype, format_storage_url, MIME_TO_EXTENSION
-
-from vertexai.generative_models import GenerativeModel, Part, Image , SafetySetting, GenerationConfig
-from vertexai.preview.vision_models import ImageGenerationResponse, ImageGenerationModel
-from ...libs.storage import GCPStorage
+from ...utils import DEFAULT_MIME_TYPE, format_storage_url, sniff_image_mimetype, MIME_TO_EXTENSION
+
+from ...dependencies import get_storage
+from ...libs import model_registry
+from ...libs.cache import cache_key, get_result_cache
+from ...libs.content_cache import content_details_cache
+from ...libs.http import get_http_client, read_bounded
+from ...libs.imaging import IMAGE_PREPROCESS, IMAGE_RENDITIONS, image_mime_type, parse_renditions, prepare_image_async, run_image_task
+from ...libs.metrics import content_cache_lookups_total, count_outcome, vertex_requests_total
+from ...libs.rate_limit import current_priority
+from ...libs.resilience import guarded_call
+from ...libs.perceptual_index import ImageHashes, get_perceptual_index, image_hashes
+from ...libs.singleflight import get_single_flight
+from ...libs.variations import replay_cached_variations, store_variations
+from ...libs.timing import StageTimer, current_timer
 from ... import config
 
+# Vertex AI modules are slow to import, so they are only loaded on first use
+if TYPE_CHECKING:
+    from vertexai.generative_models import Part
+    from vertexai.preview.vision_models import ImageGenerationResponse
+
 load_dotenv()
 
 KB_API_HOST = os.environ["KB_API_HOST"]
 
 # GCP Storage
-storage = GCPStorage()
 STORAGE_THUMBNAIL_FOLDER=os.environ["STORAGE_THUMBNAIL_FOLDER"]
 STORAGE_PROXY_PATH=os.environ["STORAGE_PROXY_PATH"]
 
 #GCP GEMINI VERTEX AI
-os.environ["GOOGLE_APPLICATION_CREDENTIALS"] = os.environ["GCP_GEMINI_CREDENTIALS"]
-vertexai.init(project=os.environ["GCP_GEMINI_PROJECT_ID"])
-
 GEMINI_MODEL_PRO = os.environ["GEMINI_MODEL_PRO"]
 VISION_MODEL = os.environ["VISION_MODEL"]
 NUMBER_OF_IMAGES = os.environ["NUMBER_OF_IMAGES"]
@@ -40,9 +51,36 @@ SAFETY_FILTER_LEVEL=config.SAFETY_FILTER_LEVEL
 DEFAULT_ASPECT_RATIO = config.DEFAULT_ASPECT_RATIO
 GUIDANCE_SCALE = config.GUIDANCE_SCALE
 SEED = config.SEED
+LOGO_DETECTION_INSTRUCTION = config.LOGO_DETECTION_INSTRUCTION
+
+# Pipeline orchestration
+CONCURRENT_PIPELINE = os.getenv("CONCURRENT_PIPELINE", "true").lower() == "true"
+PIPELINE_MAX_WORKERS = int(os.getenv("PIPELINE_MAX_WORKERS", "32"))
+executor = ThreadPoolExecutor(max_workers=PIPELINE_MAX_WORKERS, thread_name_prefix="pipeline")
+STORAGE_UPLOAD_WORKERS = int(os.getenv("STORAGE_UPLOAD_WORKERS", "8"))
+RENDITION_SPECS = parse_renditions(IMAGE_RENDITIONS)
+
+# Thumbnail download, larger posters are rejected before they are read into memory
+THUMBNAIL_MAX_BYTES = int(os.getenv("THUMBNAIL_MAX_BYTES", str(20 * 1024 * 1024)))
+UNSUPPORTED_IMAGE_FORMAT = f"Image can only be in the following formats: {', '.join(MIME_TO_EXTENSION.keys())}"
+
+# Vertex AI quotas, 0 leaves calls to a model unthrottled
+GEMINI_REQUESTS_PER_MINUTE = float(os.getenv("GEMINI_REQUESTS_PER_MINUTE", "0"))
+IMAGEN_REQUESTS_PER_MINUTE = float(os.getenv("IMAGEN_REQUESTS_PER_MINUTE", "0"))
+# Seconds before a Gemini call is abandoned, 0 waits for the SDK's own timeout
+GEMINI_TIMEOUT = float(os.getenv("GEMINI_TIMEOUT", "60")) or None
+
+
+def warm_up_models():
+    """Creates the model handles used by this pipeline ahead of the first request."""
+
+    model_registry.warm_up(
+        generative_models=[(GEMINI_MODEL_PRO, None), (GEMINI_MODEL_PRO, LOGO_DETECTION_INSTRUCTION)],
+        image_models=[VISION_MODEL],
+    )
 
 
-def fetch_content_details(content_id: str) -> dict:
+async def fetch_content_details(content_id: str) -> dict:
     """Fetches the details of a content.
 
     Args:
@@ -55,12 +93,25 @@ def fetch_content_details(content_id: str) -> dict:
         Exception: If there's an error fetching the content details.
     """
 
+    cached = content_details_cache.get_fresh(content_id)
+    if cached is not None:
+        content_cache_lookups_total.inc("hit")
+        return cached
+    if content_details_cache.enabled:
+        content_cache_lookups_total.inc("miss")
     url = f"{KB_API_HOST}/api/content/v1/read/{content_id}?mode=edit"
-    response = requests.get(url)
+    response = await get_http_client().get(url, headers=content_details_cache.revalidation_headers(content_id))
+    if response.status_code == 304:
+        data = content_details_cache.revalidated(content_id)
+        if data is not None:
+            content_cache_lookups_total.inc("revalidated")
+            return data
+        # The entry was evicted while the conditional request was in flight, so fetch the whole response
+        response = await get_http_client().get(url)
     response.raise_for_status()
     data = response.json()
     logger.debug(f"course details :: {data}")
-    return data
+    return content_details_cache.store(content_id, data, response.headers)
 
 
 def format_thumbnail_url(content_details) -> str:
@@ -79,9 +130,13 @@ def format_thumbnail_url(content_details) -> str:
     return image_url
 
 
-def download_thumbnail(thumbnail_url: str) -> bytes:
+async def download_thumbnail(thumbnail_url: str) -> bytes:
     """Downloads the thumbnail image from the given URL.
 
+    The body is streamed in the chunks the connection delivers, and the
+    download stops as soon as it exceeds THUMBNAIL_MAX_BYTES or its first
+    bytes are not a PNG or JPEG image.
+
     Args:
         thumbnail_url (str): The URL of the thumbnail image.
 
@@ -89,27 +144,38 @@ def download_thumbnail(thumbnail_url: str) -> bytes:
         bytes: The thumbnail image data.
 
     Raises:
+        ValueError: If the thumbnail is not a PNG or JPEG image, or is too large.
         Exception: If there's an error downloading the thumbnail.
     """
 
-    response = requests.get(thumbnail_url, stream=True)
-    response.raise_for_status()
-    image_type = response.headers["Content-Type"]
-    logger.info(f"Thumbnail  content type :: {image_type}")
-    # Check for image type, currently only PNG or JPEG format are supported
-    if image_type not in MIME_TO_EXTENSION:
-        raise ValueError(f"Image can only be in the following formats: {', '.join(MIME_TO_EXTENSION.keys())}")
-
-    # Read the image data as bytes
-    image_bytes = b''.join(response.iter_content(chunk_size=1024))
+    async with get_http_client().stream("GET", thumbnail_url) as response:
+        response.raise_for_status()
+        image_type = response.headers["Content-Type"]
+        logger.info(f"Thumbnail  content type :: {image_type}")
+        # Check for image type, currently only PNG or JPEG format are supported
+        if image_type not in MIME_TO_EXTENSION:
+            raise ValueError(UNSUPPORTED_IMAGE_FORMAT)
+
+        # Read the image data as bytes
+        image_bytes = await read_bounded(response, THUMBNAIL_MAX_BYTES, check_head=check_image_signature)
     return image_bytes
 
 
-def download_content_thumbnail(content_id: str) -> tuple[str, bytes]:
+def check_image_signature(head: bytes):
+    """
+    Rejects a download whose leading bytes are not a supported image, whatever its Content-Type says
+    """
+    if sniff_image_mimetype(head) is None:
+        raise ValueError(UNSUPPORTED_IMAGE_FORMAT)
+
+
+async def download_content_thumbnail(content_id: str, timer: Optional[StageTimer] = None) -> tuple[str, bytes]:
     """Downloads the thumbnail for a given content ID.
 
     Args:
         content_id (str): The ID of the content.
+        timer (StageTimer, optional): Records the content fetch and download
+            durations. Defaults to the current request timer.
 
     Returns:
         bytes: The thumbnail image data.
@@ -118,17 +184,43 @@ def download_content_thumbnail(content_id: str) -> tuple[str, bytes]:
         Exception: If there's an error fetching the content details or thumbnail.
     """
 
-    content_details = fetch_content_details(content_id)
+    timer = timer or current_timer()
+    content_details = await timer.run_async("content_fetch", fetch_content_details(content_id))
     thumbnail_url = format_thumbnail_url(content_details)
-    thumbnail_data = download_thumbnail(thumbnail_url)
+    thumbnail_data = await timer.run_async("thumbnail_download", download_thumbnail(thumbnail_url))
     return thumbnail_url, thumbnail_data
 
-def detect_logos(image_data: bytes) -> str:
-    system_instruction = """You are a image data analyst with expertise in commercial logos. Please do not hallucinate. You can just output nothing if there are no positive findings."""
-    model = GenerativeModel(
-        GEMINI_MODEL_PRO,
-        system_instruction=[system_instruction]
-    )
+async def prepare_model_image(image_data: bytes) -> bytes:
+    """Downscales and re-encodes the thumbnail once so both Gemini calls send the smaller image.
+
+    Args:
+        image_data (bytes): The thumbnail image data.
+
+    Returns:
+        bytes: The prepared image, or the original bytes if it could not be decoded.
+    """
+
+    if not IMAGE_PREPROCESS:
+        return image_data
+    try:
+        prepared = await prepare_image_async(image_data)
+    except Exception as e:
+        logger.warning(f"Could not preprocess the thumbnail, sending it unchanged :: {e!r}")
+        return image_data
+    logger.info(f"Prepared thumbnail :: {prepared.width}x{prepared.height} {prepared.mime_type} :: {prepared.original_size} -> {len(prepared.data)} bytes")
+    return prepared.data
+
+def model_image_part(image_data: bytes) -> "Part":
+    """
+    Inline image part for Gemini. The SDK's Image only knows PNG, JPEG and GIF,
+    so the MIME type is read from the bytes, which may be a WEBP thumbnail.
+    """
+    from vertexai.generative_models import Part
+    return Part.from_data(image_data, mime_type=image_mime_type(image_data) or DEFAULT_MIME_TYPE)
+
+async def detect_logos(image_data: bytes) -> str:
+    from vertexai.generative_models import Part
+    model = model_registry.get_generative_model(GEMINI_MODEL_PRO, LOGO_DETECTION_INSTRUCTION)
     text_part = Part.from_text("""Identify and detect logos within an image, providing information about the logo\'s name, position, and confidence score.
 
         # Steps:
@@ -144,7 +236,7 @@ def detect_logos(image_data: bytes) -> str:
         - Handle images of varying resolutions and formats for robust detection capabilities.
 
     """)
-    image_part = Part.from_image(Image.from_bytes(image_data))
+    image_part = model_image_part(image_data)
     generation_config = {
         "max_output_tokens": 8192,
         "temperature": 1,
@@ -200,20 +292,27 @@ def detect_logos(image_data: bytes) -> str:
     #         threshold=SafetySetting.HarmBlockThreshold.BLOCK_NONE
     #     ),
     # ]
-    response = model.generate_content(
-        [image_part, text_part],
-        generation_config=generation_config,
-        # safety_settings=safety_settings,
-        # stream=True,
-    )
+    async def call():
+        with count_outcome(vertex_requests_total, "v1", "logo_detection"):
+            return await asyncio.wait_for(
+                model.generate_content_async(
+                    [image_part, text_part],
+                    generation_config=generation_config,
+                    # safety_settings=safety_settings,
+                    # stream=True,
+                ),
+                timeout=GEMINI_TIMEOUT,
+            )
+    response = await guarded_call(GEMINI_MODEL_PRO, call, hedge_stage="logo_detection", requests_per_minute=GEMINI_REQUESTS_PER_MINUTE)
     logger.info(f"Logo Detection :: {response.text}")
     return json.loads(response.text)
 
 
-def generate_content(image_data: bytes) -> str:
-    gemini = GenerativeModel(GEMINI_MODEL_PRO)
+async def generate_content(image_data: bytes) -> str:
+    from vertexai.generative_models import Part, GenerationConfig
+    gemini = model_registry.get_generative_model(GEMINI_MODEL_PRO)
     text_part = Part.from_text(DEFAULT_PROMPT)
-    image_part = Part.from_image(Image.from_bytes(image_data))
+    image_part = model_image_part(image_data)
     generation_config = GenerationConfig(
         # temperature=1,
         # top_p=0.95,
@@ -239,48 +338,227 @@ def generate_content(image_data: bytes) -> str:
     #         threshold=SafetySetting.HarmBlockThreshold.BLOCK_ONLY_HIGH,
     #     ),
     # ]
-    response = gemini.generate_content(
-        contents = [image_part, text_part], 
-        generation_config=generation_config,
-        # safety_settings=safety_settings
-    )
+    async def call():
+        with count_outcome(vertex_requests_total, "v1", "prompt_generation"):
+            return await asyncio.wait_for(
+                gemini.generate_content_async(
+                    contents = [image_part, text_part], 
+                    generation_config=generation_config,
+                    # safety_settings=safety_settings
+                ),
+                timeout=GEMINI_TIMEOUT,
+            )
+    response = await guarded_call(GEMINI_MODEL_PRO, call, hedge_stage="prompt_generation", requests_per_minute=GEMINI_REQUESTS_PER_MINUTE)
     logger.info(f"Generated content :: {response.text}")
     return response.text
 
-def generate_image(image_prompt: str) -> ImageGenerationResponse:
-    image_model = ImageGenerationModel.from_pretrained(VISION_MODEL)
-    image_model.upscale_image
-    images = image_model.generate_images(
-        prompt=image_prompt,
-        number_of_images=NUMBER_OF_IMAGES,
-        aspect_ratio=DEFAULT_ASPECT_RATIO,
-        safety_filter_level=SAFETY_FILTER_LEVEL,
-        person_generation=PERSON_GENERATION,
-        negative_prompt=NEGATIVE_PROMPT
-    )
+def generate_image(image_prompt: str) -> "ImageGenerationResponse":
+    image_model = model_registry.get_image_model(VISION_MODEL)
+    with count_outcome(vertex_requests_total, "v1", "image_generation"):
+        images = image_model.generate_images(
+            prompt=image_prompt,
+            number_of_images=NUMBER_OF_IMAGES,
+            aspect_ratio=DEFAULT_ASPECT_RATIO,
+            safety_filter_level=SAFETY_FILTER_LEVEL,
+            person_generation=PERSON_GENERATION,
+            negative_prompt=NEGATIVE_PROMPT
+        )
     return images
 
-def generate_image_variations(content_id: str) -> Tuple[Dict[str, Any], List[str]]:
-    image_url, image_data = download_content_thumbnail(content_id)
+async def generate_image_async(image_prompt: str) -> "ImageGenerationResponse":
+    """Imagen has no async client, so the blocking call runs on the pipeline executor"""
+    loop = asyncio.get_running_loop()
+
+    async def call():
+        return await loop.run_in_executor(executor, generate_image, image_prompt)
+    # Imagen calls are too costly to hedge and cannot be cancelled once running in the executor
+    return await guarded_call(VISION_MODEL, call, requests_per_minute=IMAGEN_REQUESTS_PER_MINUTE)
+
+async def generate_prompt_and_images(image_data: bytes, timer: StageTimer, image_prompt: Optional[str] = None) -> Tuple[str, "ImageGenerationResponse"]:
+    """Generates the image prompt and then the image variations from it.
+
+    Args:
+        image_data (bytes): The thumbnail image data.
+        timer (StageTimer): Records the duration of each stage.
+        image_prompt (str, optional): A prompt already generated for the same artwork,
+            skips prompt generation.
+
+    Returns:
+        tuple[str, ImageGenerationResponse]: The image prompt and the generated images.
+    """
+
+    if image_prompt is None:
+        image_prompt = await timer.run_async("prompt_generation", generate_content(image_data))
+    images = await timer.run_async("image_generation", generate_image_async(image_prompt))
+    return image_prompt, images
+
+def perceptual_namespace() -> str:
+    """
+    Logo verdicts and prompts are only reused while the models and instructions that produced them are unchanged
+    """
+    return cache_key("v1", GEMINI_MODEL_PRO, LOGO_DETECTION_INSTRUCTION, DEFAULT_PROMPT)
+
+async def find_known_artwork(image_data: bytes, timer: StageTimer, use_cache: bool = True) -> Tuple[Optional[ImageHashes], Dict[str, Any]]:
+    """Looks up the logo verdict and prompt of visually identical artwork seen before.
+
+    Args:
+        image_data (bytes): The thumbnail image data.
+        timer (StageTimer): Records the duration of hashing the thumbnail.
+        use_cache (bool): Look up stored values. The hashes are computed either
+            way, so a refresh still records its new results.
+
+    Returns:
+        tuple[tuple[int, int] | None, dict]: The perceptual hashes of the thumbnail, None when
+            the index is disabled or the image could not be decoded, and the stored values.
+    """
+
+    index = get_perceptual_index()
+    if index is None:
+        return None, {}
+    try:
+        hashes = await timer.run_async("perceptual_hash", run_image_task(image_hashes, image_data))
+    except Exception as e:
+        logger.warning(f"Could not hash the thumbnail, skipping the perceptual index :: {e!r}")
+        return None, {}
+    if not use_cache:
+        return hashes, {}
+    known = index.lookup(perceptual_namespace(), hashes) or {}
+    if known:
+        logger.info(f"Reusing results for visually identical artwork :: {', '.join(sorted(known))}")
+    return hashes, known
+
+async def remember_artwork(hashes: Optional[ImageHashes], **values: Any):
+    """Stores a logo verdict or prompt for the artwork with the given perceptual hashes."""
+
+    index = get_perceptual_index()
+    if index is not None and hashes is not None:
+        await asyncio.to_thread(index.add, perceptual_namespace(), hashes, values)
+
+def variation_location(content_id: str, filename: str) -> Tuple[str, str]:
+    """
+    Storage path of a generated file and the URL it is served at through the storage proxy
+    """
+    filepath = os.path.join(STORAGE_THUMBNAIL_FOLDER, content_id, filename)
+    return filepath, urllib.parse.urljoin(KB_API_HOST, os.path.join(STORAGE_PROXY_PATH, content_id, filename))
+
+def variation_cache_key(content_id: str, image_data: bytes) -> str:
+    """Builds the result cache key from the content, its thumbnail bytes and the settings that shape the variations.
+
+    Args:
+        content_id (str): The ID of the content, the cached URLs live in its folder.
+        image_data (bytes): The thumbnail image data.
+
+    Returns:
+        str: The cache key.
+    """
+
+    image_hash = hashlib.sha256(image_data).hexdigest()
+    renditions = [f"{spec.width}:{spec.format}" for spec in RENDITION_SPECS]
+    return cache_key("v1", content_id, image_hash, DEFAULT_PROMPT, NEGATIVE_PROMPT, GEMINI_MODEL_PRO, VISION_MODEL, NUMBER_OF_IMAGES, renditions)
+
+async def stream_image_variations(content_id: str, use_cache: bool = True) -> AsyncIterator[Dict[str, Any]]:
+    """Runs the pipeline and yields progress events as soon as they are available.
+
+    Events, in order:
+        {"event": "logo", "logo": {...}} once logo detection returns.
+        {"event": "image", "index": 0, "url": "..."} as each upload completes.
+        {"event": "rendition", "index": 0, "url": "...", "width": 320, "height": 320, "mime_type": "..."}
+            as each rendition of an uploaded image is stored.
+        {"event": "done", "logo": {...}, "images": [...], "renditions": {...}} with the URLs in
+            variation order and the renditions keyed by image URL.
+
+    Args:
+        content_id (str): The ID of the content.
+        use_cache (bool): Serve and store results in the result cache.
+
+    Raises:
+        Exception: If a pipeline stage fails or every upload fails.
+    """
+
+    timer = current_timer()
+    image_url, image_data = await download_content_thumbnail(content_id, timer)
+    result_cache = get_result_cache()
+    cache_key_ = variation_cache_key(content_id, image_data)
+    if use_cache and result_cache is not None:
+        cached = await result_cache.aget(cache_key_)
+        if cached is not None:
+            logger.info(f"Serving cached image variations :: {content_id}")
+            for event in replay_cached_variations(cached):
+                yield event
+            return
     logo_detection = {
         "found": False,
         "warning" : None
     }
-    logo_results = detect_logos(image_data)
-    if logo_results:
-        logo_detection["found"] = True
-        logo_detection["warning"] = "This image contains a logo. AI may not accurately generate changes to logos. This feature is currently in beta testing."
-    image_prompt = generate_content(image_data)
-    images = generate_image(image_prompt)
-    original_file_name = Path(image_url).stem
-    image_urls = []
-    for index, image in enumerate(images):       
-        extension = get_extension_from_mimetype(image._mime_type)
-        filename = f"{original_file_name}_{index}.{extension}"
-        filepath = os.path.join(STORAGE_THUMBNAIL_FOLDER, content_id, filename)
-        logger.info(f"Filename :: {filepath}")
-        storage.write_file(filepath, image._image_bytes, image._mime_type)
-        # image_urls.append(storage.public_url(filepath))
-        public_url = urllib.parse.urljoin(KB_API_HOST, os.path.join(STORAGE_PROXY_PATH, content_id, filename))
-        image_urls.append(public_url)
-    return logo_detection, image_urls
\ No newline at end of file
+    model_image = await timer.run_async("image_preprocessing", prepare_model_image(image_data))
+    # Templates and re-uploads share artwork, so their logo verdict and prompt are reused
+    hashes, known = await find_known_artwork(model_image, timer, use_cache)
+    known_prompt = known.get("prompt")
+    generation = None
+    if CONCURRENT_PIPELINE:
+        # Logo detection does not feed the prompt, so it runs alongside prompt and image generation
+        generation = asyncio.create_task(generate_prompt_and_images(model_image, timer, known_prompt))
+    try:
+        if "logo" in known:
+            logo_detection = known["logo"]
+        else:
+            logo_results = await timer.run_async("logo_detection", detect_logos(model_image))
+            if logo_results:
+                logo_detection["found"] = True
+                logo_detection["warning"] = "This image contains a logo. AI may not accurately generate changes to logos. This feature is currently in beta testing."
+            await remember_artwork(hashes, logo=logo_detection)
+        yield {"event": "logo", "logo": logo_detection}
+        image_prompt, images = await (generation if generation is not None else generate_prompt_and_images(model_image, timer, known_prompt))
+    finally:
+        # Stop generating if logo detection failed or the consumer stopped listening
+        if generation is not None and not generation.done():
+            generation.cancel()
+    if known_prompt is None:
+        await remember_artwork(hashes, prompt=image_prompt)
+    variations = store_variations(
+        images,
+        file_stem=Path(image_url).stem,
+        locate=partial(variation_location, content_id),
+        storage=get_storage(),
+        timer=timer,
+        logo=logo_detection,
+        prompt=image_prompt,
+        rendition_specs=RENDITION_SPECS,
+        max_workers=STORAGE_UPLOAD_WORKERS,
+        result_cache=result_cache,
+        cache_key=cache_key_,
+    )
+    try:
+        async for event in variations:
+            yield event
+    finally:
+        # Cancel the rendition work right away when the consumer stops listening
+        await variations.aclose()
+
+async def run_image_variations(content_id: str, use_cache: bool = True) -> Tuple[Dict[str, Any], List[str], Dict[str, List[Dict[str, Any]]]]:
+    result = None
+    async for event in stream_image_variations(content_id, use_cache):
+        if event["event"] == "done":
+            result = event["logo"], event["images"], event["renditions"]
+    return result
+
+async def generate_image_variations(content_id: str, use_cache: bool = True) -> Tuple[Dict[str, Any], List[str], Dict[str, List[Dict[str, Any]]]]:
+    """Generates the variations for a content ID, sharing the run with concurrent callers for the same content.
+
+    Args:
+        content_id (str): The ID of the content.
+        use_cache (bool): Serve and store results in the result cache.
+
+    Returns:
+        tuple[dict, list[str], dict]: The logo detection verdict, the public image URLs
+            and the renditions of each image keyed by its URL.
+    """
+
+    single_flight = get_single_flight()
+    if single_flight is None:
+        return await run_image_variations(content_id, use_cache)
+    # A refresh must not join a run that may be served from the cache, refreshes only coalesce with each other.
+    # The run waits for quota at its leader's priority, so batch items only coalesce with other batch items
+    # and a single course request never queues behind a batch.
+    key = cache_key("v1", content_id, DEFAULT_PROMPT, NEGATIVE_PROMPT, GEMINI_MODEL_PRO, VISION_MODEL, NUMBER_OF_IMAGES, use_cache, current_priority())
+    return await single_flight.do(key, lambda: run_image_variations(content_id, use_cache))
\ No newline at end of file
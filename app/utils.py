@@ -1,9 +1,11 @@
 import os
-from typing import Union
+from typing import Optional, Union
 from urllib.parse import urlparse
 
 # Constants
 ASSET_PREFIX: str = "/assets/public/"
+# Assets are served over https, plain http is only for local stand-ins such as the load test stubs
+ASSET_URL_SCHEME: str = os.getenv("ASSET_URL_SCHEME", "https")
 
 # Mappings
 MIME_TO_EXTENSION: dict[str, str] = {
@@ -17,14 +19,20 @@ EXTENSION_TO_MIME_TYPE: dict[str, str] = {
     "jpg": "image/jpeg"
 }
 
+# Leading bytes of each supported image format
+IMAGE_SIGNATURES: dict[bytes, str] = {
+    b"\x89PNG\r\n\x1a\n": "image/png",
+    b"\xff\xd8\xff": "image/jpeg"
+}
+
 # Default values
 DEFAULT_EXTENSION: str = "jpg"
 DEFAULT_MIME_TYPE: str = "image/jpeg"
 
-def format_storage_url(image_url: str, asset_prefix = ASSET_PREFIX) -> str:
+def format_storage_url(image_url: str, asset_prefix = ASSET_PREFIX, scheme: str = ASSET_URL_SCHEME) -> str:
     urlparts = urlparse(image_url)
     path_parts = urlparts.path.split("/")
-    new_url = "https" + "://" + urlparts.netloc + \
+    new_url = scheme + "://" + urlparts.netloc + \
         asset_prefix + "/".join(path_parts[2:])
     return new_url
 
@@ -48,3 +56,10 @@ def get_file_mimetype(file_path):
 def get_extension_from_mimetype(mime_type: str) -> Union[str, None]:
     # Use a dictionary to map mimetypes to extensions
     return MIME_TO_EXTENSION.get(mime_type.lower(), "png")
+
+def sniff_image_mimetype(data: bytes) -> Optional[str]:
+    # MIME type from the leading bytes of an image, None when it is not a supported format
+    for signature, mime_type in IMAGE_SIGNATURES.items():
+        if data.startswith(signature):
+            return mime_type
+    return None
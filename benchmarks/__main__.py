@@ -0,0 +1,7 @@
+import sys
+
+from .cases import fake_backends
+from .runner import main
+
+with fake_backends():
+    sys.exit(main())
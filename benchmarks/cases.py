@@ -0,0 +1,141 @@
+import os
+import json
+import logging
+from contextlib import contextmanager
+from typing import Iterator, List, Optional
+
+# Same settings as the test suite: every run goes through the whole pipeline, without caches or model warm up
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+os.environ.setdefault("KB_API_HOST", "https://portal.benchmark.test")
+os.environ.setdefault("STORAGE_THUMBNAIL_FOLDER", "thumbnail_images")
+os.environ.setdefault("STORAGE_PROXY_PATH", "thumbnails/generate")
+os.environ.setdefault("GEMINI_MODEL_PRO", "gemini-2.0-flash-lite")
+os.environ.setdefault("VISION_MODEL", "imagen-3.0-fast-generate-001")
+os.environ.setdefault("NUMBER_OF_IMAGES", "2")
+os.environ["WARM_UP_MODELS"] = "false"
+os.environ["RESULT_CACHE_BACKEND"] = "none"
+os.environ["CONTENT_CACHE_TTL"] = "0"
+os.environ["PERCEPTUAL_INDEX"] = "false"
+os.environ["IMAGE_PREPROCESS_WORKERS"] = "0"
+# Vertex AI and storage are the in-process fakes of the service, without latency
+os.environ["VERTEX_BACKEND"] = "fake"
+os.environ["FAKE_GEMINI_LATENCY"] = "0"
+os.environ["FAKE_IMAGEN_LATENCY"] = "0"
+os.environ["FAKE_STORAGE_LATENCY"] = "0"
+
+import httpx
+
+from app import dependencies, utils
+from app.libs import http, model_registry
+from app.libs.fake_backends import MemoryStorage, synthetic_png
+from app.logger import logger
+from app.services.v1 import image_variation as image_variation_v1
+from app.services.v2 import image_variation as image_variation_v2
+from .runner import benchmark
+
+THUMBNAIL_URL = "https://portal.benchmark.test/content/do_benchmark/artifact/poster.png"
+# A poster of a few megabytes, the size that made chunk joining show up in profiles
+LARGE_THUMBNAIL_URL = "https://portal.benchmark.test/assets/public/do_benchmark/artifact/large_poster.png"
+LARGE_THUMBNAIL_SIZE = 5 * 1024 * 1024
+# Bytes per read from a socket, so the large poster arrives in pieces as it would over the network
+NETWORK_CHUNK_SIZE = 64 * 1024
+LOGO_RESPONSE = json.dumps([
+    {"logo_name": f"Logo {index}", "position": {"x": 12.5 * index, "y": 40.0, "width": 96.0, "height": 48.0}, "confidence_score": 0.87}
+    for index in range(3)
+])
+
+
+class ChunkedStream(httpx.AsyncByteStream):
+    def __init__(self, chunks: List[bytes]):
+        self.chunks = chunks
+
+    async def __aiter__(self):
+        for chunk in self.chunks:
+            yield chunk
+
+
+def split_chunks(data: bytes, chunk_size: int = NETWORK_CHUNK_SIZE) -> List[bytes]:
+    # Sliced once, so each run times the download rather than copying the body out of one buffer
+    return [data[start:start + chunk_size] for start in range(0, len(data), chunk_size)]
+
+
+def kb_transport(thumbnail: bytes) -> httpx.MockTransport:
+    # Random bytes behind a PNG signature, so the download passes the format check
+    large_thumbnail = b"\x89PNG\r\n\x1a\n" + os.urandom(LARGE_THUMBNAIL_SIZE - 8)
+    large_chunks = split_chunks(large_thumbnail)
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        if request.url.path.startswith("/api/content/v1/read/"):
+            content_id = request.url.path.rsplit("/", 1)[-1]
+            poster = f"https://portal.benchmark.test/content/{content_id}/artifact/poster.png"
+            return httpx.Response(200, json={"result": {"content": {"identifier": content_id, "posterImage": poster}}})
+        if str(request.url) == LARGE_THUMBNAIL_URL:
+            headers = {"Content-Type": "image/png", "Content-Length": str(len(large_thumbnail))}
+            return httpx.Response(200, stream=ChunkedStream(large_chunks), headers=headers)
+        return httpx.Response(200, content=thumbnail, headers={"Content-Type": "image/png"})
+    return httpx.MockTransport(handler)
+
+
+@contextmanager
+def fake_backends(thumbnail: Optional[bytes] = None) -> Iterator[MemoryStorage]:
+    """
+    Route the KB API and the thumbnail host of both pipelines to an in-process
+    transport, Vertex AI and storage to the fake backends of the service
+    """
+    # Only sizes are kept, so long runs do not hold every image
+    storage = MemoryStorage(keep_content=False)
+    thumbnail = thumbnail if thumbnail is not None else synthetic_png(0, 512)
+    previous_level = logger.level
+    logger.setLevel(logging.WARNING)
+    model_registry.clear()
+    dependencies.set_storage(storage)
+    http.set_http_client(httpx.AsyncClient(transport=kb_transport(thumbnail)))
+    try:
+        yield storage
+    finally:
+        http.set_http_client(None)
+        dependencies.set_storage(None)
+        model_registry.clear()
+        logger.setLevel(previous_level)
+
+
+@benchmark("utils.format_storage_url")
+def format_storage_url():
+    """Rewrites a KB poster URL to its public asset URL"""
+    utils.format_storage_url(THUMBNAIL_URL)
+
+
+@benchmark("utils.get_file_extension")
+def get_file_extension():
+    """Extension of a thumbnail URL"""
+    utils.get_file_extension(THUMBNAIL_URL)
+
+
+@benchmark("utils.get_file_mimetype")
+def get_file_mimetype():
+    """MIME type of a thumbnail URL"""
+    utils.get_file_mimetype(THUMBNAIL_URL)
+
+
+@benchmark("logo_detection.parse_response")
+def parse_logo_response():
+    """Parses a Gemini logo detection response with three logos"""
+    json.loads(LOGO_RESPONSE)
+
+
+@benchmark("v1.download_thumbnail")
+async def download_thumbnail():
+    """Streams a 5 MB thumbnail into one buffer"""
+    await image_variation_v1.download_thumbnail(LARGE_THUMBNAIL_URL)
+
+
+@benchmark("v1.generate_image_variations")
+async def generate_image_variations_v1():
+    """Whole v1 pipeline for one course against in-process fakes"""
+    await image_variation_v1.generate_image_variations("do_benchmark", use_cache=False)
+
+
+@benchmark("v2.generate_image_variations")
+async def generate_image_variations_v2():
+    """Whole v2 pipeline for one course against in-process fakes"""
+    await image_variation_v2.generate_image_variations("do_benchmark", use_cache=False)
@@ -0,0 +1,270 @@
+import os
+import gc
+import sys
+import json
+import time
+import asyncio
+import inspect
+import ctypes
+import argparse
+import statistics
+import ctypes.util
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Union
+
+# Slowdown over the stored baseline that fails a run, 0.5 fails anything more than 50% slower.
+# Unchanged code swings by up to about 35% between single measurements, the median of the
+# samples below stays well within this
+BENCHMARK_THRESHOLD = float(os.getenv("BENCHMARK_THRESHOLD", "0.5"))
+# Seconds spent measuring each sample of a benchmark, split across the repeats
+BENCHMARK_MIN_TIME = float(os.getenv("BENCHMARK_MIN_TIME", "0.2"))
+BENCHMARK_REPEAT = int(os.getenv("BENCHMARK_REPEAT", "5"))
+# Calibrated samples per benchmark, their median is compared with the baseline
+BENCHMARK_SAMPLES = int(os.getenv("BENCHMARK_SAMPLES", "5"))
+# Extra rounds of samples for a benchmark that looks regressed, before the regression is reported
+BENCHMARK_RETRIES = int(os.getenv("BENCHMARK_RETRIES", "2"))
+BASELINES_PATH = Path(__file__).with_name("baselines.json")
+# glibc's mallopt option and its default value, see pin_allocator
+M_MMAP_THRESHOLD = -3
+MMAP_THRESHOLD = 128 * 1024
+
+BenchmarkFunction = Callable[[], Union[Any, Awaitable[Any]]]
+
+
+@dataclass
+class Benchmark:
+    name: str
+    func: BenchmarkFunction
+    description: str = ""
+
+
+@dataclass
+class Comparison:
+    name: str
+    baseline: Optional[float]
+    current: float
+    threshold: float
+
+    @property
+    def change(self) -> Optional[float]:
+        if not self.baseline:
+            return None
+        return self.current / self.baseline - 1
+
+    @property
+    def regressed(self) -> bool:
+        return self.change is not None and self.change > self.threshold
+
+
+_benchmarks: Dict[str, Benchmark] = {}
+
+
+def benchmark(name: str) -> Callable[[BenchmarkFunction], BenchmarkFunction]:
+    """
+    Register a function without arguments, or a coroutine function, as a benchmark
+    """
+    def register(func: BenchmarkFunction) -> BenchmarkFunction:
+        if name in _benchmarks:
+            raise ValueError(f"Benchmark already registered: {name}")
+        _benchmarks[name] = Benchmark(name, func, (inspect.getdoc(func) or "").split("\n")[0])
+        return func
+    return register
+
+
+def registered_benchmarks() -> Dict[str, Benchmark]:
+    return dict(_benchmarks)
+
+
+def _timer(func: BenchmarkFunction, loop: asyncio.AbstractEventLoop) -> Callable[[int], float]:
+    # Returns a function that runs func a number of times and returns the elapsed seconds
+    if inspect.iscoroutinefunction(func):
+        async def run_async(number: int) -> float:
+            start = time.perf_counter()
+            for _ in range(number):
+                await func()
+            return time.perf_counter() - start
+        return lambda number: loop.run_until_complete(run_async(number))
+
+    def run(number: int) -> float:
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        return time.perf_counter() - start
+    return run
+
+
+def measure(func: BenchmarkFunction, min_time: float = BENCHMARK_MIN_TIME, repeat: int = BENCHMARK_REPEAT) -> float:
+    """Times one call of func, like timeit but also for coroutine functions.
+
+    The number of calls per repeat grows until a repeat takes min_time / repeat
+    seconds, so fast functions are not dominated by timer resolution.
+
+    Args:
+        func (Callable): The function or coroutine function to time.
+        min_time (float): Seconds to spend measuring, across all repeats.
+        repeat (int): Number of timed repeats.
+
+    Returns:
+        float: The fastest seconds per call across the repeats. Slower repeats
+            measure interference from the rest of the machine, not the code.
+    """
+
+    loop = asyncio.new_event_loop()
+    try:
+        timer = _timer(func, loop)
+        # The first call warms caches and lazy imports and is not timed
+        timer(1)
+        target = min_time / repeat
+        number = 1
+        while True:
+            elapsed = timer(number)
+            if elapsed >= target or number >= 1 << 24:
+                break
+            number *= 10 if elapsed < target / 10 else 2
+        gc_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            samples = [timer(number) / number for _ in range(repeat)]
+        finally:
+            if gc_enabled:
+                gc.enable()
+    finally:
+        loop.close()
+    return min(samples)
+
+
+def calibrate() -> float:
+    """
+    Seconds this machine takes for a fixed pure Python workload. Benchmarks
+    are stored relative to it, so baselines recorded on one machine are
+    still meaningful on a faster or slower one.
+    """
+    def workload():
+        values = [(i * 7919) % 10007 for i in range(10000)]
+        values.sort()
+        return sum(values), json.dumps(values[:1000])
+
+    return measure(workload)
+
+
+def relative_time(func: BenchmarkFunction) -> float:
+    """
+    Seconds per call of func divided by the calibration time, measured right
+    after it so both see the same load on the machine
+    """
+    return measure(func) / calibrate()
+
+
+def sample_relative_times(func: BenchmarkFunction, samples: int = BENCHMARK_SAMPLES) -> List[float]:
+    """
+    Independent calibrated measurements of func, a single one swings too much
+    with the load on the machine to be compared with a baseline on its own
+    """
+    return [relative_time(func) for _ in range(samples)]
+
+
+def pin_allocator():
+    """
+    Fix glibc's mmap threshold at its default. glibc otherwise raises it the
+    first time a large block is freed, so whether the buffers of a multi
+    megabyte benchmark come from the heap or fresh pages depends on what the
+    process allocated before and its time jumps by 4x between runs.
+    """
+    if not sys.platform.startswith("linux"):
+        return
+    try:
+        ctypes.CDLL(ctypes.util.find_library("c")).mallopt(M_MMAP_THRESHOLD, MMAP_THRESHOLD)
+    except (OSError, AttributeError):
+        # Not glibc, e.g. musl, which has no dynamic threshold to pin
+        pass
+
+
+def load_baselines(path: Path = BASELINES_PATH) -> Dict[str, float]:
+    if not path.exists():
+        return {}
+    with open(path) as baselines_file:
+        return json.load(baselines_file)["benchmarks"]
+
+
+def save_baselines(results: Dict[str, float], path: Path = BASELINES_PATH):
+    with open(path, "w") as baselines_file:
+        json.dump({"benchmarks": dict(sorted(results.items()))}, baselines_file, indent=2)
+        baselines_file.write("\n")
+
+
+def compare(results: Dict[str, float], baselines: Dict[str, float], threshold: float = BENCHMARK_THRESHOLD) -> List[Comparison]:
+    """
+    Compare relative results with the baselines, in the order of the results
+    """
+    return [Comparison(name, baselines.get(name), current, threshold) for name, current in results.items()]
+
+
+def format_report(comparisons: List[Comparison], calibration: float) -> str:
+    lines = [f"Calibration: {calibration * 1000:.3f} ms (times below are per call, at this calibration)"]
+    width = max((len(comparison.name) for comparison in comparisons), default=0)
+    for comparison in comparisons:
+        seconds = comparison.current * calibration
+        if comparison.change is None:
+            status = "new, no baseline"
+        else:
+            status = f"{comparison.change:+.1%} vs baseline"
+            if comparison.regressed:
+                status += f" REGRESSION (threshold {comparison.threshold:+.0%})"
+        lines.append(f"{comparison.name.ljust(width)}  {format_duration(seconds):>10}  {status}")
+    return "\n".join(lines)
+
+
+def format_duration(seconds: float) -> str:
+    if seconds >= 1:
+        return f"{seconds:.2f} s"
+    if seconds >= 1e-3:
+        return f"{seconds * 1e3:.2f} ms"
+    return f"{seconds * 1e6:.2f} us"
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        prog="python -m benchmarks",
+        description="Time the hot paths of the service and compare them with the stored baselines",
+    )
+    parser.add_argument("-k", "--filter", default="", help="Only run benchmarks whose name contains this text")
+    parser.add_argument("--update", action="store_true", help="Store the results as the new baselines")
+    parser.add_argument("--threshold", type=float, default=BENCHMARK_THRESHOLD, help="Slowdown that fails the run, e.g. 0.5 for 50%%")
+    parser.add_argument("--baselines", type=Path, default=BASELINES_PATH, help="Baselines file")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = parse_args(argv)
+    benchmarks = [item for name, item in registered_benchmarks().items() if args.filter in name]
+    if not benchmarks:
+        print(f"No benchmarks match {args.filter!r}", file=sys.stderr)
+        return 2
+    baselines = load_baselines(args.baselines)
+    pin_allocator()
+    results = {}
+    for item in benchmarks:
+        samples = sample_relative_times(item.func, BENCHMARK_SAMPLES)
+        results[item.name] = statistics.median(samples)
+        baseline = baselines.get(item.name)
+        # Baselines always take every round, suspected regressions are sampled again and
+        # judged on the median of all their samples rather than on a lucky fastest one
+        for _ in range(BENCHMARK_RETRIES):
+            if not args.update and (not baseline or results[item.name] <= baseline * (1 + args.threshold)):
+                break
+            samples += sample_relative_times(item.func, BENCHMARK_SAMPLES)
+            results[item.name] = statistics.median(samples)
+    calibration = calibrate()
+    comparisons = compare(results, baselines, args.threshold)
+    print(format_report(comparisons, calibration))
+    if args.update:
+        # Benchmarks left out by the filter keep their stored baselines
+        save_baselines({**baselines, **results}, args.baselines)
+        print(f"Baselines written to {args.baselines}")
+        return 0
+    regressions = [comparison.name for comparison in comparisons if comparison.regressed]
+    if regressions:
+        print(f"{len(regressions)} benchmark(s) regressed beyond {args.threshold:.0%}: {', '.join(regressions)}")
+        return 1
+    return 0
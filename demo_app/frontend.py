@@ -2,6 +2,29 @@ import requests
 import streamlit as st
 import os
 from urllib.parse import urlsplit
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+API_HOST = os.getenv("IMAGE_API_HOST", "http://localhost:8000")
+# Image generation takes tens of seconds, so the read timeout is generous
+REQUEST_TIMEOUT = (5, 120)
+
+def create_session(pool_size=10, retries=2):
+    """Creates a keep-alive session that retries idempotent GETs with backoff."""
+
+    retry = Retry(
+        total=retries,
+        backoff_factor=0.5,
+        status_forcelist=[429, 502, 503, 504],
+        allowed_methods=["GET"],
+    )
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+session = create_session()
 
 def fetch_image_variations(course_id):
     """Fetches image variations for a given course ID from the API.
@@ -16,11 +39,11 @@ def fetch_image_variations(course_id):
         requests.exceptions.RequestException: If there's an error making the API request.
     """
 
-    url = f"http://localhost:8000/v1/image/variations/course/{course_id}"
+    url = f"{API_HOST}/v1/image/variations/course/{course_id}"
     headers = {"accept": "application/json"}
 
     try:
-        response = requests.get(url, headers=headers)
+        response = session.get(url, headers=headers, timeout=REQUEST_TIMEOUT)
         response.raise_for_status()
         return response.json()["images"]
     except requests.exceptions.RequestException as e:
@@ -0,0 +1,89 @@
+"""Load test scenarios for the image variation endpoints.
+
+Start the stubs and the API first (see `loadtest.stubs` and `loadtest.serve`), then run
+`locust -f loadtest/locustfile.py --host http://127.0.0.1:8000 --headless -u 50 -r 5 -t 5m`.
+
+Scenarios are tuned with LOADTEST_* variables:
+    LOADTEST_COURSES: Number of distinct course ids requested, fewer ids means more cache hits.
+    LOADTEST_V1_WEIGHT, LOADTEST_V2_WEIGHT: Share of requests sent to each API version.
+    LOADTEST_STREAM_WEIGHT: Share of requests that stream the result as NDJSON.
+    LOADTEST_REFRESH: Set to "true" to bypass the result cache on every request.
+    LOADTEST_WAIT: Seconds each user waits between requests, as "<min>:<max>".
+"""
+
+import os
+import json
+import random
+
+from locust import HttpUser, between, events, task
+
+LOADTEST_COURSES = int(os.getenv("LOADTEST_COURSES", "1000"))
+LOADTEST_V1_WEIGHT = int(os.getenv("LOADTEST_V1_WEIGHT", "1"))
+LOADTEST_V2_WEIGHT = int(os.getenv("LOADTEST_V2_WEIGHT", "1"))
+LOADTEST_STREAM_WEIGHT = int(os.getenv("LOADTEST_STREAM_WEIGHT", "0"))
+LOADTEST_REFRESH = os.getenv("LOADTEST_REFRESH", "false").lower() == "true"
+LOADTEST_WAIT = [float(value) for value in os.getenv("LOADTEST_WAIT", "0.5:2").split(":")]
+
+PERCENTILES = (0.5, 0.9, 0.95, 0.99)
+
+
+def course_id() -> str:
+    return f"do_loadtest_{random.randrange(LOADTEST_COURSES):06d}"
+
+
+class CourseVariationUser(HttpUser):
+    wait_time = between(*LOADTEST_WAIT)
+
+    def request_variations(self, version: str):
+        params = {"refresh": "true"} if LOADTEST_REFRESH else {}
+        # Course ids are grouped under one name so percentiles are per endpoint
+        with self.client.get(
+            f"/{version}/image/variations/course/{course_id()}",
+            params=params,
+            name=f"/{version}/image/variations/course/[id]",
+            catch_response=True,
+        ) as response:
+            if response.status_code != 200:
+                response.failure(f"HTTP {response.status_code}: {response.text[:200]}")
+            elif len(response.json().get("images", [])) == 0:
+                response.failure("No images in the response")
+
+    def stream_variations(self, version: str):
+        with self.client.get(
+            f"/{version}/image/variations/course/{course_id()}",
+            params={"stream": "ndjson", "refresh": str(LOADTEST_REFRESH).lower()},
+            name=f"/{version}/image/variations/course/[id]?stream",
+            stream=True,
+            catch_response=True,
+        ) as response:
+            events_seen = [json.loads(line)["event"] for line in response.iter_lines() if line]
+            # Streams answer 200 up front, failures arrive as an error event
+            if response.status_code != 200 or not events_seen or events_seen[-1] != "done":
+                response.failure(f"Stream ended with {events_seen[-1:] or response.status_code}")
+
+    @task(LOADTEST_V1_WEIGHT)
+    def v1_variations(self):
+        self.request_variations("v1")
+
+    @task(LOADTEST_V2_WEIGHT)
+    def v2_variations(self):
+        self.request_variations("v2")
+
+    @task(LOADTEST_STREAM_WEIGHT)
+    def v2_stream(self):
+        self.stream_variations("v2")
+
+
+@events.quitting.add_listener
+def print_summary(environment, **kwargs):
+    """
+    Print throughput and latency percentiles per endpoint, in seconds, when the run ends
+    """
+    for name, stats in sorted(environment.stats.entries.items()):
+        if not stats.num_requests:
+            continue
+        percentiles = " ".join(f"p{round(q * 100)}={stats.get_response_time_percentile(q) / 1000:.2f}s" for q in PERCENTILES)
+        print(
+            f"{name[1]} {name[0]} :: {stats.num_requests} requests, {stats.num_failures} failed, "
+            f"{stats.total_rps:.2f} req/s :: {percentiles} max={stats.max_response_time / 1000:.2f}s"
+        )
@@ -0,0 +1,61 @@
+"""Runs the image generation API against the load test stubs.
+
+Points the KB API, the thumbnail host, Vertex AI and GCS at the stub server
+and starts the API with uvicorn. Those endpoints always go to the stubs, so a
+load test can never reach the real services, while other settings that are
+already set, e.g. to change the result cache or the quotas, are kept.
+
+Run it with `python -m loadtest.serve --port 8000 --stubs http://127.0.0.1:8090`.
+"""
+
+import os
+import argparse
+
+
+def stub_environment(stubs_url: str) -> dict:
+    """
+    Settings that send every outbound call of the API to the stub server
+    """
+    return {
+        "KB_API_HOST": stubs_url,
+        "ASSET_URL_SCHEME": "http",
+        "VERTEX_BACKEND": "stub",
+        "VERTEX_API_ENDPOINT": stubs_url,
+        "STORAGE_EMULATOR_HOST": stubs_url,
+        "GCP_STORAGE_CREDENTIALS": "",
+        "GCP_BUCKET_NAME": "loadtest",
+        "GCS_ASSUME_PUBLIC": "true",
+    }
+
+
+# Used unless set already
+DEFAULT_ENVIRONMENT = {
+    "GCP_GEMINI_PROJECT_ID": "loadtest",
+    "GEMINI_MODEL_PRO": "gemini-2.0-flash-lite",
+    "VISION_MODEL": "imagen-3.0-fast-generate-001",
+    "NUMBER_OF_IMAGES": "2",
+    "STORAGE_THUMBNAIL_FOLDER": "thumbnail_images",
+    "STORAGE_PROXY_PATH": "thumbnails/generate",
+    # Every request should reach the stubs unless a run sets up caching on purpose
+    "RESULT_CACHE_BACKEND": "none",
+    "PERCEPTUAL_INDEX": "false",
+}
+
+
+def main():
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Run the API against the load test stubs")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--stubs", default="http://127.0.0.1:8090", help="URL of the stub server")
+    parser.add_argument("--workers", type=int, default=1)
+    args = parser.parse_args()
+    os.environ.update(stub_environment(args.stubs.rstrip("/")))
+    for name, value in DEFAULT_ENVIRONMENT.items():
+        os.environ.setdefault(name, value)
+    uvicorn.run("app.main:app", host=args.host, port=args.port, workers=args.workers, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
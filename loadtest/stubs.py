@@ -0,0 +1,218 @@
+"""Stand-ins for the services the image generation API calls, for offline load tests.
+
+One server mimics the KB content API, the thumbnail host, the Vertex AI REST
+API for Gemini and Imagen, and the GCS JSON API. Each stub waits for a latency
+drawn from its distribution and fails a share of the calls, both configured
+from STUB_<NAME>_LATENCY and STUB_<NAME>_ERROR_RATE variables, where NAME is
+KB, THUMBNAIL, GEMINI, IMAGEN or GCS.
+
+Run it with `python -m loadtest.stubs --port 8090`.
+"""
+
+import os
+import json
+import math
+import base64
+import zlib
+import random
+import asyncio
+import argparse
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, Response
+
+from app.libs.fake_backends import synthetic_png
+
+STUB_NAMES = ("KB", "THUMBNAIL", "GEMINI", "IMAGEN", "GCS")
+
+# Latencies in seconds, roughly what each service takes for this workload
+DEFAULT_LATENCIES = {
+    "KB": "lognormal:0.04:0.4",
+    "THUMBNAIL": "lognormal:0.03:0.4",
+    "GEMINI": "lognormal:1.5:0.35",
+    "IMAGEN": "lognormal:6:0.25",
+    "GCS": "lognormal:0.08:0.5",
+}
+
+# Share of Gemini logo verdicts that report a logo
+STUB_LOGO_RATE = float(os.getenv("STUB_LOGO_RATE", "0.1"))
+# Edge of the square thumbnails and generated images, in pixels
+STUB_IMAGE_SIZE = int(os.getenv("STUB_IMAGE_SIZE", "1024"))
+# Base URL of the stub server in the content it returns, derived from --host and --port when unset
+STUB_PUBLIC_URL = os.getenv("STUB_PUBLIC_URL")
+
+
+@dataclass(frozen=True)
+class LatencyDistribution:
+    """
+    Latency in seconds, "fixed:<seconds>", "uniform:<low>:<high>" or
+    "lognormal:<median>:<sigma>" where sigma is the spread of the log
+    """
+
+    kind: str
+    first: float
+    second: float = 0.0
+
+    @classmethod
+    def parse(cls, value: str) -> "LatencyDistribution":
+        kind, *params = value.strip().split(":")
+        try:
+            numbers = [float(param) for param in params]
+        except ValueError:
+            raise ValueError(f"Invalid latency distribution: {value}")
+        expected = {"fixed": 1, "uniform": 2, "lognormal": 2}.get(kind)
+        if expected is None or len(numbers) != expected or any(number < 0 for number in numbers):
+            raise ValueError(f"Invalid latency distribution: {value}")
+        return cls(kind, *numbers)
+
+    def sample(self, rng: random.Random) -> float:
+        if self.kind == "fixed":
+            return self.first
+        if self.kind == "uniform":
+            return rng.uniform(self.first, self.second)
+        if self.first == 0:
+            return 0.0
+        return rng.lognormvariate(math.log(self.first), self.second)
+
+
+@dataclass
+class StubBehaviour:
+    latency: LatencyDistribution
+    error_rate: float = 0.0
+
+    @classmethod
+    def from_env(cls, name: str) -> "StubBehaviour":
+        return cls(
+            latency=LatencyDistribution.parse(os.getenv(f"STUB_{name}_LATENCY", DEFAULT_LATENCIES[name])),
+            error_rate=float(os.getenv(f"STUB_{name}_ERROR_RATE", "0")),
+        )
+
+    async def delay(self, rng: random.Random) -> bool:
+        """
+        Wait for a sampled latency, then return whether the call should fail
+        """
+        await asyncio.sleep(self.latency.sample(rng))
+        return rng.random() < self.error_rate
+
+
+def multipart_object_name(body: bytes) -> Optional[str]:
+    """
+    The object name from the JSON metadata part of a multipart upload
+    """
+    start = body.find(b"{")
+    end = body.find(b"}", start)
+    if start < 0 or end < 0:
+        return None
+    try:
+        return json.loads(body[start:end + 1]).get("name")
+    except ValueError:
+        return None
+
+
+def vertex_error(code: int = 503, status: str = "UNAVAILABLE") -> JSONResponse:
+    return JSONResponse({"error": {"code": code, "message": "Stubbed Vertex AI failure", "status": status}}, status_code=code)
+
+
+def create_app(behaviours: Optional[Dict[str, StubBehaviour]] = None, seed: Optional[int] = None, public_url: Optional[str] = None) -> FastAPI:
+    """Builds the stub server.
+
+    Args:
+        behaviours (dict, optional): Latency and error rate per stub name,
+            read from the environment for any stub left out.
+        seed (int, optional): Seed for latencies, errors and logo verdicts.
+        public_url (str, optional): Base URL the stub server is reached at,
+            STUB_PUBLIC_URL or the default port on localhost when left out.
+
+    Returns:
+        FastAPI: The stub application.
+    """
+
+    public_url = public_url or STUB_PUBLIC_URL or "http://127.0.0.1:8090"
+    behaviours = {name: (behaviours or {}).get(name) or StubBehaviour.from_env(name) for name in STUB_NAMES}
+    rng = random.Random(seed)
+    stub = FastAPI(title="Image generation load test stubs")
+    stub.state.uploads = 0
+
+    @stub.get("/api/content/v1/read/{content_id}")
+    async def read_content(content_id: str):
+        if await behaviours["KB"].delay(rng):
+            return JSONResponse({"responseCode": "SERVER_ERROR"}, status_code=500)
+        poster = f"{public_url}/content/{content_id}/artifact/poster.png"
+        return {"result": {"content": {"identifier": content_id, "name": f"Course {content_id}", "posterImage": poster}}}
+
+    @stub.get("/assets/public/{content_id}/{path:path}")
+    async def thumbnail(content_id: str, path: str):
+        if await behaviours["THUMBNAIL"].delay(rng):
+            return Response(status_code=503)
+        return Response(synthetic_png(zlib.crc32(content_id.encode()) & 0xFFFF, STUB_IMAGE_SIZE), media_type="image/png")
+
+    @stub.get("/{version}/publishers/google/models/{model}")
+    async def publisher_model(version: str, model: str):
+        # Looked up once by ImageGenerationModel.from_pretrained
+        return {
+            "name": f"publishers/google/models/{model}",
+            "versionId": "001",
+            "openSourceCategory": "PROPRIETARY",
+            "launchStage": "GA",
+            "publisherModelTemplate": f"projects/{{user-project}}/locations/{{location}}/publishers/google/models/{model}",
+            "predictSchemata": {"instanceSchemaUri": "gs://google-cloud-aiplatform/schema/predict/instance/vision_generative_model_1.0.0.yaml"},
+        }
+
+    @stub.post("/{version}/projects/{project}/locations/{location}/publishers/google/models/{model}:generateContent")
+    async def generate_content(version: str, project: str, location: str, model: str, request: Request):
+        body = await request.json()
+        if await behaviours["GEMINI"].delay(rng):
+            return vertex_error()
+        generation_config = body.get("generationConfig") or body.get("generation_config") or {}
+        if (generation_config.get("responseMimeType") or generation_config.get("response_mime_type")) == "application/json":
+            logos = []
+            if rng.random() < STUB_LOGO_RATE:
+                logos.append({"logo_name": "Stub", "position": {"x": 10, "y": 10, "width": 64, "height": 64}, "confidence_score": 0.9})
+            text = json.dumps(logos)
+        else:
+            text = "A flat illustration of a classroom with bright colours and soft lighting, no text"
+        return {
+            "candidates": [{"content": {"role": "model", "parts": [{"text": text}]}, "finishReason": "STOP"}],
+            "usageMetadata": {"promptTokenCount": 300, "candidatesTokenCount": 40, "totalTokenCount": 340},
+        }
+
+    @stub.post("/{version}/projects/{project}/locations/{location}/publishers/google/models/{model}:predict")
+    async def predict(version: str, project: str, location: str, model: str, request: Request):
+        body = await request.json()
+        if await behaviours["IMAGEN"].delay(rng):
+            return vertex_error()
+        count = int((body.get("parameters") or {}).get("sampleCount", 1))
+        predictions = [
+            {"bytesBase64Encoded": base64.b64encode(synthetic_png(rng.randrange(1 << 16), STUB_IMAGE_SIZE)).decode(), "mimeType": "image/png"}
+            for _ in range(count)
+        ]
+        return {"predictions": predictions}
+
+    @stub.post("/upload/storage/v1/b/{bucket}/o")
+    async def upload_object(bucket: str, request: Request):
+        body = await request.body()
+        if await behaviours["GCS"].delay(rng):
+            return JSONResponse({"error": {"code": 503, "message": "Stubbed GCS failure"}}, status_code=503)
+        stub.state.uploads += 1
+        name = request.query_params.get("name") or multipart_object_name(body) or f"object-{stub.state.uploads}"
+        return {"kind": "storage#object", "bucket": bucket, "name": name, "size": str(len(body)), "generation": str(stub.state.uploads)}
+
+    return stub
+
+
+def main():
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Run the load test stubs")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8090)
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+    public_url = STUB_PUBLIC_URL or f"http://{args.host}:{args.port}"
+    uvicorn.run(create_app(seed=args.seed, public_url=public_url), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,19 @@
+import os
 from collections.abc import Generator
 import pytest
 from fastapi.testclient import TestClient
+
+# Model handles need Vertex AI credentials, so they are never warmed up in tests
+os.environ["WARM_UP_MODELS"] = "false"
+# Tests that exercise the caches pass their own instance
+os.environ["RESULT_CACHE_BACKEND"] = "none"
+os.environ["CONTENT_CACHE_TTL"] = "0"
+os.environ["PERCEPTUAL_INDEX"] = "false"
+# Failure tests would otherwise open the shared model circuits for the tests after them
+os.environ["CIRCUIT_BREAKER_FAILURES"] = "0"
+# Thumbnails are preprocessed on a thread, the process pool has its own test
+os.environ["IMAGE_PREPROCESS_WORKERS"] = "0"
+
 from app.main import app
 
 
@@ -1,6 +1,11 @@
+import json
 from fastapi.testclient import TestClient
 from unittest.mock import MagicMock, Mock
 
+from app.libs.metrics import requests_in_progress, requests_total
+from app.libs.timing import current_timer
+from app.libs.rate_limit import BATCH, INTERACTIVE, QuotaExceeded, current_priority
+from app.libs.resilience import CircuitOpen
 from app.models import ImageVariationResponse, LogoDetection
 
 def test_generate_course_image_variations_success(client: TestClient , mocker):
@@ -14,7 +19,7 @@ def test_generate_course_image_variations_success(client: TestClient , mocker):
 
     mock_generate_variations = mocker.patch(
         "app.routers.v1.course.generate_image_variations",
-        return_value=(mock_logo_detection_data, mock_image_urls)
+        return_value=(mock_logo_detection_data, mock_image_urls, {})
     )
 
     # Mock logger.info
@@ -33,7 +38,7 @@ def test_generate_course_image_variations_success(client: TestClient , mocker):
     assert response.json() == expected_response_model.model_dump()
 
     # Assert the service function was called with the correct course_id
-    mock_generate_variations.assert_called_once_with(course_id)
+    mock_generate_variations.assert_called_once_with(course_id, use_cache=True)
 
     # Assert logger.info was called
     mock_logger_info.info.assert_called_once_with(f"Course ID : {course_id}")
@@ -48,7 +53,7 @@ def test_generate_course_image_variations_failed_without_params(client: TestClie
 
     mock_generate_variations = mocker.patch(
         "app.routers.v1.course.generate_image_variations",
-        return_value=(mock_logo_detection_data, mock_image_urls)
+        return_value=(mock_logo_detection_data, mock_image_urls, {})
     )
 
     response = client.get(f"/v1/image/variations/course/{course_id}")
@@ -69,7 +74,7 @@ def test_generate_course_image_variations_exception_handling(client: TestClient,
     """
     course_id = "do_1234567890"
 
-    def broken_generate_image(resource_id: str):
+    def broken_generate_image(resource_id: str, use_cache: bool = True):
             raise Exception("Simulated error")
 
     mock_generate_variations = mocker.patch(
@@ -89,7 +94,194 @@ def test_generate_course_image_variations_exception_handling(client: TestClient,
         "detail": "Something went wrong, please try again later..."
     }
     # Assert the service function was called with the correct course_id
-    mock_generate_variations.assert_called_once_with(course_id)
+    mock_generate_variations.assert_called_once_with(course_id, use_cache=True)
 
     # Assert logger.exception was called
-    mock_logger_exception.exception.assert_called_once_with("Error while generating the image variations")
\ No newline at end of file
+    mock_logger_exception.exception.assert_called_once_with("Error while generating the image variations")
+
+def test_generate_course_image_variations_refresh_bypasses_cache(client: TestClient, mocker):
+    """
+    Tests that the refresh query flag bypasses the result cache.
+    """
+    course_id = "do_1234567890"
+
+    mock_generate_variations = mocker.patch(
+        "app.routers.v1.course.generate_image_variations",
+        return_value=({"found": False, "warning": None}, ["url1.jpg"], {})
+    )
+
+    response = client.get(f"/v1/image/variations/course/{course_id}?refresh=true")
+
+    assert response.status_code == 200
+    mock_generate_variations.assert_called_once_with(course_id, use_cache=False)
+
+def test_generate_course_image_variations_server_timing(client: TestClient, mocker):
+    """
+    Tests that stages recorded during the request are returned in the Server-Timing header.
+    """
+
+    async def generate_image_variations(course_id, use_cache):
+        current_timer().record("logo_detection", 0.25)
+        return {"found": False, "warning": None}, ["url1.jpg"], {}
+
+    mocker.patch("app.routers.v1.course.generate_image_variations", side_effect=generate_image_variations)
+    mock_log_event = mocker.patch("app.main.log_event")
+
+    response = client.get("/v1/image/variations/course/do_1234567890")
+
+    assert response.status_code == 200
+    assert response.headers["Server-Timing"].startswith("logo_detection;dur=250.0, total;dur=")
+    assert mock_log_event.call_args.args == ("request_timing",)
+    assert mock_log_event.call_args.kwargs["stages_ms"] == {"logo_detection": 250.0}
+
+def test_generate_course_image_variations_stream_logs_timing_when_done(client: TestClient, mocker):
+    """
+    Tests that a streamed request logs the stages recorded while its body was sent, without a Server-Timing header.
+    """
+
+    async def stream_image_variations(course_id, use_cache):
+        current_timer().record("logo_detection", 0.25)
+        yield {"event": "logo", "logo": {"found": False, "warning": None}}
+        current_timer().record("image_generation", 1.5)
+        yield {"event": "done", "logo": {"found": False, "warning": None}, "images": ["url1.jpg"], "renditions": {}}
+
+    mocker.patch("app.routers.v1.course.stream_image_variations", side_effect=stream_image_variations)
+    mock_log_event = mocker.patch("app.main.log_event")
+
+    response = client.get("/v1/image/variations/course/do_1234567890?stream=ndjson")
+
+    assert response.status_code == 200
+    assert "Server-Timing" not in response.headers
+    mock_log_event.assert_called_once()
+    assert mock_log_event.call_args.kwargs["stages_ms"] == {"logo_detection": 250.0, "image_generation": 1500.0}
+
+def test_generate_course_image_variations_metrics(client: TestClient, mocker):
+    """
+    Tests that request outcomes are counted and the in-progress gauge is released.
+    """
+
+    success_before = requests_total.value("v1", "success")
+    error_before = requests_total.value("v1", "error")
+    mocker.patch("app.routers.v1.course.generate_image_variations", return_value=({"found": False, "warning": None}, ["url1.jpg"], {}))
+    client.get("/v1/image/variations/course/do_1234567890")
+    mocker.patch("app.routers.v1.course.generate_image_variations", side_effect=Exception("Simulated error"))
+    client.get("/v1/image/variations/course/do_1234567890")
+
+    assert requests_total.value("v1", "success") == success_before + 1
+    assert requests_total.value("v1", "error") == error_before + 1
+    assert requests_in_progress.value("v1") == 0
+
+def test_generate_courses_image_variations_batch(client: TestClient, mocker):
+    """
+    Tests that the batch endpoint streams one NDJSON line per unique course id.
+    """
+
+    async def generate_image_variations(course_id, use_cache):
+        if course_id == "do_bad":
+            raise Exception("Simulated error")
+        return {"found": False, "warning": None}, [f"{course_id}.png"], {}
+
+    mock_generate_variations = mocker.patch("app.routers.v1.course.generate_image_variations", side_effect=generate_image_variations)
+
+    response = client.post("/v1/image/variations/courses", json={"course_ids": ["do_1", "do_bad", "do_1"], "refresh": True})
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    lines = {line["course_id"]: line for line in map(json.loads, response.text.splitlines())}
+    assert lines["do_1"]["status"] == "succeeded"
+    assert lines["do_1"]["images"] == ["do_1.png"]
+    assert lines["do_bad"]["status"] == "failed"
+    assert lines["do_bad"]["error"] == "Something went wrong, please try again later..."
+    assert mock_generate_variations.call_count == 2
+    mock_generate_variations.assert_any_call("do_1", use_cache=False)
+
+def test_generate_courses_image_variations_batch_limits(client: TestClient, mocker):
+    mocker.patch("app.routers.v1.course.BATCH_MAX_ITEMS", 2)
+
+    assert client.post("/v1/image/variations/courses", json={"course_ids": []}).status_code == 400
+    assert client.post("/v1/image/variations/courses", json={"course_ids": ["do_1", "do_2", "do_3"]}).status_code == 400
+
+def test_generate_course_image_variations_stream_ndjson(client: TestClient, mocker):
+    """
+    Tests that stream=ndjson returns each pipeline event as its own line.
+    """
+
+    async def stream_image_variations(course_id, use_cache):
+        yield {"event": "logo", "logo": {"found": False, "warning": None}}
+        yield {"event": "image", "index": 1, "url": "url1.png"}
+        yield {"event": "done", "logo": {"found": False, "warning": None}, "images": ["url1.png"]}
+
+    mocker.patch("app.routers.v1.course.stream_image_variations", side_effect=stream_image_variations)
+
+    response = client.get("/v1/image/variations/course/do_1234567890?stream=ndjson")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    assert [json.loads(line)["event"] for line in response.text.splitlines()] == ["logo", "image", "done"]
+
+def test_generate_course_image_variations_stream_sse_error(client: TestClient, mocker):
+    """
+    Tests that a failure while streaming is reported as an error event.
+    """
+
+    async def stream_image_variations(course_id, use_cache):
+        yield {"event": "logo", "logo": {"found": True, "warning": "logo"}}
+        raise Exception("Simulated error")
+
+    mocker.patch("app.routers.v1.course.stream_image_variations", side_effect=stream_image_variations)
+
+    response = client.get("/v1/image/variations/course/do_1234567890?stream=sse")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    assert response.text.startswith("event: logo\n")
+    assert 'event: error\ndata: {"error": "Something went wrong, please try again later..."}' in response.text
+
+def test_generate_course_image_variations_quota_exceeded(client: TestClient, mocker):
+    """
+    Tests that an exhausted Vertex AI quota is returned as 429 with a Retry-After header instead of a 500.
+    """
+
+    mocker.patch("app.routers.v1.course.generate_image_variations", side_effect=QuotaExceeded("Vertex AI quota exceeded", retry_after=59.2))
+
+    response = client.get("/v1/image/variations/course/do_1234567890")
+
+    assert response.status_code == 429
+    assert response.headers["Retry-After"] == "60"
+    assert response.json() == {"detail": "Too many requests, please try again later..."}
+
+def test_generate_courses_image_variations_batch_priority(client: TestClient, mocker):
+    """
+    Tests that batch items are scheduled at batch priority and quota failures are reported per course.
+    """
+
+    priorities = []
+
+    async def generate_image_variations(course_id, use_cache):
+        priorities.append(current_priority())
+        if course_id == "do_busy":
+            raise QuotaExceeded("quota queue is full", retry_after=12.5, status_code=503)
+        return {"found": False, "warning": None}, [f"{course_id}.png"], {}
+
+    mocker.patch("app.routers.v1.course.generate_image_variations", side_effect=generate_image_variations)
+
+    response = client.post("/v1/image/variations/courses", json={"course_ids": ["do_1", "do_busy"]})
+
+    lines = {line["course_id"]: line for line in map(json.loads, response.text.splitlines())}
+    assert priorities == [BATCH, BATCH]
+    assert current_priority() == INTERACTIVE
+    assert lines["do_busy"]["status"] == "failed"
+    assert lines["do_busy"]["retry_after"] == 13
+
+def test_generate_course_image_variations_circuit_open(client: TestClient, mocker):
+    """
+    Tests that an open model circuit is returned as 503 with a Retry-After header instead of a 500.
+    """
+
+    mocker.patch("app.routers.v1.course.generate_image_variations", side_effect=CircuitOpen("Circuit for gemini is open", retry_after=4.1))
+
+    response = client.get("/v1/image/variations/course/do_1234567890")
+
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "5"
+    assert response.json() == {"detail": "The image models are temporarily unavailable, please try again later..."}
\ No newline at end of file
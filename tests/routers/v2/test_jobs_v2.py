@@ -0,0 +1,66 @@
+import time
+from fastapi.testclient import TestClient
+
+from app.libs.jobs import JobQueueFull
+
+
+def wait_for_job(client: TestClient, job_id: str) -> dict:
+    for _ in range(100):
+        response = client.get(f"/v2/image/jobs/{job_id}")
+        if response.json()["status"] in ("succeeded", "failed"):
+            return response.json()
+        time.sleep(0.01)
+    raise AssertionError("Job did not finish")
+
+def test_create_job_and_poll_result(client: TestClient, mocker):
+    """
+    Tests that a queued job runs the v2 pipeline and its result can be polled.
+    """
+
+    mock_generate_variations = mocker.patch(
+        "app.routers.v2.jobs.generate_image_variations",
+        return_value=({"found": False, "warning": None}, ["url1.jpg"], {})
+    )
+
+    response = client.post("/v2/image/jobs/course/do_1234567890")
+
+    assert response.status_code == 202
+    assert response.json()["status"] == "queued"
+    job = wait_for_job(client, response.json()["job_id"])
+    assert job["status"] == "succeeded"
+    assert job["result"] == {"images": ["url1.jpg"], "logo": {"found": False, "warning": None}, "renditions": {}}
+    mock_generate_variations.assert_called_once_with("do_1234567890", use_cache=True)
+
+def test_job_events_stream(client: TestClient, mocker):
+    """
+    Tests that the events endpoint streams the job progress as server-sent events.
+    """
+
+    mocker.patch("app.routers.v2.jobs.generate_image_variations", side_effect=Exception("Simulated error"))
+
+    job_id = client.post("/v2/image/jobs/course/do_1234567890?refresh=true").json()["job_id"]
+    response = client.get(f"/v2/image/jobs/{job_id}/events")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    assert "event: queued" in response.text
+    assert "event: failed" in response.text
+    assert wait_for_job(client, job_id)["error"] == "Something went wrong, please try again later..."
+
+def test_get_unknown_job(client: TestClient):
+    assert client.get("/v2/image/jobs/unknown").status_code == 404
+    assert client.get("/v2/image/jobs/unknown/events").status_code == 404
+
+def test_create_job_queue_full(client: TestClient, mocker):
+    mocker.patch("app.routers.v2.jobs.get_job_manager").return_value.submit.side_effect = JobQueueFull("Job queue is full")
+
+    response = client.post("/v2/image/jobs/course/do_1234567890")
+
+    assert response.status_code == 503
+
+def test_v1_job_is_not_visible_in_v2(client: TestClient, mocker):
+    mocker.patch("app.routers.v1.jobs.generate_image_variations", return_value=({"found": False, "warning": None}, [], {}))
+
+    job_id = client.post("/v1/image/jobs/course/do_1234567890").json()["job_id"]
+
+    assert client.get(f"/v2/image/jobs/{job_id}").status_code == 404
\ No newline at end of file
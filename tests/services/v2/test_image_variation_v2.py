@@ -1,9 +1,20 @@
 import json
-from unittest.mock import MagicMock, patch
-import requests
+import gc
+import asyncio
+import warnings
+from unittest.mock import AsyncMock, MagicMock, patch
+import httpx
 import pytest
+import io
 import os
-from app.services.v2.image_variation import (detect_logos, download_content_thumbnail, fetch_content_details, format_thumbnail_url, generate_content)
+from PIL import Image as PILImage
+from app.services.v2.image_variation import (detect_logos, download_content_thumbnail, fetch_content_details, format_thumbnail_url, generate_content, generate_image_variations, stream_image_variations, variation_cache_key)
+from app.libs.cache import MemoryCache
+from app.libs.local_storage import LocalStorage
+from app.libs.base_storage import WriteResult
+from app.libs.content_cache import ContentDetailsCache
+from app.libs.rate_limit import BATCH, INTERACTIVE, current_priority, request_priority
+from app.libs.imaging import RenditionSpec
 
 def test_fetch_content_details_request_exception(mocker):
     """Tests handling of TypeError."""
@@ -17,20 +28,47 @@ def test_fetch_content_details_success(mocker):
     """Tests successful fetching of content details."""
     mock_response = MagicMock()
     mock_response.json.return_value = {"result": {"content": {"posterImage": "some_image.jpg"}}}
-    mock_get = mocker.patch("requests.get", return_value=mock_response)
+    mock_client = mocker.patch(f"app.services.v2.image_variation.get_http_client").return_value
+    mock_get = mock_client.get = AsyncMock(return_value=mock_response)
     mock_logger_debug = mocker.patch("app.services.v2.image_variation.logger") # Adjust patch target
 
     content_id = "test_content_123"
     expected_url = f"https://portal.dev.karmayogibharat.net/api/content/v1/read/{content_id}?mode=edit"
 
-    details = fetch_content_details(content_id)
+    details = asyncio.run(fetch_content_details(content_id))
 
-    mock_get.assert_called_once_with(expected_url)
+    mock_get.assert_called_once_with(expected_url, headers={})
     mock_response.raise_for_status.assert_called_once()
     mock_response.json.assert_called_once()
     mock_logger_debug.debug.assert_called_once_with(f"course details :: {details}")
     assert details == {"result": {"content": {"posterImage": "some_image.jpg"}}}
 
+def test_fetch_content_details_refetches_when_evicted_during_revalidation(mocker):
+    """Tests that a 304 for an entry evicted while the request was in flight fetches the whole response again."""
+    mock_monotonic = mocker.patch("app.libs.content_cache.time.monotonic", return_value=100.0)
+    cache = ContentDetailsCache(ttl=60)
+    mocker.patch("app.services.v2.image_variation.content_details_cache", cache)
+    content_details = {"result": {"content": {"posterImage": "some_image.jpg"}}}
+    ok_response = MagicMock(status_code=200, headers={"ETag": "\"abc\""})
+    ok_response.json.return_value = content_details
+    responses = [ok_response, MagicMock(status_code=304, headers={}), ok_response]
+
+    async def get(url, headers=None):
+        if headers:
+            cache.clear()
+        return responses.pop(0)
+
+    mock_client = mocker.patch("app.services.v2.image_variation.get_http_client").return_value
+    mock_get = mock_client.get = AsyncMock(side_effect=get)
+
+    asyncio.run(fetch_content_details("do_123"))
+    mock_monotonic.return_value = 200.0
+    details = asyncio.run(fetch_content_details("do_123"))
+
+    assert details == content_details
+    assert mock_get.call_count == 3
+    assert "headers" not in mock_get.call_args.kwargs
+
 def test_fetch_content_details_invalid_id(mocker):
     """
     Tests handling of an invalid content_id (e.g., empty string)
@@ -38,21 +76,22 @@ def test_fetch_content_details_invalid_id(mocker):
     """
     # Mock a response with an error status code (e.g., 404 Not Found)
     mock_response = MagicMock()
-    mock_response.raise_for_status.side_effect = requests.exceptions.HTTPError("404 Client Error: Not Found for url: ...")
-    mock_get = mocker.patch("requests.get", return_value=mock_response)
+    mock_response.raise_for_status.side_effect = httpx.HTTPStatusError("404 Client Error: Not Found for url: ...", request=MagicMock(), response=MagicMock())
+    mock_client = mocker.patch(f"app.services.v2.image_variation.get_http_client").return_value
+    mock_get = mock_client.get = AsyncMock(return_value=mock_response)
 
     invalid_content_id = "" # Test with an empty string
     expected_url = f"https://portal.dev.karmayogibharat.net/api/content/v1/read/{invalid_content_id}?mode=edit"
 
     # Assert that calling the function with an invalid ID raises an HTTPError
-    with pytest.raises(requests.exceptions.HTTPError) as excinfo:
-        fetch_content_details(invalid_content_id)
+    with pytest.raises(httpx.HTTPStatusError) as excinfo:
+        asyncio.run(fetch_content_details(invalid_content_id))
 
     # Optionally, you can check the error message
     assert "404 Client Error" in str(excinfo.value)
 
-    # Assert that requests.get was called with the expected URL
-    mock_get.assert_called_once_with(expected_url)
+    # Assert that the HTTP client GET was called with the expected URL
+    mock_get.assert_called_once_with(expected_url, headers={})
 
     # Assert that raise_for_status was called
     mock_response.raise_for_status.assert_called_once()
@@ -98,7 +137,7 @@ def test_download_content_thumbnail_success(mocker):
 
     content_id = "test_content_456"
 
-    url = download_content_thumbnail(content_id)
+    url = asyncio.run(download_content_thumbnail(content_id))
 
     mock_fetch_details.assert_called_once_with(content_id)
     mock_format_url.assert_called_once_with(mock_content_details)
@@ -121,7 +160,7 @@ def test_download_content_thumbnail_error_propagation(mocker):
     content_id = "test_content_error_propagate"
 
     with pytest.raises(Exception, match="Fetch error"):
-        download_content_thumbnail(content_id)
+        asyncio.run(download_content_thumbnail(content_id))
 
     mock_fetch_details.assert_called_once_with(content_id)
     mock_format_url.assert_not_called()
@@ -161,6 +200,10 @@ class MockGenerativeModel:
         # This method will be mocked in tests
         pass
 
+    async def generate_content_async(self, contents, generation_config=None, safety_settings=None, stream=False):
+        # This method will be mocked in tests
+        pass
+
 def test_detect_logos_success(mocker):
     """Tests successful logo detection."""
     mock_image_url = "http://www.example.com/content/test.png"
@@ -170,17 +213,17 @@ def test_detect_logos_success(mocker):
     mock_logo_response_text = '[{"logo_name": "MockLogo", "position": {"x": 10, "y": 20, "width": 50, "height": 30}, "confidence_score": 0.9}]'
     mock_logo_results = json.loads(mock_logo_response_text)
 
-    mock_generate_content_method = MagicMock(return_value=MockGenerativeModelResponse(mock_logo_response_text))
+    mock_generate_content_method = AsyncMock(return_value=MockGenerativeModelResponse(mock_logo_response_text))
     mock_generative_model_instance = MagicMock(spec=MockGenerativeModel)
-    mock_generative_model_instance.generate_content = mock_generate_content_method
-    mock_generative_model_class = mocker.patch("app.services.v2.image_variation.GenerativeModel", return_value=mock_generative_model_instance)
+    mock_generative_model_instance.generate_content_async = mock_generate_content_method
+    mock_get_generative_model = mocker.patch("app.services.v2.image_variation.model_registry.get_generative_model", return_value=mock_generative_model_instance)
 
-    mocker.patch("app.services.v2.image_variation.Part", side_effect=MockPart)
-    mocker.patch("app.services.v2.image_variation.Image", side_effect=MockImage)
+    mocker.patch("vertexai.generative_models.Part", side_effect=MockPart)
+    mocker.patch("vertexai.generative_models.Image", side_effect=MockImage)
 
-    results = detect_logos(mock_image_url, mock_image_mimetype)
+    results = asyncio.run(detect_logos(mock_image_url, mock_image_mimetype))
 
-    mock_generative_model_class.assert_called_once()
+    mock_get_generative_model.assert_called_once()
     mock_generate_content_method.assert_called_once()
 
     assert results == mock_logo_results
@@ -194,17 +237,17 @@ def test_generate_content_success(mocker):
     mock_logo_response_text = 'cat standing on table'
     mock_logo_results = mock_logo_response_text
 
-    mock_generate_content_method = MagicMock(return_value=MockGenerativeModelResponse(mock_logo_response_text))
+    mock_generate_content_method = AsyncMock(return_value=MockGenerativeModelResponse(mock_logo_response_text))
     mock_generative_model_instance = MagicMock(spec=MockGenerativeModel)
-    mock_generative_model_instance.generate_content = mock_generate_content_method
-    mock_generative_model_class = mocker.patch("app.services.v2.image_variation.GenerativeModel", return_value=mock_generative_model_instance)
+    mock_generative_model_instance.generate_content_async = mock_generate_content_method
+    mock_get_generative_model = mocker.patch("app.services.v2.image_variation.model_registry.get_generative_model", return_value=mock_generative_model_instance)
 
-    mocker.patch("app.services.v2.image_variation.Part", side_effect=MockPart)
-    mocker.patch("app.services.v2.image_variation.Image", side_effect=MockImage)
+    mocker.patch("vertexai.generative_models.Part", side_effect=MockPart)
+    mocker.patch("vertexai.generative_models.Image", side_effect=MockImage)
 
-    results = generate_content(mock_image_url, mock_image_mimetype)
+    results = asyncio.run(generate_content(mock_image_url, mock_image_mimetype))
 
-    mock_generative_model_class.assert_called_once()
+    mock_get_generative_model.assert_called_once()
     mock_generate_content_method.assert_called_once()
     
     assert results == mock_logo_results
@@ -215,4 +258,220 @@ def test_generate_content_exception(mocker):
     with pytest.raises(TypeError) as errInfo:
         generate_content()
 
-    assert "missing 2 required positional argument" in str(errInfo)
\ No newline at end of file
+    assert "missing 2 required positional argument" in str(errInfo)
+
+def completed_uploads(*results):
+    """Stands in for Storage.iter_write_files_async, yielding (index, result) pairs in the given order."""
+    async def iter_write_files_async(files, max_workers):
+        for result in results:
+            yield result
+    return iter_write_files_async
+
+class MockGeneratedImage:
+    def __init__(self, image_bytes, mime_type):
+        self._image_bytes = image_bytes
+        self._mime_type = mime_type
+
+@pytest.mark.parametrize("concurrent", [True, False])
+def test_generate_image_variations_success(mocker, concurrent, tmp_path):
+    """Tests the pipeline in both concurrent and sequential orchestration modes."""
+    image_url = "https://dev.test.com/assets/public/poster.png"
+    mocker.patch("app.services.v2.image_variation.CONCURRENT_PIPELINE", concurrent)
+    mocker.patch("app.services.v2.image_variation.download_content_thumbnail", return_value=image_url)
+    mock_detect_logos = mocker.patch("app.services.v2.image_variation.detect_logos", return_value=[])
+    mock_generate_content = mocker.patch("app.services.v2.image_variation.generate_content", return_value="cat standing on table")
+    mock_generate_image = mocker.patch("app.services.v2.image_variation.generate_image", return_value=[MockGeneratedImage(b"img0", "image/png")])
+    storage = LocalStorage(str(tmp_path))
+    mocker.patch("app.services.v2.image_variation.get_storage", return_value=storage)
+    mocker.patch("app.services.v2.image_variation.STORAGE_THUMBNAIL_FOLDER", "thumbnails")
+
+    logo_detection, image_urls, renditions = asyncio.run(generate_image_variations("do_123"))
+
+    mock_detect_logos.assert_called_once_with(image_url, "image/png")
+    mock_generate_content.assert_called_once_with(image_url, "image/png")
+    mock_generate_image.assert_called_once_with("cat standing on table")
+    assert len(list((tmp_path / "thumbnails" / "do_123").iterdir())) == 1
+    assert logo_detection == {"found": False, "warning": None}
+    assert len(image_urls) == 1
+    assert image_urls[0].endswith("_poster_0.png")
+
+def test_generate_image_variations_cache_hit(mocker, tmp_path):
+    """Tests that a cached result skips logo detection and generation."""
+    image_url = "https://dev.test.com/assets/public/poster.png"
+    result_cache = MemoryCache()
+    mocker.patch("app.services.v2.image_variation.get_result_cache", return_value=result_cache)
+    mocker.patch("app.services.v2.image_variation.download_content_thumbnail", return_value=image_url)
+    mock_detect_logos = mocker.patch("app.services.v2.image_variation.detect_logos", return_value=[])
+    mocker.patch("app.services.v2.image_variation.generate_content", return_value="cat standing on table")
+    mock_generate_image = mocker.patch("app.services.v2.image_variation.generate_image", return_value=[MockGeneratedImage(b"img0", "image/png")])
+    storage = LocalStorage(str(tmp_path))
+    mocker.patch("app.services.v2.image_variation.get_storage", return_value=storage)
+    mocker.patch("app.services.v2.image_variation.STORAGE_THUMBNAIL_FOLDER", "thumbnails")
+
+    first = asyncio.run(generate_image_variations("do_123"))
+    second = asyncio.run(generate_image_variations("do_123"))
+
+    assert first == second
+    mock_detect_logos.assert_called_once()
+    mock_generate_image.assert_called_once()
+    assert result_cache.get(variation_cache_key("do_123", image_url))["images"] == first[1]
+
+
+def test_generate_image_variations_cache_is_per_content(mocker, tmp_path):
+    """Tests that two courses sharing a template poster each get variations in their own folder."""
+    mocker.patch("app.services.v2.image_variation.get_result_cache", return_value=MemoryCache())
+    mocker.patch("app.services.v2.image_variation.download_content_thumbnail", return_value="https://dev.test.com/assets/public/poster.png")
+    mocker.patch("app.services.v2.image_variation.detect_logos", return_value=[])
+    mocker.patch("app.services.v2.image_variation.generate_content", return_value="cat standing on table")
+    mock_generate_image = mocker.patch("app.services.v2.image_variation.generate_image", return_value=[MockGeneratedImage(b"img0", "image/png")])
+    mocker.patch("app.services.v2.image_variation.get_storage", return_value=LocalStorage(str(tmp_path)))
+    mocker.patch("app.services.v2.image_variation.STORAGE_THUMBNAIL_FOLDER", "thumbnails")
+
+    first = asyncio.run(generate_image_variations("do_1"))
+    second = asyncio.run(generate_image_variations("do_2"))
+
+    assert mock_generate_image.call_count == 2
+    assert all("/do_1/" in url for url in first[1])
+    assert all("/do_2/" in url for url in second[1])
+
+    key = variation_cache_key("do_1", "https://dev.test.com/assets/public/poster.png")
+    mocker.patch("app.services.v2.image_variation.RENDITION_SPECS", [])
+    assert variation_cache_key("do_1", "https://dev.test.com/assets/public/poster.png") != key
+
+def test_generate_image_variations_partial_upload_failure(mocker):
+    """Tests that a failed upload is left out of the result instead of failing the request."""
+    mocker.patch("app.services.v2.image_variation.download_content_thumbnail", return_value="https://dev.test.com/assets/public/poster.png")
+    mocker.patch("app.services.v2.image_variation.detect_logos", return_value=[])
+    mocker.patch("app.services.v2.image_variation.generate_content", return_value="cat standing on table")
+    mocker.patch("app.services.v2.image_variation.generate_image", return_value=[MockGeneratedImage(b"img0", "image/png"), MockGeneratedImage(b"img1", "image/png")])
+    mock_storage = mocker.patch("app.services.v2.image_variation.get_storage").return_value
+    mock_storage.iter_write_files_async = completed_uploads(
+        (1, WriteResult("poster_1.png", 0.1)),
+        (0, WriteResult("poster_0.png", 0.1, Exception("Upload failed"))),
+    )
+
+    logo_detection, image_urls, renditions = asyncio.run(generate_image_variations("do_123"))
+
+    assert len(image_urls) == 1
+    assert image_urls[0].endswith("_1.png")
+
+def test_generate_image_variations_all_uploads_failed(mocker):
+    """Tests that the request fails when no variation could be stored."""
+    mocker.patch("app.services.v2.image_variation.download_content_thumbnail", return_value="https://dev.test.com/assets/public/poster.png")
+    mocker.patch("app.services.v2.image_variation.detect_logos", return_value=[])
+    mocker.patch("app.services.v2.image_variation.generate_content", return_value="cat standing on table")
+    mocker.patch("app.services.v2.image_variation.generate_image", return_value=[MockGeneratedImage(b"img0", "image/png")])
+    mock_storage = mocker.patch("app.services.v2.image_variation.get_storage").return_value
+    mock_storage.iter_write_files_async = completed_uploads((0, WriteResult("poster_0.png", 0.1, Exception("Upload failed"))))
+
+    with warnings.catch_warnings(record=True) as caught:
+        warnings.simplefilter("always")
+        with pytest.raises(Exception, match="Upload failed"):
+            asyncio.run(generate_image_variations("do_123"))
+        gc.collect()
+    # The cancelled rendition task must not leave an unawaited coroutine behind
+    assert not [warning for warning in caught if "never awaited" in str(warning.message)]
+
+def test_stream_image_variations_event_order(mocker):
+    """Tests that the logo verdict comes first and each URL is streamed as its upload completes."""
+    mocker.patch("app.services.v2.image_variation.download_content_thumbnail", return_value="https://dev.test.com/assets/public/poster.png")
+    mocker.patch("app.services.v2.image_variation.detect_logos", return_value=[])
+    mocker.patch("app.services.v2.image_variation.generate_content", return_value="cat standing on table")
+    mocker.patch("app.services.v2.image_variation.generate_image", return_value=[MockGeneratedImage(b"img0", "image/png"), MockGeneratedImage(b"img1", "image/png")])
+    mock_storage = mocker.patch("app.services.v2.image_variation.get_storage").return_value
+    mock_storage.iter_write_files_async = completed_uploads(
+        (1, WriteResult("poster_1.png", 0.1)),
+        (0, WriteResult("poster_0.png", 0.2)),
+    )
+
+    async def collect():
+        return [event async for event in stream_image_variations("do_123")]
+
+    events = asyncio.run(collect())
+
+    assert [event["event"] for event in events] == ["logo", "image", "image", "done"]
+    assert [event["index"] for event in events[1:3]] == [1, 0]
+    assert [url.rsplit("_", 1)[-1] for url in events[-1]["images"]] == ["0.png", "1.png"]
+
+def test_generate_image_variations_refresh_does_not_join_cached_run(mocker):
+    """Tests that a refresh overlapping a normal call runs its own pipeline without the cache."""
+    calls = []
+
+    async def run_image_variations(content_id, use_cache=True):
+        calls.append(use_cache)
+        await asyncio.sleep(0.01)
+        return {"found": False}, [f"cached={use_cache}"], {}
+
+    mocker.patch("app.services.v2.image_variation.run_image_variations", side_effect=run_image_variations)
+
+    async def run():
+        return await asyncio.gather(generate_image_variations("do_123"), generate_image_variations("do_123", use_cache=False))
+
+    normal, refreshed = asyncio.run(run())
+
+    assert sorted(calls) == [False, True]
+    assert normal[1] == ["cached=True"]
+    assert refreshed[1] == ["cached=False"]
+
+def test_generate_image_variations_batch_does_not_join_interactive_run(mocker):
+    """Tests that a batch item overlapping a single course request runs its own pipeline at its own priority."""
+    priorities = []
+
+    async def run_image_variations(content_id, use_cache=True):
+        priorities.append(current_priority())
+        await asyncio.sleep(0.01)
+        return {"found": False}, [f"priority={current_priority()}"], {}
+
+    mocker.patch("app.services.v2.image_variation.run_image_variations", side_effect=run_image_variations)
+
+    async def run_batch_item():
+        with request_priority(BATCH):
+            return await generate_image_variations("do_123")
+
+    async def run():
+        return await asyncio.gather(generate_image_variations("do_123"), run_batch_item(), generate_image_variations("do_123"))
+
+    first, batch, second = asyncio.run(run())
+
+    assert sorted(priorities) == [INTERACTIVE, BATCH]
+    assert first[1] == second[1] == [f"priority={INTERACTIVE}"]
+    assert batch[1] == [f"priority={BATCH}"]
+
+def test_generate_image_variations_renditions(mocker, tmp_path):
+    """Tests that the configured renditions are stored next to each variation and returned keyed by its URL."""
+    output = io.BytesIO()
+    PILImage.new("RGB", (1024, 1024), (0, 128, 255)).save(output, format="PNG")
+    mocker.patch("app.services.v2.image_variation.download_content_thumbnail", return_value="https://dev.test.com/assets/public/poster.png")
+    mocker.patch("app.services.v2.image_variation.detect_logos", return_value=[])
+    mocker.patch("app.services.v2.image_variation.generate_content", return_value="cat standing on table")
+    mocker.patch("app.services.v2.image_variation.generate_image", return_value=[MockGeneratedImage(output.getvalue(), "image/png")])
+    mocker.patch("app.services.v2.image_variation.RENDITION_SPECS", [RenditionSpec(320, "WEBP"), RenditionSpec(2048, "WEBP")])
+    storage = LocalStorage(str(tmp_path))
+    mocker.patch("app.services.v2.image_variation.get_storage", return_value=storage)
+    mocker.patch("app.services.v2.image_variation.STORAGE_THUMBNAIL_FOLDER", "thumbnails")
+
+    async def collect():
+        return [event async for event in stream_image_variations("do_123", use_cache=False)]
+
+    events = asyncio.run(collect())
+
+    assert sorted(path.name.split("_", 2)[-1] for path in (tmp_path / "thumbnails" / "do_123").iterdir()) == ["poster_0.png", "poster_0_1024w.webp", "poster_0_320w.webp"]
+    done = events[-1]
+    renditions = done["renditions"][done["images"][0]]
+    assert [(r["width"], r["height"], r["mime_type"]) for r in renditions] == [(320, 320, "image/webp"), (1024, 1024, "image/webp")]
+    assert renditions[0]["url"].endswith("_poster_0_320w.webp")
+    assert [event["event"] for event in events] == ["logo", "image", "rendition", "rendition", "done"]
+
+def test_generate_image_variations_skips_undecodable_renditions(mocker):
+    """Tests that images the rendition pipeline cannot decode are returned without renditions."""
+    mocker.patch("app.services.v2.image_variation.download_content_thumbnail", return_value="https://dev.test.com/assets/public/poster.png")
+    mocker.patch("app.services.v2.image_variation.detect_logos", return_value=[])
+    mocker.patch("app.services.v2.image_variation.generate_content", return_value="cat standing on table")
+    mocker.patch("app.services.v2.image_variation.generate_image", return_value=[MockGeneratedImage(b"img0", "image/png")])
+    mocker.patch("app.services.v2.image_variation.RENDITION_SPECS", [RenditionSpec(320, "WEBP")])
+    mock_storage = mocker.patch("app.services.v2.image_variation.get_storage").return_value
+    mock_storage.iter_write_files_async = completed_uploads((0, WriteResult("poster_0.png", 0.1)))
+
+    logo_detection, image_urls, renditions = asyncio.run(generate_image_variations("do_123", use_cache=False))
+
+    assert renditions == {image_urls[0]: []}
\ No newline at end of file
@@ -0,0 +1,59 @@
+import asyncio
+
+from app.libs.batch import run_batch
+from app.libs.timing import current_timer
+
+
+def collect(items, func, concurrency=2):
+    async def run():
+        return [result async for result in run_batch(items, func, concurrency)]
+    return asyncio.run(run())
+
+def test_run_batch_yields_results_in_completion_order():
+    async def func(item):
+        await asyncio.sleep(0.02 if item == "slow" else 0)
+        return item.upper()
+
+    results = collect(["slow", "fast"], func)
+
+    assert [result.item for result in results] == ["fast", "slow"]
+    assert [result.result for result in results] == ["FAST", "SLOW"]
+    assert all(result.ok for result in results)
+
+def test_run_batch_limits_concurrency():
+    running = 0
+    peak = 0
+
+    async def func(item):
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.01)
+        running -= 1
+
+    collect([str(index) for index in range(8)], func, concurrency=3)
+
+    assert peak == 3
+
+def test_run_batch_reports_failures_and_deduplicates():
+    calls = []
+
+    async def func(item):
+        calls.append(item)
+        if item == "bad":
+            raise ValueError("Simulated error")
+        return item
+
+    results = {result.item: result for result in collect(["good", "bad", "good"], func)}
+
+    assert calls.count("good") == 1
+    assert results["good"].ok
+    assert isinstance(results["bad"].error, ValueError)
+
+def test_run_batch_times_each_item_separately():
+    async def func(item):
+        current_timer().record(f"stage_{item}", 0.1)
+
+    results = collect(["a", "b"], func)
+
+    assert {result.item: result.stages for result in results} == {"a": {"stage_a": 0.1}, "b": {"stage_b": 0.1}}
\ No newline at end of file
@@ -0,0 +1,60 @@
+import asyncio
+import itertools
+import json
+
+from benchmarks import runner
+from benchmarks.runner import compare, load_baselines, measure, save_baselines
+
+
+def test_measure_times_functions_and_coroutines():
+    async def sleep():
+        await asyncio.sleep(0.002)
+
+    assert 0 < measure(lambda: sum(range(100)), min_time=0.01, repeat=2) < 0.001
+    assert 0.002 <= measure(sleep, min_time=0.01, repeat=2) < 0.05
+
+def test_compare_flags_regressions_beyond_the_threshold():
+    comparisons = compare({"fast": 1.1, "slow": 1.5, "new": 2.0}, {"fast": 1.0, "slow": 1.0}, threshold=0.25)
+
+    assert [comparison.regressed for comparison in comparisons] == [False, True, False]
+    assert comparisons[1].change == 0.5
+    assert comparisons[2].change is None
+
+def test_baselines_round_trip(tmp_path):
+    path = tmp_path / "baselines.json"
+
+    save_baselines({"b": 2.0, "a": 1.0}, path)
+
+    assert load_baselines(path) == {"a": 1.0, "b": 2.0}
+    assert list(json.loads(path.read_text())["benchmarks"]) == ["a", "b"]
+    assert load_baselines(tmp_path / "missing.json") == {}
+
+def test_main_fails_on_regression_and_updates_baselines(tmp_path, mocker, capsys):
+    path = tmp_path / "baselines.json"
+    save_baselines({"case": 1.0}, path)
+    mocker.patch.object(runner, "_benchmarks", {"case": runner.Benchmark("case", lambda: None)})
+    mocker.patch.object(runner, "BENCHMARK_SAMPLES", 3)
+    mocker.patch.object(runner, "pin_allocator")
+    relative_time = mocker.patch.object(runner, "relative_time", side_effect=itertools.cycle([2.0, 1.9, 1.8]))
+    mocker.patch.object(runner, "calibrate", return_value=0.001)
+
+    assert runner.main(["--baselines", str(path), "--threshold", "0.25"]) == 1
+    assert "REGRESSION" in capsys.readouterr().out
+    # The regressed benchmark was sampled again and the median of every sample reported
+    assert relative_time.call_count == 3 * (1 + runner.BENCHMARK_RETRIES)
+
+    assert runner.main(["--baselines", str(path), "--update"]) == 0
+    assert load_baselines(path) == {"case": 1.9}
+
+def test_main_judges_the_median_of_the_samples(tmp_path, mocker):
+    path = tmp_path / "baselines.json"
+    save_baselines({"case": 1.0}, path)
+    mocker.patch.object(runner, "_benchmarks", {"case": runner.Benchmark("case", lambda: None)})
+    mocker.patch.object(runner, "BENCHMARK_SAMPLES", 3)
+    mocker.patch.object(runner, "pin_allocator")
+    # One sample slowed down by the machine does not fail the run
+    relative_time = mocker.patch.object(runner, "relative_time", side_effect=[1.0, 5.0, 1.1])
+    mocker.patch.object(runner, "calibrate", return_value=0.001)
+
+    assert runner.main(["--baselines", str(path), "--threshold", "0.25"]) == 0
+    assert relative_time.call_count == 3
\ No newline at end of file
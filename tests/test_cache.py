@@ -0,0 +1,121 @@
+import asyncio
+import os
+import time
+import pytest
+from app.libs.cache import DiskCache, MemoryCache, RedisCache, cache_key, create_cache
+
+
+def test_memory_cache_set_and_get():
+    cache = MemoryCache()
+    cache.set("key", {"images": ["url1"]})
+
+    assert cache.get("key") == {"images": ["url1"]}
+    assert cache.get("missing") is None
+
+def test_memory_cache_ttl_expiry(mocker):
+    mock_monotonic = mocker.patch("app.libs.cache.time.monotonic", return_value=100.0)
+    cache = MemoryCache(default_ttl=10)
+    cache.set("key", "value")
+
+    mock_monotonic.return_value = 109.0
+    assert cache.get("key") == "value"
+
+    mock_monotonic.return_value = 110.0
+    assert cache.get("key") is None
+    assert len(cache) == 0
+
+def test_memory_cache_lru_eviction():
+    cache = MemoryCache(max_entries=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    # Reading "a" makes "b" the least recently used entry
+    cache.get("a")
+    cache.set("c", 3)
+
+    assert cache.get("a") == 1
+    assert cache.get("b") is None
+    assert cache.get("c") == 3
+
+def test_memory_cache_delete_and_async_access():
+    cache = MemoryCache()
+    asyncio.run(cache.aset("key", "value"))
+
+    assert asyncio.run(cache.aget("key")) == "value"
+    cache.delete("key")
+    assert cache.get("key") is None
+
+def test_disk_cache_round_trip(tmp_path):
+    cache = DiskCache(str(tmp_path), default_ttl=60)
+    cache.set("key", {"logo": {"found": False, "warning": None}})
+
+    assert DiskCache(str(tmp_path)).get("key") == {"logo": {"found": False, "warning": None}}
+    assert asyncio.run(cache.aget("key")) == {"logo": {"found": False, "warning": None}}
+    cache.delete("key")
+    assert cache.get("key") is None
+
+def test_disk_cache_ttl_expiry(tmp_path, mocker):
+    mock_time = mocker.patch("app.libs.cache.time.time", return_value=1000.0)
+    cache = DiskCache(str(tmp_path), default_ttl=10)
+    cache.set("key", "value")
+
+    mock_time.return_value = 1011.0
+    assert cache.get("key") is None
+    assert list(tmp_path.glob("*.json")) == []
+
+def test_disk_cache_evicts_least_recently_used(tmp_path):
+    cache = DiskCache(str(tmp_path), max_entries=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    # Make "a" the least recently used entry
+    past = time.time() - 100
+    os.utime(cache._path("a"), (past, past))
+    cache.set("c", 3)
+
+    assert cache.get("a") is None
+    assert cache.get("b") == 2
+    assert cache.get("c") == 3
+
+class FakeRedis:
+    def __init__(self):
+        self.values = {}
+        self.expiry = {}
+
+    def get(self, key):
+        return self.values.get(key)
+
+    def set(self, key, value, px=None, nx=False):
+        if nx and key in self.values:
+            return None
+        self.values[key] = value.encode() if isinstance(value, str) else value
+        self.expiry[key] = px
+        return True
+
+    def delete(self, key):
+        self.values.pop(key, None)
+
+def test_redis_cache_with_client():
+    client = FakeRedis()
+    cache = RedisCache(client=client, prefix="variations:", default_ttl=5)
+    cache.set("key", {"images": ["url1"]})
+
+    assert client.expiry["variations:key"] == 5000
+    assert cache.get("key") == {"images": ["url1"]}
+    cache.delete("key")
+    assert cache.get("key") is None
+
+@pytest.mark.parametrize("backend,expected", [
+    ("memory", MemoryCache),
+    ("MEMORY", MemoryCache),
+    ("disk", DiskCache),
+])
+def test_create_cache(backend, expected, tmp_path):
+    assert isinstance(create_cache(backend, directory=str(tmp_path)), expected)
+
+def test_create_cache_disabled_and_unsupported():
+    assert create_cache("none") is None
+    with pytest.raises(ValueError, match="Unsupported cache backend"):
+        create_cache("memcached")
+
+def test_cache_key_is_stable():
+    assert cache_key("v1", "abc", 2) == cache_key("v1", "abc", 2)
+    assert cache_key("v1", "abc", 2) != cache_key("v2", "abc", 2)
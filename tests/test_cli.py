@@ -0,0 +1,64 @@
+import io
+import json
+import asyncio
+
+from app.cli import Checkpoint, format_summary, main, parse_args, pregenerate, read_content_ids, run
+
+
+def test_read_content_ids():
+    assert read_content_ids(["do_1\n", "\n", "# comment\n", "  do_2  \n"]) == ["do_1", "do_2"]
+
+def test_checkpoint_resumes_succeeded_only(tmp_path):
+    path = tmp_path / "run.checkpoint.jsonl"
+    checkpoint = Checkpoint(str(path))
+    checkpoint.record({"content_id": "do_1", "status": "succeeded"})
+    checkpoint.record({"content_id": "do_2", "status": "failed"})
+    with open(path, "a") as checkpoint_file:
+        checkpoint_file.write('{"content_id": "do_3", "sta')
+
+    assert Checkpoint(str(path)).completed == {"do_1"}
+
+def test_pregenerate_skips_completed_and_records_progress(mocker, tmp_path):
+    async def generate_image_variations(content_id, use_cache):
+        if content_id == "do_bad":
+            raise Exception("Simulated error")
+        return {"found": False, "warning": None}, [f"{content_id}.png"], {}
+
+    mock_generate = mocker.patch("app.services.v2.image_variation.generate_image_variations", side_effect=generate_image_variations)
+    checkpoint = Checkpoint(str(tmp_path / "run.checkpoint.jsonl"))
+    checkpoint.record({"content_id": "do_1", "status": "succeeded"})
+
+    summary = asyncio.run(pregenerate(["do_1", "do_2", "do_bad", "do_2"], checkpoint=checkpoint))
+
+    assert mock_generate.call_count == 2
+    assert (summary["processed"], summary["succeeded"], summary["failed"], summary["skipped"]) == (2, 1, 1, 1)
+    assert checkpoint.completed == {"do_1", "do_2"}
+    records = [json.loads(line) for line in open(tmp_path / "run.checkpoint.jsonl")]
+    assert {record["content_id"]: record["status"] for record in records[1:]} == {"do_2": "succeeded", "do_bad": "failed"}
+
+def test_run_reads_stdin(mocker, tmp_path):
+    mock_generate = mocker.patch("app.services.v1.image_variation.generate_image_variations", return_value=({"found": False, "warning": None}, [], {}))
+    args = parse_args(["-", "--version", "v1", "--checkpoint", str(tmp_path / "stdin.jsonl"), "--refresh"])
+
+    summary = asyncio.run(run(args, stdin=io.StringIO("do_1\ndo_2\n")))
+
+    assert summary["succeeded"] == 2
+    mock_generate.assert_any_call("do_1", use_cache=False)
+
+def test_main_exit_code(mocker, tmp_path, capsys):
+    input_path = tmp_path / "ids.txt"
+    input_path.write_text("do_1\n")
+    mocker.patch("app.services.v2.image_variation.generate_image_variations", side_effect=Exception("Simulated error"))
+
+    assert main([str(input_path)]) == 1
+    assert "1 failed" in capsys.readouterr().out
+    assert (tmp_path / "ids.txt.checkpoint.jsonl").exists()
+
+def test_format_summary():
+    summary = {"processed": 2, "succeeded": 2, "failed": 0, "skipped": 0, "elapsed": 60.0, "throughput": 2.0, "latency_p50": 20.0, "latency_p95": 30.0, "latency_max": 30.0}
+
+    assert format_summary(summary) == (
+        "Processed 2 content ids in 60.0s (2 succeeded, 0 failed, 0 skipped from checkpoint)\n"
+        "Throughput: 2.00 content ids/min\n"
+        "Latency: p50=20.00s p95=30.00s max=30.00s"
+    )
\ No newline at end of file
@@ -0,0 +1,59 @@
+import pytest
+from app.libs.content_cache import ContentDetailsCache, poster_image_only
+
+CONTENT_DETAILS = {
+    "id": "api.content.read",
+    "result": {"content": {"identifier": "do_123", "name": "Course", "posterImage": "https://dev.test.com/content/poster.png"}},
+}
+
+def test_poster_image_only():
+    assert poster_image_only(CONTENT_DETAILS) == {"result": {"content": {"posterImage": "https://dev.test.com/content/poster.png"}}}
+
+def test_poster_image_only_missing_key():
+    with pytest.raises(KeyError):
+        poster_image_only({"result": {"content": {}}})
+
+def test_store_and_get_fresh():
+    cache = ContentDetailsCache(ttl=60)
+
+    assert cache.get_fresh("do_123") is None
+    stored = cache.store("do_123", CONTENT_DETAILS, {"ETag": "\"abc\""})
+
+    assert stored == poster_image_only(CONTENT_DETAILS)
+    assert cache.get_fresh("do_123") == stored
+    assert cache.stats() == {"hits": 1, "misses": 1, "revalidations": 0, "entries": 1}
+
+def test_store_full_response():
+    cache = ContentDetailsCache(ttl=60, poster_only=False)
+
+    assert cache.store("do_123", CONTENT_DETAILS, {}) == CONTENT_DETAILS
+
+def test_expired_entry_is_revalidated(mocker):
+    mock_monotonic = mocker.patch("app.libs.content_cache.time.monotonic", return_value=100.0)
+    cache = ContentDetailsCache(ttl=60)
+    cache.store("do_123", CONTENT_DETAILS, {"ETag": "\"abc\"", "Last-Modified": "Wed, 21 Oct 2015 07:28:00 GMT"})
+
+    mock_monotonic.return_value = 161.0
+    assert cache.get_fresh("do_123") is None
+    assert cache.revalidation_headers("do_123") == {
+        "If-None-Match": "\"abc\"",
+        "If-Modified-Since": "Wed, 21 Oct 2015 07:28:00 GMT",
+    }
+
+    assert cache.revalidated("do_123") == poster_image_only(CONTENT_DETAILS)
+    assert cache.get_fresh("do_123") == poster_image_only(CONTENT_DETAILS)
+    assert cache.stats()["revalidations"] == 1
+
+def test_revalidated_without_entry():
+    cache = ContentDetailsCache(ttl=60)
+
+    assert cache.revalidation_headers("do_123") == {}
+    assert cache.revalidated("do_123") is None
+
+def test_disabled_cache():
+    cache = ContentDetailsCache(ttl=0)
+
+    assert cache.store("do_123", CONTENT_DETAILS, {"ETag": "\"abc\""}) == CONTENT_DETAILS
+    assert cache.get_fresh("do_123") is None
+    assert cache.revalidation_headers("do_123") == {}
+    assert cache.stats()["misses"] == 0
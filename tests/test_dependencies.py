@@ -0,0 +1,68 @@
+import os
+import subprocess
+import sys
+import pytest
+from app import dependencies
+from app.libs.fake_backends import MemoryStorage
+from app.libs.local_storage import LocalStorage
+
+# Importing the app must stay cheap: no SDK clients and no Vertex AI modules
+IMPORT_TIME_BUDGET = float(os.getenv("IMPORT_TIME_BUDGET", "2.0"))
+
+
+@pytest.fixture(autouse=True)
+def reset_dependencies():
+    yield
+    dependencies.set_storage(None)
+
+def test_get_storage_is_created_once(mocker):
+    mock_gcp_storage = mocker.patch("app.libs.storage.GCPStorage")
+
+    first = dependencies.get_storage()
+    second = dependencies.get_storage()
+
+    assert first is second
+    mock_gcp_storage.assert_called_once()
+
+def test_set_storage(tmp_path):
+    storage = LocalStorage(str(tmp_path))
+    dependencies.set_storage(storage)
+
+    assert dependencies.get_storage() is storage
+
+def test_get_storage_uses_configured_backend(mocker):
+    mocker.patch.dict(os.environ, {"STORAGE_BACKEND": "memory"})
+
+    assert isinstance(dependencies.get_storage(), MemoryStorage)
+
+def test_create_storage(tmp_path, mocker):
+    mocker.patch.dict(os.environ, {"LOCAL_STORAGE_DIR": str(tmp_path)})
+
+    assert isinstance(dependencies.create_storage("local"), LocalStorage)
+    with pytest.raises(ValueError, match="Unsupported storage backend"):
+        dependencies.create_storage("s3")
+
+def test_init_vertex_runs_once(mocker):
+    mock_init = mocker.patch("vertexai.init")
+    mocker.patch.object(dependencies, "_vertex_initialized", False)
+    mocker.patch.dict(os.environ, {"GCP_GEMINI_CREDENTIALS": "/fake/credentials.json", "GCP_GEMINI_PROJECT_ID": "test-project"})
+
+    dependencies.init_vertex()
+    dependencies.init_vertex()
+
+    mock_init.assert_called_once_with(project="test-project")
+    assert os.environ["GOOGLE_APPLICATION_CREDENTIALS"] == "/fake/credentials.json"
+
+def test_app_import_is_lazy_and_within_budget():
+    code = (
+        "import sys, time\n"
+        "start = time.perf_counter()\n"
+        "import app.main\n"
+        "print(time.perf_counter() - start)\n"
+        "print('vertexai' in sys.modules, 'google.cloud.storage' in sys.modules, 'matplotlib' in sys.modules)\n"
+    )
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+    import_time, loaded = result.stdout.strip().splitlines()[-2:]
+
+    assert loaded == "False False False"
+    assert float(import_time) < IMPORT_TIME_BUDGET
\ No newline at end of file
@@ -0,0 +1,140 @@
+import asyncio
+import io
+import json
+import threading
+from unittest.mock import MagicMock
+import httpx
+import pytest
+from PIL import Image
+from vertexai.generative_models import GenerationConfig
+from app import dependencies
+from app.libs import fake_backends, http, model_registry
+from app.libs.fake_backends import FakeGenerativeModel, FakeImageGenerationModel, MemoryStorage, StubGenerativeModel, synthetic_png
+from app.services.v1 import image_variation as image_variation_v1
+
+
+@pytest.fixture
+def fake_vertex(mocker):
+    mocker.patch.dict("os.environ", {"VERTEX_BACKEND": "fake"})
+    mock_init = mocker.patch("app.libs.model_registry.init_vertex")
+    model_registry.clear()
+    yield mock_init
+    model_registry.clear()
+
+def test_generative_model_answers_logo_detection_and_prompts():
+    model = FakeGenerativeModel("gemini-test", latency=0)
+
+    logos = asyncio.run(model.generate_content_async(["image"], generation_config={"response_mime_type": "application/json"}))
+    prompt = model.generate_content(["image"], generation_config=GenerationConfig(temperature=1))
+
+    assert json.loads(logos.text) == []
+    assert prompt.text == fake_backends.FAKE_PROMPT
+    assert model.calls == 2
+
+def test_generative_model_reports_the_canned_logo(mocker):
+    mocker.patch.object(fake_backends, "FAKE_LOGO_DETECTED", True)
+    model = FakeGenerativeModel("gemini-test", latency=0)
+
+    response = asyncio.run(model.generate_content_async(["image"], generation_config={"response_mime_type": "application/json"}))
+
+    assert json.loads(response.text) == [fake_backends.FAKE_LOGO]
+
+def test_generative_model_waits_for_its_latency():
+    model = FakeGenerativeModel("gemini-test", latency=0.05)
+
+    async def timed():
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        await model.generate_content_async(["image"])
+        return loop.time() - start
+
+    assert asyncio.run(timed()) >= 0.05
+
+def test_image_model_is_deterministic_per_prompt():
+    model = FakeImageGenerationModel("imagen-test", latency=0, image_size=64)
+
+    first = model.generate_images(prompt="a classroom", number_of_images="2")
+    second = model.generate_images(prompt="a classroom", number_of_images=2)
+    other = model.generate_images(prompt="a library", number_of_images=1)
+
+    assert [image._image_bytes for image in first] == [image._image_bytes for image in second]
+    assert first[0]._image_bytes != first[1]._image_bytes
+    assert other[0]._image_bytes != first[0]._image_bytes
+    assert first[0]._mime_type == "image/png"
+    assert Image.open(io.BytesIO(first[0]._image_bytes)).size == (64, 64)
+
+def test_memory_storage_keeps_files_or_only_sizes():
+    storage = MemoryStorage(latency=0)
+    sizes_only = MemoryStorage(latency=0, keep_content=False)
+
+    storage.write_file("thumbnails/image.png", b"\x89PNG")
+    sizes_only.write_file("thumbnails/image.png", b"\x89PNG")
+
+    assert storage.read_file("thumbnails/image.png") == b"\x89PNG"
+    assert storage.public_url("thumbnails/image.png") == "memory://thumbnails/image.png"
+    assert sizes_only.files == {}
+    assert sizes_only.bytes_written == 4
+
+def test_registry_creates_fakes_without_vertex_ai(fake_vertex):
+    generative_model = model_registry.get_generative_model("gemini-test", "Find logos")
+    image_model = model_registry.get_image_model("imagen-test")
+
+    assert isinstance(generative_model, FakeGenerativeModel)
+    assert generative_model.system_instruction == "Find logos"
+    assert isinstance(image_model, FakeImageGenerationModel)
+    fake_vertex.assert_not_called()
+
+def test_registry_rejects_unknown_backend(mocker):
+    mocker.patch.dict("os.environ", {"VERTEX_BACKEND": "openai"})
+
+    with pytest.raises(ValueError, match="Unsupported Vertex AI backend"):
+        model_registry.vertex_backend()
+
+def test_v1_pipeline_runs_on_fake_backends(fake_vertex, mocker):
+    thumbnail = synthetic_png(0, 64)
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        if request.url.path.startswith("/api/content/v1/read/"):
+            poster = "https://portal.test/content/do_fake/artifact/poster.png"
+            return httpx.Response(200, json={"result": {"content": {"identifier": "do_fake", "posterImage": poster}}})
+        return httpx.Response(200, content=thumbnail, headers={"Content-Type": "image/png"})
+
+    mocker.patch.object(fake_backends, "FAKE_IMAGE_SIZE", 64)
+    storage = MemoryStorage(latency=0)
+    dependencies.set_storage(storage)
+    http.set_http_client(httpx.AsyncClient(transport=httpx.MockTransport(handler)))
+    try:
+        logo, images, renditions = asyncio.run(image_variation_v1.generate_image_variations("do_fake", use_cache=False))
+    finally:
+        http.set_http_client(None)
+        dependencies.set_storage(None)
+
+    assert logo["found"] is False
+    assert len(images) == int(image_variation_v1.NUMBER_OF_IMAGES)
+    uploaded = [path for path in storage.files if path.endswith("_0.png")]
+    assert uploaded and Image.open(io.BytesIO(storage.files[uploaded[0]])).size == (64, 64)
+
+def test_init_stub_vertex_uses_rest_without_credentials(mocker):
+    mock_init = mocker.patch("vertexai.init")
+    mocker.patch.object(fake_backends, "_stub_vertex_initialized", False)
+    mocker.patch.dict("os.environ", {"VERTEX_API_ENDPOINT": "http://127.0.0.1:8090", "GCP_GEMINI_PROJECT_ID": "loadtest"})
+
+    fake_backends.init_stub_vertex()
+    fake_backends.init_stub_vertex()
+
+    kwargs = mock_init.call_args.kwargs
+    assert mock_init.call_count == 1
+    assert kwargs["project"] == "loadtest"
+    assert kwargs["api_endpoint"] == "http://127.0.0.1:8090"
+    assert kwargs["api_transport"] == "rest"
+
+def test_stub_rest_calls_use_the_pipeline_sized_pool(mocker):
+    mocker.patch.object(fake_backends, "_rest_executor", None)
+    mocker.patch.dict("os.environ", {"PIPELINE_MAX_WORKERS": "48"})
+    model = StubGenerativeModel(MagicMock())
+    model._model.generate_content.side_effect = lambda *args, **kwargs: threading.current_thread().name
+
+    thread_name = asyncio.run(model.generate_content_async(["prompt"]))
+
+    assert fake_backends.get_rest_executor()._max_workers == 48
+    assert thread_name.startswith("gemini-rest")
\ No newline at end of file
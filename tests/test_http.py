@@ -0,0 +1,170 @@
+import asyncio
+import gzip
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import httpx
+import pytest
+from app.libs import http
+
+
+def test_get_http_client_is_shared():
+    first = http.get_http_client()
+    second = http.get_http_client()
+
+    assert first is second
+    asyncio.run(http.close_http_client())
+
+def test_close_http_client_recreates_client():
+    first = http.get_http_client()
+    asyncio.run(http.close_http_client())
+
+    assert first.is_closed
+    assert http.get_http_client() is not first
+    asyncio.run(http.close_http_client())
+
+def test_set_http_client():
+    client = http.create_http_client(httpx.MockTransport(lambda request: httpx.Response(200)))
+    http.set_http_client(client)
+
+    assert http.get_http_client() is client
+    asyncio.run(http.close_http_client())
+
+def sequence_transport(responses):
+    """MockTransport returning (or raising) the given items in order."""
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        item = responses[len(calls) - 1]
+        if isinstance(item, Exception):
+            raise item
+        return httpx.Response(item)
+
+    return httpx.MockTransport(handler), calls
+
+async def send(transport, method="GET", retries=2):
+    async with httpx.AsyncClient(transport=http.RetryTransport(transport, retries=retries, backoff=0)) as client:
+        return await client.request(method, "http://stub/resource")
+
+def test_retry_transport_retries_transient_status():
+    transport, calls = sequence_transport([503, 502, 200])
+
+    response = asyncio.run(send(transport))
+
+    assert response.status_code == 200
+    assert len(calls) == 3
+
+def test_retry_transport_gives_up_after_retries():
+    transport, calls = sequence_transport([503, 503, 503])
+
+    response = asyncio.run(send(transport))
+
+    assert response.status_code == 503
+    assert len(calls) == 3
+
+def test_retry_transport_retries_connection_errors():
+    transport, calls = sequence_transport([httpx.ConnectError("refused"), 200])
+
+    response = asyncio.run(send(transport))
+
+    assert response.status_code == 200
+    assert len(calls) == 2
+
+def test_retry_transport_raises_after_retries():
+    transport, calls = sequence_transport([httpx.ConnectError("refused")] * 2)
+
+    with pytest.raises(httpx.ConnectError):
+        asyncio.run(send(transport, retries=1))
+
+    assert len(calls) == 2
+
+def test_retry_transport_does_not_retry_post():
+    transport, calls = sequence_transport([503, 200])
+
+    response = asyncio.run(send(transport, method="POST"))
+
+    assert response.status_code == 503
+    assert len(calls) == 1
+
+async def read_body(response: httpx.Response, **kwargs) -> bytes:
+    async with httpx.AsyncClient(transport=httpx.MockTransport(lambda request: response)) as client:
+        async with client.stream("GET", "http://stub/image.png") as streamed:
+            return await http.read_bounded(streamed, **kwargs)
+
+def test_read_bounded_reads_whole_body():
+    body = bytes(range(256)) * 1024
+
+    assert asyncio.run(read_body(httpx.Response(200, content=body), max_bytes=len(body), chunk_size=4096)) == body
+
+def test_read_bounded_decodes_compressed_bodies():
+    body = b"thumbnail" * 1000
+    response = httpx.Response(200, content=gzip.compress(body), headers={"Content-Encoding": "gzip"})
+
+    assert asyncio.run(read_body(response, max_bytes=len(body))) == body
+
+def test_read_bounded_rejects_large_bodies():
+    with pytest.raises(http.ResponseTooLarge, match="larger than 100 bytes"):
+        asyncio.run(read_body(httpx.Response(200, content=bytes(101)), max_bytes=100))
+
+def test_read_bounded_returns_a_single_chunk_without_copying():
+    body = bytes(range(256)) * 64
+
+    assert asyncio.run(read_body(httpx.Response(200, content=body), max_bytes=len(body))) is body
+
+def test_read_bounded_checks_the_head_once():
+    heads = []
+
+    body = asyncio.run(read_body(httpx.Response(200, content=b"0123456789" * 10), max_bytes=1000, chunk_size=3, check_head=heads.append, head_size=4))
+    short = asyncio.run(read_body(httpx.Response(200, content=b"01"), max_bytes=1000, check_head=heads.append, head_size=4))
+
+    assert body == b"0123456789" * 10 and short == b"01"
+    assert heads == [b"0123", b"01"]
+
+@pytest.fixture
+def stub_server():
+    """Local KB content API stub that fails the first request with a 503."""
+    requests_seen = []
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            requests_seen.append(self.path)
+            if len(requests_seen) == 1:
+                self.send_response(503)
+                self.end_headers()
+                return
+            body = json.dumps({"result": {"content": {"posterImage": "https://stub/content/poster.png"}}}).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_port}", requests_seen
+    server.shutdown()
+    server.server_close()
+
+def test_fetch_content_details_against_stub_server(stub_server, mocker):
+    from app.services.v2.image_variation import fetch_content_details
+
+    host, requests_seen = stub_server
+    mocker.patch("app.services.v2.image_variation.KB_API_HOST", host)
+    mocker.patch("app.libs.http.HTTP_RETRY_BACKOFF", 0)
+
+    async def run():
+        http.set_http_client(http.create_http_client())
+        try:
+            return await fetch_content_details("do_123")
+        finally:
+            await http.close_http_client()
+
+    details = asyncio.run(run())
+
+    assert details == {"result": {"content": {"posterImage": "https://stub/content/poster.png"}}}
+    assert requests_seen == ["/api/content/v1/read/do_123?mode=edit"] * 2
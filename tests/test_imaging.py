@@ -0,0 +1,110 @@
+import io
+import asyncio
+import pytest
+from PIL import Image
+
+from app.libs import imaging
+from app.libs.imaging import RenditionSpec, parse_renditions, prepare_image, prepare_image_async, render_renditions, render_renditions_async
+
+
+def encode(image, image_format, **options):
+    output = io.BytesIO()
+    image.save(output, format=image_format, **options)
+    return output.getvalue()
+
+def test_prepare_image_bounds_long_edge():
+    data = encode(Image.new("RGB", (3000, 1500), (200, 30, 30)), "PNG")
+
+    prepared = prepare_image(data, max_edge=1024, image_format="JPEG")
+
+    assert (prepared.width, prepared.height) == (1024, 512)
+    assert prepared.mime_type == "image/jpeg"
+    assert prepared.original_size == len(data)
+    assert Image.open(io.BytesIO(prepared.data)).format == "JPEG"
+
+def test_prepare_image_flattens_transparency_for_jpeg():
+    data = encode(Image.new("RGBA", (64, 64), (0, 0, 0, 0)), "PNG")
+
+    prepared = prepare_image(data, max_edge=1024, image_format="JPEG")
+
+    assert Image.open(io.BytesIO(prepared.data)).getpixel((0, 0)) == (255, 255, 255)
+
+def test_prepare_image_webp():
+    data = encode(Image.new("RGBA", (2048, 2048), (0, 128, 0, 128)), "PNG")
+
+    prepared = prepare_image(data, max_edge=512, image_format="WEBP")
+
+    assert prepared.mime_type == "image/webp"
+    assert Image.open(io.BytesIO(prepared.data)).size == (512, 512)
+
+def test_prepare_image_keeps_smaller_original():
+    data = encode(Image.effect_noise((256, 256), 64).convert("RGB"), "JPEG", quality=10)
+
+    prepared = prepare_image(data, max_edge=1024, image_format="JPEG", quality=95)
+
+    assert prepared.data == data
+
+def test_prepare_image_never_keeps_oversized_original():
+    data = encode(Image.effect_noise((2048, 2048), 64).convert("RGB"), "JPEG", quality=5)
+
+    prepared = prepare_image(data, max_edge=1024, image_format="JPEG", quality=100)
+
+    assert prepared.data != data
+    assert Image.open(io.BytesIO(prepared.data)).size == (prepared.width, prepared.height) == (1024, 1024)
+
+def test_prepare_image_rejects_unknown_format():
+    with pytest.raises(ValueError, match="Unsupported image format"):
+        prepare_image(b"", image_format="GIF")
+
+def test_prepare_image_async_in_process_pool(mocker):
+    mocker.patch("app.libs.imaging.IMAGE_PREPROCESS_WORKERS", 1)
+    data = encode(Image.new("RGB", (2000, 1000)), "PNG")
+
+    try:
+        prepared = asyncio.run(prepare_image_async(data, max_edge=100))
+    finally:
+        imaging.shutdown_process_pool()
+
+    assert (prepared.width, prepared.height) == (100, 50)
+
+def test_parse_renditions():
+    assert parse_renditions(" 320:webp, 640:JPEG,320:WEBP,960 ") == [RenditionSpec(320, "WEBP"), RenditionSpec(640, "JPEG"), RenditionSpec(960, "WEBP")]
+    assert parse_renditions("") == []
+
+@pytest.mark.parametrize("value", ["0:WEBP", "wide:WEBP", "320:GIF"])
+def test_parse_renditions_rejects_invalid(value):
+    with pytest.raises(ValueError):
+        parse_renditions(value)
+
+def test_render_renditions_sizes_and_formats():
+    data = encode(Image.new("RGBA", (1024, 512), (0, 0, 0, 0)), "PNG")
+
+    renditions = render_renditions(data, [RenditionSpec(320, "WEBP"), RenditionSpec(320, "JPEG"), RenditionSpec(2048, "WEBP")])
+
+    assert [(r.width, r.height, r.mime_type, r.extension) for r in renditions] == [
+        (320, 160, "image/webp", "webp"),
+        (320, 160, "image/jpeg", "jpg"),
+        (1024, 512, "image/webp", "webp"),
+    ]
+    assert Image.open(io.BytesIO(renditions[1].data)).getpixel((0, 0)) == (255, 255, 255)
+
+def test_render_renditions_skips_unavailable_encoder(mocker):
+    mocker.patch.dict(Image.SAVE, clear=False)
+    Image.init()
+    Image.SAVE.pop("AVIF", None)
+    data = encode(Image.new("RGB", (640, 640)), "PNG")
+
+    renditions = render_renditions(data, [RenditionSpec(320, "AVIF"), RenditionSpec(320, "WEBP")])
+
+    assert [r.mime_type for r in renditions] == ["image/webp"]
+
+def test_render_renditions_async_in_process_pool(mocker):
+    mocker.patch("app.libs.imaging.IMAGE_PREPROCESS_WORKERS", 1)
+    data = encode(Image.new("RGB", (2000, 1000)), "PNG")
+
+    try:
+        renditions = asyncio.run(render_renditions_async(data, [RenditionSpec(200, "WEBP")]))
+    finally:
+        imaging.shutdown_process_pool()
+
+    assert [(r.width, r.height) for r in renditions] == [(200, 100)]
\ No newline at end of file
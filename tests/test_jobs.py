@@ -0,0 +1,139 @@
+import asyncio
+import pytest
+
+from app.libs.jobs import FAILED, SUCCEEDED, JobManager, JobQueueFull, JobEvent, format_sse
+from app.libs.timing import current_timer
+
+
+def test_job_runs_and_publishes_events():
+    async def pipeline(value):
+        current_timer().record("logo_detection", 0.25)
+        return value * 2
+
+    async def run():
+        manager = JobManager(max_workers=1)
+        await manager.start()
+        job = manager.submit("v1", "do_123", pipeline, 21)
+        events = [event async for event in manager.events(job)]
+        await manager.stop()
+        return job, events
+
+    job, events = asyncio.run(run())
+
+    assert job.status == SUCCEEDED
+    assert job.result == 42
+    assert job.stages == {"logo_detection": 0.25}
+    assert [event.event for event in events] == ["queued", "running", "stage", "succeeded"]
+    assert events[2].data["stage"] == "logo_detection"
+    assert events[-1].data["result"] == 42
+
+def test_job_failure_is_recorded():
+    async def pipeline():
+        raise ValueError("Simulated error")
+
+    async def run():
+        manager = JobManager(max_workers=1)
+        await manager.start()
+        job = manager.submit("v1", "do_123", pipeline)
+        events = [event async for event in manager.events(job)]
+        await manager.stop()
+        return job, events
+
+    job, events = asyncio.run(run())
+
+    assert job.status == FAILED
+    assert job.error == "Something went wrong, please try again later..."
+    assert events[-1].event == "failed"
+
+def test_worker_pool_bounds_concurrency():
+    running = 0
+    peak = 0
+
+    async def pipeline():
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.01)
+        running -= 1
+
+    async def run():
+        manager = JobManager(max_workers=2)
+        await manager.start()
+        jobs = [manager.submit("v1", f"do_{index}", pipeline) for index in range(6)]
+        for job in jobs:
+            async for _ in manager.events(job):
+                pass
+        await manager.stop()
+        return jobs
+
+    jobs = asyncio.run(run())
+
+    assert all(job.status == SUCCEEDED for job in jobs)
+    assert peak == 2
+
+def test_submit_rejects_when_queue_is_full():
+    async def pipeline():
+        await asyncio.sleep(1)
+
+    async def run():
+        manager = JobManager(max_workers=1, max_queue=1)
+        await manager.start()
+        manager.submit("v1", "do_1", pipeline)
+        # Let the worker pick up the first job so the second one waits in the queue
+        await asyncio.sleep(0)
+        manager.submit("v1", "do_2", pipeline)
+        with pytest.raises(JobQueueFull):
+            manager.submit("v1", "do_3", pipeline)
+        await manager.stop()
+        return manager
+
+    manager = asyncio.run(run())
+
+    assert manager.stats()["failed"] == 2
+
+def test_submit_rejects_when_not_started():
+    async def pipeline():
+        pass
+
+    with pytest.raises(JobQueueFull, match="not running"):
+        JobManager().submit("v1", "do_1", pipeline)
+
+def test_finished_jobs_are_pruned():
+    async def pipeline():
+        pass
+
+    async def run():
+        manager = JobManager(max_workers=1, retention=0)
+        await manager.start()
+        first = manager.submit("v1", "do_1", pipeline)
+        async for _ in manager.events(first):
+            pass
+        second = manager.submit("v1", "do_2", pipeline)
+        await manager.stop()
+        return manager, first, second
+
+    manager, first, second = asyncio.run(run())
+
+    assert manager.get(first.id) is None
+    assert manager.get(second.id) is second
+
+def test_events_heartbeat():
+    async def pipeline():
+        await asyncio.sleep(0.05)
+
+    async def run():
+        manager = JobManager(max_workers=1)
+        await manager.start()
+        job = manager.submit("v1", "do_1", pipeline)
+        events = [event async for event in manager.events(job, heartbeat=0.01)]
+        await manager.stop()
+        return events
+
+    events = asyncio.run(run())
+
+    assert None in events
+    assert events[-1].event == "succeeded"
+
+def test_format_sse():
+    assert format_sse(JobEvent(event="running", data={"job_id": "1"})) == 'event: running\ndata: {"job_id": "1"}\n\n'
+    assert format_sse(None) == ": keep-alive\n\n"
\ No newline at end of file
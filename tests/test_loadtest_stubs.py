@@ -0,0 +1,102 @@
+import json
+import random
+import pytest
+from fastapi.testclient import TestClient
+
+from loadtest import stubs
+from loadtest.serve import stub_environment
+from loadtest.stubs import STUB_NAMES, LatencyDistribution, StubBehaviour, create_app
+
+GEMINI_PATH = "/v1/projects/loadtest/locations/us-central1/publishers/google/models/gemini-test:generateContent"
+IMAGEN_PATH = "/v1/projects/loadtest/locations/us-central1/publishers/google/models/imagen-test:predict"
+
+
+def stub_client(error_rate: float = 0.0) -> TestClient:
+    behaviours = {name: StubBehaviour(LatencyDistribution("fixed", 0), error_rate) for name in STUB_NAMES}
+    return TestClient(create_app(behaviours, seed=1))
+
+@pytest.mark.parametrize("value,expected", [
+    ("fixed:0.2", LatencyDistribution("fixed", 0.2)),
+    ("uniform:0.1:0.3", LatencyDistribution("uniform", 0.1, 0.3)),
+    ("lognormal:1.5:0.35", LatencyDistribution("lognormal", 1.5, 0.35)),
+])
+def test_latency_distribution_parse(value, expected):
+    assert LatencyDistribution.parse(value) == expected
+
+@pytest.mark.parametrize("value", ["normal:1:2", "fixed", "uniform:1", "fixed:-1", "fixed:fast"])
+def test_latency_distribution_parse_rejects_invalid(value):
+    with pytest.raises(ValueError, match="Invalid latency distribution"):
+        LatencyDistribution.parse(value)
+
+def test_latency_distribution_samples():
+    rng = random.Random(0)
+    samples = [LatencyDistribution("lognormal", 0.1, 0.5).sample(rng) for _ in range(2000)]
+
+    assert all(0.1 <= LatencyDistribution("uniform", 0.1, 0.3).sample(rng) <= 0.3 for _ in range(100))
+    assert 0.09 < sorted(samples)[len(samples) // 2] < 0.11
+
+def test_stub_serves_content_and_thumbnail():
+    client = stub_client()
+
+    content = client.get("/api/content/v1/read/do_1?mode=edit").json()
+    poster = content["result"]["content"]["posterImage"]
+    thumbnail = client.get("/assets/public/do_1/artifact/poster.png")
+
+    assert poster.endswith("/content/do_1/artifact/poster.png")
+    assert thumbnail.headers["content-type"] == "image/png"
+    assert thumbnail.content == client.get("/assets/public/do_1/artifact/poster.png").content
+    assert thumbnail.content != client.get("/assets/public/do_2/artifact/poster.png").content
+
+def test_stub_public_url_follows_the_bound_port(mocker):
+    mocker.patch("loadtest.stubs.STUB_PUBLIC_URL", None)
+    mocker.patch("sys.argv", ["stubs", "--port", "9001"])
+    mock_run = mocker.patch("uvicorn.run")
+
+    stubs.main()
+
+    client = TestClient(mock_run.call_args.args[0])
+    poster = client.get("/api/content/v1/read/do_1").json()["result"]["content"]["posterImage"]
+    assert poster == "http://127.0.0.1:9001/content/do_1/artifact/poster.png"
+    assert mock_run.call_args.kwargs["port"] == 9001
+
+def test_stub_gemini_returns_logo_json_or_prompt():
+    client = stub_client()
+
+    logo = client.post(GEMINI_PATH, json={"contents": [], "generationConfig": {"responseMimeType": "application/json"}})
+    prompt = client.post(GEMINI_PATH, json={"contents": []})
+
+    assert isinstance(json.loads(logo.json()["candidates"][0]["content"]["parts"][0]["text"]), list)
+    assert "illustration" in prompt.json()["candidates"][0]["content"]["parts"][0]["text"]
+
+def test_stub_imagen_returns_the_requested_images():
+    client = stub_client()
+
+    response = client.post(IMAGEN_PATH, json={"instances": [{"prompt": "a classroom"}], "parameters": {"sampleCount": 3}})
+
+    predictions = response.json()["predictions"]
+    assert len(predictions) == 3
+    assert all(prediction["mimeType"] == "image/png" for prediction in predictions)
+
+def test_stub_gcs_accepts_multipart_uploads():
+    client = stub_client()
+    body = b'--b\r\ncontent-type: application/json\r\n\r\n{"name": "thumbnails/do_1/poster_0.png"}\r\n--b\r\ncontent-type: image/png\r\n\r\nPNG\r\n--b--'
+
+    response = client.post("/upload/storage/v1/b/loadtest/o?uploadType=multipart", content=body)
+
+    assert response.json()["name"] == "thumbnails/do_1/poster_0.png"
+    assert response.json()["bucket"] == "loadtest"
+
+def test_stub_error_rate():
+    client = stub_client(error_rate=1.0)
+
+    assert client.get("/api/content/v1/read/do_1").status_code == 500
+    assert client.post(GEMINI_PATH, json={"contents": []}).json()["error"]["status"] == "UNAVAILABLE"
+    assert client.post("/upload/storage/v1/b/loadtest/o", content=b"PNG").status_code == 503
+
+def test_stub_environment_sends_every_call_to_the_stubs():
+    environment = stub_environment("http://127.0.0.1:8090")
+
+    for name in ("KB_API_HOST", "VERTEX_API_ENDPOINT", "STORAGE_EMULATOR_HOST"):
+        assert environment[name] == "http://127.0.0.1:8090"
+    assert environment["VERTEX_BACKEND"] == "stub"
+    assert environment["GCP_STORAGE_CREDENTIALS"] == ""
\ No newline at end of file
@@ -0,0 +1,73 @@
+import time
+import asyncio
+import threading
+import pytest
+from app.libs.local_storage import LocalStorage
+
+
+@pytest.fixture
+def local_storage(tmp_path):
+    return LocalStorage(str(tmp_path), base_url="http://localhost/files")
+
+def test_write_and_read_file(local_storage, tmp_path):
+    local_storage.write_file("thumbnails/do_123/image.png", b"\x89PNG")
+
+    assert (tmp_path / "thumbnails" / "do_123" / "image.png").read_bytes() == b"\x89PNG"
+    assert local_storage.read_file("thumbnails/do_123/image.png") == b"\x89PNG"
+
+def test_write_text_file(local_storage):
+    local_storage.write_file("notes.txt", "hello")
+
+    assert local_storage.read_file("notes.txt") == b"hello"
+
+def test_write_file_outside_base_dir(local_storage):
+    with pytest.raises(ValueError, match="escapes the storage directory"):
+        local_storage.write_file("../outside.png", b"data")
+
+def test_public_url(local_storage):
+    assert local_storage.public_url("thumbnails/image.png") == "http://localhost/files/thumbnails/image.png"
+
+def test_iter_write_files_async_shares_one_pool_and_caps_each_call(local_storage, mocker):
+    lock = threading.Lock()
+    running = [0, 0]
+
+    def write_file(file_path, file_content, mime_type=None):
+        with lock:
+            running[0] += 1
+            running[1] = max(running)
+        time.sleep(0.01)
+        with lock:
+            running[0] -= 1
+
+    mocker.patch.object(local_storage, "write_file", side_effect=write_file)
+    files = [(f"{index}.png", b"x", "image/png") for index in range(6)]
+
+    async def collect():
+        return [item async for item in local_storage.iter_write_files_async(files, max_workers=2)]
+
+    asyncio.run(collect())
+    pool = local_storage.upload_pool()
+    asyncio.run(collect())
+
+    assert local_storage.upload_pool() is pool
+    assert running[1] == 2
+
+def test_iter_write_files_async_empty(local_storage):
+    async def collect():
+        return [item async for item in local_storage.iter_write_files_async([])]
+
+    assert asyncio.run(collect()) == []
+
+def test_iter_write_files_async(local_storage):
+    async def collect():
+        return [item async for item in local_storage.iter_write_files_async([
+            ("a.png", b"a", "image/png"),
+            ("../b.png", b"b", "image/png"),
+        ])]
+
+    results = dict(asyncio.run(collect()))
+
+    assert set(results) == {0, 1}
+    assert results[0].ok
+    assert isinstance(results[1].error, ValueError)
+    assert local_storage.read_file("a.png") == b"a"
\ No newline at end of file
@@ -8,4 +8,13 @@ client = TestClient(app)
 def test_read_main():
     response = client.get("/")
     assert response.status_code == 200
-    assert response.json() == {"This is": "Image Generation Application"}
\ No newline at end of file
+    assert response.json() == {"This is": "Image Generation Application"}
+
+
+def test_read_metrics():
+    client.get("/")
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    assert "# TYPE image_variation_requests_total counter" in response.text
+    assert "# TYPE image_variation_stage_duration_seconds histogram" in response.text
\ No newline at end of file
@@ -0,0 +1,91 @@
+import pytest
+
+from app.libs.metrics import Counter, Gauge, Histogram, Registry, count_outcome
+
+
+def test_histogram_snapshot():
+    histogram = Histogram("test_seconds", "Test histogram", label_names=("stage",), buckets=(0.1, 1.0))
+    histogram.observe(0.05, "upload")
+    histogram.observe(0.5, "upload")
+    histogram.observe(5.0, "upload")
+
+    series = histogram.snapshot()[("upload",)]
+
+    assert series["buckets"] == {0.1: 1, 1.0: 2, float("inf"): 3}
+    assert series["count"] == 3
+    assert series["sum"] == 5.55
+
+def test_histogram_separates_label_values():
+    histogram = Histogram("test_seconds", "Test histogram", label_names=("stage",), buckets=(1.0,))
+    histogram.observe(0.5, "upload")
+    histogram.observe(0.5, "logo_detection")
+
+    assert set(histogram.snapshot()) == {("upload",), ("logo_detection",)}
+
+def test_histogram_quantile():
+    histogram = Histogram("test_seconds", "Test histogram", buckets=(0.1, 1.0, 10.0))
+    for _ in range(90):
+        histogram.observe(0.05)
+    for _ in range(10):
+        histogram.observe(5.0)
+
+    assert histogram.quantile(0.5) == 0.1
+    assert histogram.quantile(0.95) == 10.0
+
+def test_histogram_quantile_without_observations():
+    histogram = Histogram("test_seconds", "Test histogram")
+
+    assert histogram.quantile(0.95) is None
+
+def test_counter_inc():
+    counter = Counter("test_total", "Test counter", label_names=("outcome",))
+    counter.inc("success")
+    counter.inc("success", amount=2)
+
+    assert counter.value("success") == 3
+    assert counter.value("error") == 0
+
+def test_gauge_track_inprogress():
+    gauge = Gauge("test_in_progress", "Test gauge")
+
+    with gauge.track_inprogress():
+        assert gauge.value() == 1
+    assert gauge.value() == 0
+
+def test_count_outcome():
+    counter = Counter("test_total", "Test counter", label_names=("operation", "outcome"))
+
+    with count_outcome(counter, "upload"):
+        pass
+    with pytest.raises(ValueError):
+        with count_outcome(counter, "upload"):
+            raise ValueError("Simulated error")
+
+    assert counter.value("upload", "success") == 1
+    assert counter.value("upload", "error") == 1
+
+def test_registry_render():
+    registry = Registry()
+    counter = Counter("test_total", "Test counter", label_names=("path",), registry=registry)
+    histogram = Histogram("test_seconds", "Test histogram", buckets=(1.0,), registry=registry)
+    counter.inc('a"b')
+    histogram.observe(0.5)
+
+    assert registry.render() == (
+        "# HELP test_total Test counter\n"
+        "# TYPE test_total counter\n"
+        'test_total{path="a\\"b"} 1\n'
+        "# HELP test_seconds Test histogram\n"
+        "# TYPE test_seconds histogram\n"
+        'test_seconds_bucket{le="1.0"} 1\n'
+        'test_seconds_bucket{le="+Inf"} 1\n'
+        "test_seconds_count 1\n"
+        "test_seconds_sum 0.5\n"
+    )
+
+def test_registry_rejects_duplicate_names():
+    registry = Registry()
+    Counter("test_total", "Test counter", registry=registry)
+
+    with pytest.raises(ValueError, match="Metric already registered"):
+        Counter("test_total", "Test counter", registry=registry)
\ No newline at end of file
@@ -0,0 +1,72 @@
+import asyncio
+import pytest
+from app.libs import model_registry
+from app.libs.fake_backends import StubGenerativeModel
+
+
+@pytest.fixture(autouse=True)
+def clear_registry(mocker):
+    mocker.patch("app.libs.model_registry.init_vertex")
+    model_registry.clear()
+    yield
+    model_registry.clear()
+
+def test_get_generative_model_is_cached(mocker):
+    mock_generative_model = mocker.patch("vertexai.generative_models.GenerativeModel")
+
+    first = model_registry.get_generative_model("gemini-test")
+    second = model_registry.get_generative_model("gemini-test")
+
+    assert first is second
+    mock_generative_model.assert_called_once_with("gemini-test")
+
+def test_get_generative_model_keyed_by_system_instruction(mocker):
+    mock_generative_model = mocker.patch("vertexai.generative_models.GenerativeModel", side_effect=lambda *args, **kwargs: object())
+
+    plain = model_registry.get_generative_model("gemini-test")
+    instructed = model_registry.get_generative_model("gemini-test", "Find logos")
+
+    assert plain is not instructed
+    assert model_registry.get_generative_model("gemini-test", "Find logos") is instructed
+    mock_generative_model.assert_called_with("gemini-test", system_instruction=["Find logos"])
+    assert mock_generative_model.call_count == 2
+
+def test_get_image_model_is_cached(mocker):
+    mock_from_pretrained = mocker.patch("vertexai.preview.vision_models.ImageGenerationModel.from_pretrained")
+
+    first = model_registry.get_image_model("imagen-test")
+    second = model_registry.get_image_model("imagen-test")
+
+    assert first is second
+    mock_from_pretrained.assert_called_once_with("imagen-test")
+
+def test_warm_up_creates_handles(mocker):
+    mock_generative_model = mocker.patch("vertexai.generative_models.GenerativeModel")
+    mock_from_pretrained = mocker.patch("vertexai.preview.vision_models.ImageGenerationModel.from_pretrained")
+
+    model_registry.warm_up(generative_models=[("gemini-test", None)], image_models=["imagen-test"])
+    model_registry.get_generative_model("gemini-test")
+    model_registry.get_image_model("imagen-test")
+
+    mock_generative_model.assert_called_once()
+    mock_from_pretrained.assert_called_once()
+
+def test_stub_backend_runs_async_calls_on_a_thread_over_rest(mocker):
+    mock_init = mocker.patch("app.libs.fake_backends.init_stub_vertex")
+    mock_generative_model = mocker.patch("vertexai.generative_models.GenerativeModel")
+    mock_generative_model.return_value.generate_content.return_value = "response"
+    mocker.patch.dict("os.environ", {"VERTEX_BACKEND": "stub"})
+
+    model = model_registry.get_generative_model("gemini-test")
+
+    assert isinstance(model, StubGenerativeModel)
+    assert asyncio.run(model.generate_content_async(["prompt"], generation_config={})) == "response"
+    mock_generative_model.return_value.generate_content.assert_called_once_with(["prompt"], generation_config={})
+    mock_init.assert_called_once()
+    model_registry.init_vertex.assert_not_called()
+
+def test_vertex_backend_calls_are_not_threaded(mocker):
+    mocker.patch("vertexai.generative_models.GenerativeModel")
+    mocker.patch.dict("os.environ", {"VERTEX_API_ENDPOINT": "http://127.0.0.1:8090"})
+
+    assert not isinstance(model_registry.get_generative_model("gemini-test"), StubGenerativeModel)
\ No newline at end of file
@@ -0,0 +1,91 @@
+import io
+import json
+import numpy as np
+from PIL import Image, ImageDraw, ImageFilter
+
+from app.libs.perceptual_index import PerceptualIndex, hamming_distances, image_hashes
+
+
+def artwork(size=(800, 450), shapes=((100, 100, 400, 300), (500, 50, 750, 400))):
+    image = Image.new("RGB", size, (240, 240, 230))
+    draw = ImageDraw.Draw(image)
+    scale = size[0] / 800
+    for index, (left, top, right, bottom) in enumerate(shapes):
+        box = [int(left * scale), int(top * scale), int(right * scale), int(bottom * scale)]
+        draw.ellipse(box, fill=(40 + 100 * index, 60, 160 - 80 * index))
+    return image
+
+def encode(image, image_format, **options):
+    output = io.BytesIO()
+    image.save(output, format=image_format, **options)
+    return output.getvalue()
+
+def distance(first, second):
+    return hamming_distances(np.array([first], dtype=np.uint64), second)[0].tolist()
+
+def test_image_hashes_match_reencoded_and_resized_artwork():
+    original = image_hashes(encode(artwork(), "PNG"))
+    reupload = image_hashes(encode(artwork((1600, 900)).filter(ImageFilter.GaussianBlur(1)), "JPEG", quality=60))
+
+    assert max(distance(original, reupload)) <= 4
+
+def test_image_hashes_differ_for_different_artwork():
+    original = image_hashes(encode(artwork(), "PNG"))
+    other = image_hashes(encode(artwork(shapes=((50, 250, 300, 440), (350, 20, 500, 200))), "PNG"))
+
+    assert min(distance(original, other)) > 4
+
+def test_hamming_distances():
+    hashes = np.array([(0, 0), (0b1011, 2**64 - 1)], dtype=np.uint64)
+
+    assert hamming_distances(hashes, (0b0001, 0)).tolist() == [[1, 0], [2, 64]]
+
+def test_index_lookup_and_merge():
+    index = PerceptualIndex(max_distance=4)
+    index.add("ns", (0b1111, 0), {"logo": {"found": False, "warning": None}})
+    index.add("ns", (0b0111, 1), {"prompt": "cat standing on table"})
+
+    assert len(index) == 1
+    assert index.lookup("ns", (0b1110, 0)) == {"logo": {"found": False, "warning": None}, "prompt": "cat standing on table"}
+    assert index.lookup("ns", (2**64 - 1, 0)) is None
+    assert index.lookup("other", (0b1111, 0)) is None
+
+def test_index_returns_closest_match():
+    index = PerceptualIndex(max_distance=4)
+    index.add("ns", (0b1111, 0), {"prompt": "far"})
+    index.add("ns", (0b1111 << 8, 0), {"prompt": "near"})
+
+    assert index.lookup("ns", ((0b1111 << 8) | 1, 0)) == {"prompt": "near"}
+
+def test_index_evicts_oldest_entries():
+    index = PerceptualIndex(max_distance=0, max_entries=2)
+    for value in range(3):
+        index.add("ns", (value, value), {"prompt": str(value)})
+
+    assert index.lookup("ns", (0, 0)) is None
+    assert index.lookup("ns", (2, 2)) == {"prompt": "2"}
+
+def test_index_persists_and_compacts(tmp_path):
+    path = tmp_path / "index" / "perceptual.jsonl"
+    index = PerceptualIndex(path=str(path))
+    index.add("ns", (2**63 + 5, 7), {"logo": {"found": True, "warning": "logo"}})
+    index.add("ns", (2**63 + 5, 7), {"prompt": "cat standing on table"})
+    with open(path, "a") as index_file:
+        index_file.write('{"namespace": "ns", "pha')
+
+    reloaded = PerceptualIndex(path=str(path))
+
+    assert reloaded.lookup("ns", (2**63 + 5, 7)) == {"logo": {"found": True, "warning": "logo"}, "prompt": "cat standing on table"}
+    records = [json.loads(line) for line in path.read_text().splitlines()]
+    assert len(records) == 1
+    assert records[0]["phash"] == 2**63 + 5
+
+def test_index_compacts_while_running(tmp_path):
+    path = tmp_path / "perceptual.jsonl"
+    index = PerceptualIndex(path=str(path), max_entries=2)
+    for value in range(50):
+        index.add("ns", (value, value), {"prompt": f"prompt {value}"})
+        index.add("ns", (value, value), {"logo": {"found": False}})
+
+    assert len(path.read_text().splitlines()) <= 2 * len(index)
+    assert PerceptualIndex(path=str(path)).lookup("ns", (49, 49)) == {"prompt": "prompt 49", "logo": {"found": False}}
\ No newline at end of file
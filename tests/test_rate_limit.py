@@ -0,0 +1,113 @@
+import time
+import asyncio
+import pytest
+
+from app.libs.metrics import quota_queue_depth, quota_rejections_total, quota_wait_seconds
+from app.libs.rate_limit import BATCH, INTERACTIVE, QuotaExceeded, QuotaScheduler, TokenBucket, get_model_scheduler, quota_errors
+
+
+def test_token_bucket_spaces_acquisitions():
+    async def run():
+        bucket = TokenBucket(rate=50)
+        start = time.monotonic()
+        for _ in range(4):
+            await bucket.acquire()
+        return time.monotonic() - start
+
+    # The first token is available at once, the next three take 20 ms each
+    assert asyncio.run(run()) >= 0.055
+
+def test_token_bucket_allows_bursts_up_to_capacity():
+    async def run():
+        bucket = TokenBucket(rate=1, capacity=3)
+        start = time.monotonic()
+        for _ in range(3):
+            await bucket.acquire()
+        return time.monotonic() - start
+
+    assert asyncio.run(run()) < 0.05
+
+def test_token_bucket_rejects_invalid_rate():
+    with pytest.raises(ValueError, match="must be positive"):
+        TokenBucket(rate=0)
+
+def test_quota_scheduler_serves_interactive_before_batch():
+    async def run():
+        scheduler = QuotaScheduler("test-priority", rate=20)
+        await scheduler.acquire()
+        order = []
+
+        async def call(name, priority):
+            await scheduler.acquire(priority)
+            order.append(name)
+
+        first_batch = asyncio.create_task(call("batch-1", BATCH))
+        second_batch = asyncio.create_task(call("batch-2", BATCH))
+        await asyncio.sleep(0)
+        interactive = asyncio.create_task(call("interactive", INTERACTIVE))
+        await asyncio.sleep(0)
+        depth = (scheduler.depth(INTERACTIVE), scheduler.depth(BATCH))
+        await asyncio.gather(first_batch, second_batch, interactive)
+        return order, depth
+
+    order, depth = asyncio.run(run())
+
+    assert order == ["interactive", "batch-1", "batch-2"]
+    assert depth == (1, 2)
+    assert quota_queue_depth.value("test-priority", "batch") == 0
+    assert quota_wait_seconds.snapshot()[("test-priority", "batch")]["count"] == 2
+
+def test_quota_scheduler_rejects_calls_that_would_wait_too_long():
+    async def run():
+        scheduler = QuotaScheduler("test-reject", rate=1, max_wait=0.5)
+        await scheduler.acquire()
+        await scheduler.acquire(BATCH)
+
+    with pytest.raises(QuotaExceeded) as error:
+        asyncio.run(run())
+
+    assert error.value.status_code == 503
+    assert 0.5 < error.value.retry_after <= 1
+    assert quota_rejections_total.value("test-reject", "batch") == 1
+
+def test_quota_scheduler_skips_cancelled_waiters():
+    async def run():
+        scheduler = QuotaScheduler("test-cancel", rate=20)
+        await scheduler.acquire()
+        abandoned = asyncio.create_task(scheduler.acquire())
+        await asyncio.sleep(0)
+        abandoned.cancel()
+        start = time.monotonic()
+        await scheduler.acquire()
+        return time.monotonic() - start, scheduler.depth()
+
+    elapsed, depth = asyncio.run(run())
+
+    # The cancelled call's token goes to the next one instead of being lost
+    assert elapsed < 0.09
+    assert depth == 0
+
+def test_quota_scheduler_try_acquire_does_not_wait():
+    async def run():
+        scheduler = QuotaScheduler("test-try", rate=20)
+        first = scheduler.try_acquire()
+        second = scheduler.try_acquire()
+        await asyncio.sleep(0.06)
+        return first, second, scheduler.try_acquire(), scheduler.depth()
+
+    assert asyncio.run(run()) == (True, False, True, 0)
+
+def test_get_model_scheduler_is_shared_per_model():
+    assert get_model_scheduler("test-model", 0) is None
+    assert get_model_scheduler("test-model", 60) is get_model_scheduler("test-model", 60)
+
+def test_quota_errors_translates_quota_errors():
+    class ResourceExhausted(Exception):
+        code = 429
+
+    with pytest.raises(QuotaExceeded) as error:
+        with quota_errors("test-vertex-error"):
+            raise ResourceExhausted("Quota exceeded for aiplatform.googleapis.com/generate_content_requests_per_minute")
+
+    assert error.value.status_code == 429
+    assert isinstance(error.value.__cause__, ResourceExhausted)
\ No newline at end of file
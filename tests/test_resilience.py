@@ -0,0 +1,262 @@
+import asyncio
+import pytest
+
+from app.libs import resilience
+from app.libs.metrics import circuit_breaker_rejections_total, circuit_breaker_state, hedged_requests_total, model_call_latency, stage_latency
+from app.libs.rate_limit import BATCH, QuotaExceeded, QuotaScheduler, get_model_scheduler, request_priority
+from app.libs.resilience import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitOpen, guarded_call, hedge, hedge_delay, is_failure
+
+
+class ServerError(Exception):
+    def __init__(self, code):
+        super().__init__(f"HTTP {code}")
+        self.code = code
+
+
+async def succeed():
+    return "ok"
+
+async def fail():
+    raise ServerError(500)
+
+async def _raise(error):
+    raise error
+
+
+def test_circuit_breaker_opens_after_consecutive_failures():
+    async def run():
+        breaker = CircuitBreaker("test-open", failure_threshold=3, reset_timeout=60)
+        for _ in range(2):
+            with pytest.raises(ServerError):
+                await breaker.call(fail)
+        # A success in between resets the count
+        assert await breaker.call(succeed) == "ok"
+        for _ in range(3):
+            with pytest.raises(ServerError):
+                await breaker.call(fail)
+        assert breaker.state == OPEN
+        with pytest.raises(CircuitOpen) as error:
+            await breaker.call(succeed)
+        return error.value
+
+    error = asyncio.run(run())
+
+    assert 59 < error.retry_after <= 60
+    assert error.status_code == 503
+    assert circuit_breaker_state.value("test-open") == 2
+    assert circuit_breaker_rejections_total.value("test-open") == 1
+
+def test_circuit_breaker_lets_one_trial_call_through_when_half_open():
+    async def run():
+        breaker = CircuitBreaker("test-half-open", failure_threshold=1, reset_timeout=0.01)
+        with pytest.raises(ServerError):
+            await breaker.call(fail)
+        await asyncio.sleep(0.02)
+        trial_started = asyncio.Event()
+        release = asyncio.Event()
+
+        async def slow():
+            trial_started.set()
+            await release.wait()
+            return "ok"
+
+        trial = asyncio.create_task(breaker.call(slow))
+        await trial_started.wait()
+        assert breaker.state == HALF_OPEN
+        with pytest.raises(CircuitOpen):
+            await breaker.call(succeed)
+        release.set()
+        assert await trial == "ok"
+        return breaker.state
+
+    assert asyncio.run(run()) == CLOSED
+    assert circuit_breaker_state.value("test-half-open") == 0
+
+def test_circuit_breaker_reopens_when_the_trial_call_fails():
+    async def run():
+        breaker = CircuitBreaker("test-reopen", failure_threshold=1, reset_timeout=0.01)
+        with pytest.raises(ServerError):
+            await breaker.call(fail)
+        await asyncio.sleep(0.02)
+        with pytest.raises(ServerError):
+            await breaker.call(fail)
+        return breaker.state
+
+    assert asyncio.run(run()) == OPEN
+
+def test_circuit_breaker_ignores_client_errors():
+    async def run():
+        breaker = CircuitBreaker("test-ignored", failure_threshold=1, reset_timeout=60)
+        with pytest.raises(ServerError):
+            await breaker.call(lambda: _raise(ServerError(400)))
+        with pytest.raises(QuotaExceeded):
+            await breaker.call(lambda: _raise(QuotaExceeded("quota exceeded", retry_after=1)))
+        return breaker.state
+
+    assert asyncio.run(run()) == CLOSED
+
+def test_is_failure():
+    assert is_failure(ServerError(500))
+    assert is_failure(asyncio.TimeoutError())
+    assert not is_failure(ServerError(404))
+    assert not is_failure(asyncio.CancelledError())
+    assert not is_failure(CircuitOpen("open", retry_after=1))
+
+def test_hedge_returns_fast_calls_without_a_second_attempt():
+    calls = []
+
+    async def call():
+        calls.append(1)
+        return "ok"
+
+    assert asyncio.run(hedge(call, delay=0.5, name="test-fast")) == "ok"
+    assert len(calls) == 1
+    assert hedged_requests_total.value("test-fast", "sent") == 0
+
+def test_hedge_sends_a_second_attempt_and_cancels_the_slower_one():
+    cancelled = []
+    delays = [1.0, 0.01]
+
+    async def call():
+        delay = delays.pop(0)
+        try:
+            await asyncio.sleep(delay)
+        except asyncio.CancelledError:
+            cancelled.append(delay)
+            raise
+        return delay
+
+    assert asyncio.run(hedge(call, delay=0.02, name="test-slow")) == 0.01
+    assert cancelled == [1.0]
+    assert hedged_requests_total.value("test-slow", "sent") == 1
+    assert hedged_requests_total.value("test-slow", "won") == 1
+
+def test_hedge_raises_the_primary_error_when_both_attempts_fail():
+    codes = [500, 503]
+
+    async def call():
+        code = codes.pop(0)
+        await asyncio.sleep(0.05 if code == 500 else 0)
+        raise ServerError(code)
+
+    with pytest.raises(ServerError) as error:
+        asyncio.run(hedge(call, delay=0.01, name="test-both-fail"))
+
+    assert error.value.code == 500
+
+def test_hedge_delay_waits_for_enough_samples(mocker):
+    mocker.patch.object(resilience, "HEDGE_REQUESTS", True)
+    mocker.patch.object(resilience, "HEDGE_MIN_SAMPLES", 10)
+
+    for _ in range(9):
+        model_call_latency.observe(0.3, "test_hedge_stage")
+    assert hedge_delay("test_hedge_stage") is None
+
+    model_call_latency.observe(0.3, "test_hedge_stage")
+    assert hedge_delay("test_hedge_stage") == 0.5
+
+def test_hedge_delay_ignores_time_spent_waiting_for_quota(mocker):
+    mocker.patch.object(resilience, "HEDGE_REQUESTS", True)
+    mocker.patch.object(resilience, "HEDGE_MIN_SAMPLES", 1)
+
+    # Stage durations include the quota queue, model call latencies do not
+    stage_latency.observe(30, "test_hedge_queue_stage")
+    model_call_latency.observe(0.3, "test_hedge_queue_stage")
+
+    assert hedge_delay("test_hedge_queue_stage") == 0.5
+
+def test_hedge_skips_the_second_attempt_when_not_admitted():
+    calls = []
+
+    async def call():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return "ok"
+
+    assert asyncio.run(hedge(call, delay=0.01, name="test-not-admitted", admit=lambda: False)) == "ok"
+    assert len(calls) == 1
+    assert hedged_requests_total.value("test-not-admitted", "sent") == 0
+    assert hedged_requests_total.value("test-not-admitted", "skipped") == 1
+
+def test_hedge_delay_is_none_when_disabled(mocker):
+    mocker.patch.object(resilience, "HEDGE_REQUESTS", False)
+
+    assert hedge_delay("logo_detection") is None
+
+def test_guarded_call_fails_fast_once_the_circuit_opens(mocker):
+    mocker.patch.object(resilience, "CIRCUIT_BREAKER_FAILURES", 2)
+    mocker.patch.object(resilience, "_breakers", {})
+    calls = []
+
+    async def call():
+        calls.append(1)
+        raise ServerError(503)
+
+    async def run():
+        for _ in range(2):
+            with pytest.raises(ServerError):
+                await guarded_call("test-model", call)
+        with pytest.raises(CircuitOpen):
+            await guarded_call("test-model", call)
+
+    asyncio.run(run())
+
+    assert len(calls) == 2
+
+def test_guarded_call_without_circuit_breaker(mocker):
+    mocker.patch.object(resilience, "CIRCUIT_BREAKER_FAILURES", 0)
+
+    assert resilience.get_circuit_breaker("test-model") is None
+    assert asyncio.run(guarded_call("test-model", succeed)) == "ok"
+
+def test_guarded_call_waits_for_quota_at_current_priority(mocker):
+    mock_acquire = mocker.patch.object(QuotaScheduler, "acquire")
+
+    async def run():
+        with request_priority(BATCH):
+            return await guarded_call("test-priority", succeed, requests_per_minute=60)
+
+    assert asyncio.run(run()) == "ok"
+    mock_acquire.assert_called_once_with(BATCH)
+
+def test_guarded_call_starts_the_hedge_delay_after_the_quota_wait(mocker):
+    mocker.patch.object(resilience, "hedge_delay", return_value=0.05)
+    calls = []
+
+    async def call():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return "ok"
+
+    async def run():
+        # 10 calls per second, with the only token taken the next call queues for 0.1s
+        await get_model_scheduler("test-hedge-after-wait", 600).acquire()
+        return await guarded_call("test-hedge-after-wait", call, hedge_stage="test_hedge_after_wait", requests_per_minute=600)
+
+    assert asyncio.run(run()) == "ok"
+    assert len(calls) == 1
+    assert hedged_requests_total.value("test_hedge_after_wait", "sent") == 0
+
+def test_guarded_call_hedges_only_with_quota_to_spare(mocker):
+    mocker.patch.object(resilience, "hedge_delay", return_value=0.01)
+    calls = []
+
+    async def call():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return "ok"
+
+    # One call per second, the primary takes the only token
+    assert asyncio.run(guarded_call("test-hedge-quota", call, hedge_stage="test_hedge_quota", requests_per_minute=60)) == "ok"
+
+    assert len(calls) == 1
+    assert hedged_requests_total.value("test_hedge_quota", "skipped") == 1
+
+def test_guarded_call_translates_quota_errors():
+    class ResourceExhausted(Exception):
+        code = 429
+
+    with pytest.raises(QuotaExceeded) as error:
+        asyncio.run(guarded_call("test-quota-error", lambda: _raise(ResourceExhausted("Quota exceeded"))))
+
+    assert error.value.status_code == 429
\ No newline at end of file
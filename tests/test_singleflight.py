@@ -0,0 +1,131 @@
+import asyncio
+import pytest
+
+from app.libs.singleflight import MemoryLockBackend, RedisLockBackend, SingleFlight, create_single_flight
+
+
+class FakeRedis:
+    """Local stand-in for the Redis commands used by the lock backend"""
+
+    def __init__(self):
+        self.values = {}
+
+    def set(self, key, value, nx=False, px=None):
+        if nx and key in self.values:
+            return None
+        self.values[key] = value.encode()
+        return True
+
+    def eval(self, script, numkeys, key, token):
+        if self.values.get(key) == token.encode():
+            del self.values[key]
+            return 1
+        return 0
+
+def test_concurrent_calls_share_one_execution():
+    calls = 0
+
+    async def func():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return calls
+
+    async def run():
+        flight = SingleFlight()
+        return await asyncio.gather(*[flight.do("course", func) for _ in range(5)])
+
+    assert asyncio.run(run()) == [1, 1, 1, 1, 1]
+    assert calls == 1
+
+def test_exception_is_shared_and_key_is_released():
+    calls = 0
+
+    async def failing():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        raise ValueError("Simulated error")
+
+    async def run():
+        flight = SingleFlight(MemoryLockBackend())
+        results = await asyncio.gather(flight.do("course", failing), flight.do("course", failing), return_exceptions=True)
+        # Finished calls are not reused
+        await asyncio.gather(flight.do("course", failing), return_exceptions=True)
+        return results
+
+    results = asyncio.run(run())
+
+    assert all(isinstance(result, ValueError) for result in results)
+    assert calls == 2
+
+def test_cancelled_caller_does_not_cancel_others():
+    async def func():
+        await asyncio.sleep(0.02)
+        return "done"
+
+    async def run():
+        flight = SingleFlight()
+        first = asyncio.ensure_future(flight.do("course", func))
+        second = asyncio.ensure_future(flight.do("course", func))
+        await asyncio.sleep(0)
+        first.cancel()
+        return await second
+
+    assert asyncio.run(run()) == "done"
+
+def test_lock_backend_serializes_replicas():
+    order = []
+    backend = MemoryLockBackend()
+
+    def make_func(name):
+        async def func():
+            order.append(f"{name}_start")
+            await asyncio.sleep(0.02)
+            order.append(f"{name}_end")
+            return name
+        return func
+
+    async def run():
+        # Two groups sharing a backend stand in for two replicas
+        replica_a = SingleFlight(backend, poll_interval=0.005)
+        replica_b = SingleFlight(backend, poll_interval=0.005)
+        return await asyncio.gather(replica_a.do("course", make_func("a")), replica_b.do("course", make_func("b")))
+
+    assert asyncio.run(run()) == ["a", "b"]
+    assert order == ["a_start", "a_end", "b_start", "b_end"]
+
+def test_redis_lock_backend_with_client():
+    client = FakeRedis()
+    backend = RedisLockBackend(client=client)
+
+    async def run():
+        assert await backend.acquire("course", "token_a", 10)
+        assert not await backend.acquire("course", "token_b", 10)
+        # Only the holder can release the lock
+        await backend.release("course", "token_b")
+        assert not await backend.acquire("course", "token_b", 10)
+        await backend.release("course", "token_a")
+        assert await backend.acquire("course", "token_b", 10)
+
+    asyncio.run(run())
+
+    assert client.values == {"singleflight:course": b"token_b"}
+
+def test_lock_wait_times_out():
+    backend = MemoryLockBackend()
+
+    async def func():
+        return "ran"
+
+    async def run():
+        await backend.acquire("course", "other_replica", 60)
+        return await SingleFlight(backend, lock_ttl=0.02, poll_interval=0.005).do("course", func)
+
+    assert asyncio.run(run()) == "ran"
+
+def test_create_single_flight():
+    assert create_single_flight("none") is None
+    assert isinstance(create_single_flight("memory").backend, MemoryLockBackend)
+    with pytest.raises(ValueError, match="Unsupported single-flight backend"):
+        create_single_flight("etcd")
\ No newline at end of file
@@ -1,6 +1,7 @@
 import pytest
 from unittest import mock
 from unittest.mock import MagicMock, patch
+from app.libs.metrics import storage_upload_bytes_total, storage_uploads_total
 from app.libs.storage import GCPStorage
 
 @patch("app.libs.storage.os.getenv")
@@ -95,3 +96,156 @@ def test_public_url_raises_without_client(mock_storage_client, mock_credentials,
 
     with pytest.raises(Exception, match="GCP Storage client not initialized"):
         instance.public_url("file.png")
+
+def gcp_env(extra=None):
+    env = {
+        "GCP_BUCKET_NAME": "test-bucket",
+        "GCP_STORAGE_CREDENTIALS": "/fake/credentials.json"
+    }
+    env.update(extra or {})
+    return lambda key: env.get(key)
+
+@patch("app.libs.storage.os.getenv")
+@patch("app.libs.storage.service_account.Credentials.from_service_account_file")
+@patch("app.libs.storage.storage.Client")
+def test_bucket_handle_is_reused(mock_storage_client, mock_credentials, mock_getenv):
+    mock_getenv.side_effect = gcp_env()
+
+    instance = GCPStorage()
+    instance.write_file("a.png", b"data")
+    instance.write_file("b.png", b"data")
+    instance.public_url("a.png")
+
+    mock_storage_client.return_value.bucket.assert_called_once_with("test-bucket")
+
+@patch("app.libs.storage.os.getenv")
+@patch("app.libs.storage.service_account.Credentials.from_service_account_file")
+@patch("app.libs.storage.storage.Client")
+def test_write_file_upload_tuning(mock_storage_client, mock_credentials, mock_getenv):
+    mock_getenv.side_effect = gcp_env({"GCS_UPLOAD_CHUNK_SIZE": "262144", "GCS_UPLOAD_CHECKSUM": "crc32c"})
+    mock_bucket = mock_storage_client.return_value.bucket.return_value
+
+    instance = GCPStorage()
+    instance.write_file("image.png", b"data", "image/png")
+
+    mock_bucket.blob.assert_called_once_with("image.png", chunk_size=262144)
+    mock_bucket.blob.return_value.upload_from_string.assert_called_once_with(b"data", content_type="image/png", checksum="crc32c")
+
+@patch("app.libs.storage.os.getenv")
+@patch("app.libs.storage.service_account.Credentials.from_service_account_file")
+@patch("app.libs.storage.storage.Client")
+def test_public_url_skips_acl_update_when_already_public(mock_storage_client, mock_credentials, mock_getenv):
+    mock_getenv.side_effect = gcp_env()
+    mock_blob = mock_storage_client.return_value.bucket.return_value.blob.return_value
+
+    instance = GCPStorage()
+    instance.public_url("file.png")
+    instance.public_url("file.png")
+
+    mock_blob.make_public.assert_called_once()
+
+@patch("app.libs.storage.os.getenv")
+@patch("app.libs.storage.service_account.Credentials.from_service_account_file")
+@patch("app.libs.storage.storage.Client")
+def test_public_url_assume_public(mock_storage_client, mock_credentials, mock_getenv):
+    mock_getenv.side_effect = gcp_env({"GCS_ASSUME_PUBLIC": "true"})
+    mock_blob = mock_storage_client.return_value.bucket.return_value.blob.return_value
+
+    instance = GCPStorage()
+    instance.public_url("file.png")
+
+    mock_blob.make_public.assert_not_called()
+
+@patch("app.libs.storage.os.getenv")
+@patch("app.libs.storage.service_account.Credentials.from_service_account_file")
+@patch("app.libs.storage.storage.Client")
+def test_public_url_after_overwrite_updates_acl(mock_storage_client, mock_credentials, mock_getenv):
+    mock_getenv.side_effect = gcp_env()
+    mock_blob = mock_storage_client.return_value.bucket.return_value.blob.return_value
+
+    instance = GCPStorage()
+    instance.public_url("file.png")
+    instance.write_file("file.png", b"new")
+    instance.public_url("file.png")
+
+    assert mock_blob.make_public.call_count == 2
+
+@patch("app.libs.storage.PUBLIC_PATHS_CACHE_SIZE", 2)
+@patch("app.libs.storage.os.getenv")
+@patch("app.libs.storage.service_account.Credentials.from_service_account_file")
+@patch("app.libs.storage.storage.Client")
+def test_public_paths_are_bounded(mock_storage_client, mock_credentials, mock_getenv):
+    mock_getenv.side_effect = gcp_env()
+    mock_blob = mock_storage_client.return_value.bucket.return_value.blob.return_value
+
+    instance = GCPStorage()
+    instance.public_url("a.png")
+    instance.public_url("b.png")
+    instance.public_url("a.png")
+    instance.public_url("c.png")
+
+    assert list(instance.__public_paths__) == ["a.png", "c.png"]
+    assert mock_blob.make_public.call_count == 3
+
+@patch("app.libs.storage.os.getenv")
+@patch("app.libs.storage.service_account.Credentials.from_service_account_file")
+@patch("app.libs.storage.storage.Client")
+def test_upload_stats(mock_storage_client, mock_credentials, mock_getenv):
+    mock_getenv.side_effect = gcp_env()
+
+    instance = GCPStorage()
+    assert instance.upload_stats() == {"bytes_uploaded": 0, "upload_count": 0}
+
+    instance.write_file("a.png", b"1234")
+    instance.write_file("b.png", b"123456")
+    stats = instance.upload_stats()
+
+    assert stats["bytes_uploaded"] == 10
+    assert stats["upload_count"] == 2
+    assert 0 <= stats["latency_avg"] <= stats["latency_max"]
+    assert stats["latency_p95"] <= stats["latency_max"]
+
+@patch("app.libs.storage.os.getenv")
+@patch("app.libs.storage.service_account.Credentials.from_service_account_file")
+@patch("app.libs.storage.storage.Client")
+def test_upload_stats_count_encoded_text(mock_storage_client, mock_credentials, mock_getenv):
+    mock_getenv.side_effect = gcp_env()
+
+    instance = GCPStorage()
+    instance.write_file("a.svg", "ü€")
+
+    assert instance.upload_stats()["bytes_uploaded"] == 5
+
+@patch("app.libs.storage.os.getenv")
+@patch("app.libs.storage.service_account.Credentials.from_service_account_file")
+@patch("app.libs.storage.storage.Client")
+def test_write_file_updates_metrics(mock_storage_client, mock_credentials, mock_getenv):
+    mock_getenv.side_effect = gcp_env()
+    mock_blob = MagicMock()
+    mock_storage_client.return_value.bucket.return_value.blob.return_value = mock_blob
+    bytes_before = storage_upload_bytes_total.value("gcs")
+    errors_before = storage_uploads_total.value("gcs", "error")
+
+    instance = GCPStorage()
+    instance.write_file("a.png", b"1234")
+    mock_blob.upload_from_string.side_effect = Exception("Simulated upload error")
+    with pytest.raises(Exception):
+        instance.write_file("b.png", b"123456")
+
+    assert storage_upload_bytes_total.value("gcs") == bytes_before + 4
+    assert storage_uploads_total.value("gcs", "error") == errors_before + 1
+
+@patch("app.libs.storage.os.getenv")
+@patch("app.libs.storage.service_account.Credentials.from_service_account_file")
+@patch("app.libs.storage.storage.Client")
+def test_gcp_storage_emulator_needs_no_credentials(mock_storage_client, mock_credentials, mock_getenv):
+    mock_getenv.side_effect = lambda key: {
+        "GCP_BUCKET_NAME": "test-bucket",
+        "STORAGE_EMULATOR_HOST": "http://127.0.0.1:8090"
+    }.get(key)
+
+    instance = GCPStorage()
+
+    mock_credentials.assert_not_called()
+    mock_storage_client.assert_called_once_with()
+    assert instance.__bucket_name__ == "test-bucket"
\ No newline at end of file
@@ -0,0 +1,8 @@
+from app.libs.streaming import NDJSON, SSE, format_event
+
+
+def test_format_event_ndjson():
+    assert format_event({"event": "image", "index": 0, "url": "a.png"}, NDJSON) == '{"event": "image", "index": 0, "url": "a.png"}\n'
+
+def test_format_event_sse():
+    assert format_event({"event": "image", "index": 0, "url": "a.png"}, SSE) == 'event: image\ndata: {"index": 0, "url": "a.png"}\n\n'
\ No newline at end of file
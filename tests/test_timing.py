@@ -0,0 +1,90 @@
+import asyncio
+import time
+from app.libs.metrics import stage_latency
+from app.libs.timing import StageTimer, bind_timer, current_timer
+
+
+def test_stage_records_duration():
+    timer = StageTimer()
+    with timer.stage("sleep"):
+        time.sleep(0.01)
+
+    assert "sleep" in timer.stages
+    assert timer.stages["sleep"] >= 0.01
+
+def test_stage_records_duration_on_exception():
+    timer = StageTimer()
+    try:
+        with timer.stage("broken"):
+            raise ValueError("Simulated error")
+    except ValueError:
+        pass
+
+    assert "broken" in timer.stages
+
+def test_run_returns_result():
+    timer = StageTimer()
+
+    result = timer.run("add", lambda a, b: a + b, 1, b=2)
+
+    assert result == 3
+    assert "add" in timer.stages
+
+def test_summary():
+    timer = StageTimer()
+    timer.stages = {"detect_logos": 1.23456, "generate_image": 2.0}
+
+    assert timer.summary() == "detect_logos=1.235s, generate_image=2.000s"
+
+def test_run_async_returns_result():
+    timer = StageTimer()
+
+    async def add(a, b):
+        return a + b
+
+    result = asyncio.run(timer.run_async("add", add(1, 2)))
+
+    assert result == 3
+    assert "add" in timer.stages
+
+def test_record():
+    timer = StageTimer()
+    timer.record("upload_0", 0.5)
+
+    assert timer.stages == {"upload_0": 0.5}
+
+
+def test_record_observes_stage_histogram():
+    before = stage_latency.snapshot().get(("test_histogram_stage",), {"count": 0})["count"]
+    timer = StageTimer()
+    timer.record("test_histogram_stage", 0.5)
+
+    assert stage_latency.snapshot()[("test_histogram_stage",)]["count"] == before + 1
+
+def test_server_timing():
+    timer = StageTimer()
+    timer.stages = {"logo_detection": 1.23456, "upload_0": 0.0005}
+
+    assert timer.server_timing() == "logo_detection;dur=1234.6, upload_0;dur=0.5"
+    assert timer.server_timing(2.0) == "logo_detection;dur=1234.6, upload_0;dur=0.5, total;dur=2000.0"
+
+def test_current_timer_is_bound_timer():
+    timer = StageTimer()
+
+    with bind_timer(timer):
+        assert current_timer() is timer
+    assert current_timer() is not timer
+
+def test_bound_timer_is_shared_with_tasks():
+    timer = StageTimer()
+
+    async def stage(name):
+        current_timer().record(name, 0.1)
+
+    async def run():
+        with bind_timer(timer):
+            await asyncio.gather(stage("a"), stage("b"))
+
+    asyncio.run(run())
+
+    assert timer.stages == {"a": 0.1, "b": 0.1}
\ No newline at end of file
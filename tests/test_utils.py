@@ -6,7 +6,8 @@ from app.utils import (
     format_storage_url,
     get_file_extension,
     get_file_mimetype,
-    get_extension_from_mimetype
+    get_extension_from_mimetype,
+    sniff_image_mimetype
 )
 
 # Test cases for format_storage_url
@@ -31,6 +32,12 @@ def test_format_storage_url_custom_prefix():
     expected = "https://example.com/static/path/image.jpg"
     assert format_storage_url(url, asset_prefix=custom_prefix) == expected
 
+def test_format_storage_url_custom_scheme():
+    """Tests formatting for a plain http asset host, such as the load test stubs."""
+    url = "http://127.0.0.1:8090/content/do_1/poster.png"
+    expected = "http://127.0.0.1:8090/assets/public/do_1/poster.png"
+    assert format_storage_url(url, scheme="http") == expected
+
 
 # Test cases for get_file_extension
 @pytest.mark.parametrize("input_path,expected_ext", [
@@ -77,3 +84,13 @@ def test_get_file_mimetype_unsupported_extension():
 def test_get_extension_from_mimetype(input_mime, expected_ext):
     """Tests getting extension for image/png mimetype."""
     assert get_extension_from_mimetype(input_mime) == expected_ext
+
+@pytest.mark.parametrize("data,expected_mime", [
+    (b"\x89PNG\r\n\x1a\n\x00\x00\x00\rIHDR", "image/png"),
+    (b"\xff\xd8\xff\xe0\x00\x10JFIF", "image/jpeg"),
+    (b"GIF89a", None),
+    (b"<html>", None),
+    (b"", None),
+])
+def test_sniff_image_mimetype(data, expected_mime):
+    assert sniff_image_mimetype(data) == expected_mime
\ No newline at end of file
@@ -0,0 +1,60 @@
+import io
+import asyncio
+from PIL import Image
+
+from app.libs.cache import MemoryCache
+from app.libs.imaging import RenditionSpec
+from app.libs.local_storage import LocalStorage
+from app.libs.timing import StageTimer
+from app.libs.variations import render_variation_renditions, replay_cached_variations, store_variations
+
+
+class GeneratedImage:
+    def __init__(self, image_bytes, mime_type="image/png"):
+        self._image_bytes = image_bytes
+        self._mime_type = mime_type
+
+
+def png(size=64):
+    output = io.BytesIO()
+    Image.new("RGB", (size, size), (10, 20, 30)).save(output, format="PNG")
+    return output.getvalue()
+
+def locate(filename):
+    return f"thumbnails/do_1/{filename}", f"https://kb.test/proxy/do_1/{filename}"
+
+def collect(events):
+    async def run():
+        return [event async for event in events]
+    return asyncio.run(run())
+
+def test_replay_cached_variations_matches_a_fresh_run():
+    rendition = {"url": "https://kb.test/a_320w.webp", "width": 320, "height": 320, "mime_type": "image/webp"}
+    cached = {"logo": {"found": False}, "images": ["https://kb.test/a.png"], "renditions": {"https://kb.test/a.png": [rendition]}}
+
+    events = list(replay_cached_variations(cached))
+
+    assert [event["event"] for event in events] == ["logo", "image", "rendition", "done"]
+    assert events[2] == {"event": "rendition", "index": 0, **rendition}
+    assert events[-1]["renditions"] == cached["renditions"]
+
+def test_render_variation_renditions_skips_undecodable_images():
+    renditions = asyncio.run(render_variation_renditions([GeneratedImage(png()), GeneratedImage(b"not an image")], [RenditionSpec(32, "WEBP")]))
+
+    assert [len(image_renditions) for image_renditions in renditions] == [1, 0]
+
+def test_store_variations_uploads_and_caches(tmp_path):
+    storage = LocalStorage(str(tmp_path))
+    result_cache = MemoryCache()
+    images = [GeneratedImage(png()), GeneratedImage(png(), "image/jpeg")]
+
+    events = collect(store_variations(
+        images, "poster", locate, storage, StageTimer(), logo={"found": False}, prompt="a cat",
+        rendition_specs=[RenditionSpec(32, "WEBP")], max_workers=2, result_cache=result_cache, cache_key="key",
+    ))
+
+    done = events[-1]
+    assert done["images"] == ["https://kb.test/proxy/do_1/poster_0.png", "https://kb.test/proxy/do_1/poster_1.jpg"]
+    assert [rendition["url"] for rendition in done["renditions"][done["images"][0]]] == ["https://kb.test/proxy/do_1/poster_0_32w.webp"]
+    assert storage.read_file("thumbnails/do_1/poster_1_32w.webp")
+    assert result_cache.get("key") == {"logo": {"found": False}, "prompt": "a cat", "images": done["images"], "renditions": done["renditions"]}
\ No newline at end of file